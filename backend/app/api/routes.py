@@ -2,35 +2,80 @@ from dotenv import load_dotenv
 import os
 import pandas as pd
 import io
-from fastapi.responses import StreamingResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from app.core.file_process import (
+    mark_cancelled,
     process_csv_async,
     process_provider_insurance_states_csv,
 )
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 load_dotenv()
 
-from fastapi import APIRouter, HTTPException, File, UploadFile, Query, BackgroundTasks
+from fastapi import (
+    Request,
+    APIRouter,
+    HTTPException,
+    File,
+    UploadFile,
+    Query,
+    Depends,
+)
 from ..models.models import (
     SearchRequest,
     DMEProvider,
     State,
     UserEmail,
     InsuranceProviders,
+    InsuranceChanges,
+    Bootstrap,
     DMECompany,
     DMECoverage,
     DMEUploadResponse,
     ProviderUpdate,
     InsuranceStateUploadResponse,
+    InsuranceCoverage,
+    ProviderCoverage,
     ClickTrackingRequest,
     ClickTrackingResponse,
     ClickAnalytics,
     ClickAnalyticsRequest,
 )
 from ..core.supabase import supabase
-from typing import List, Dict
+from ..core.rate_limit import rate_limited, search_limiter, track_click_limiter
+from ..core.singleflight import flights
+from ..core.reference_cache import bootstrap, reference_data
+from ..core.insurance_catalog import fetch_changes, insurance_catalog
+from ..core.cache import provider_cache, search_cache, invalidate_provider
+from ..core import upload_jobs
+from ..core.validation import ON_INVALID_MODES
+from ..core.readers import upload_format
+from ..core import fingerprints
+from ..core.click_sketches import click_sketches
+from ..core.click_dedupe import click_deduper
+from ..core.hll import HyperLogLog
+from ..core.click_export import EXPORT_FORMATS, export_clicks
+from ..core.compression import accepted_encodings
+from ..core.coverage_snapshot import coverage_snapshot
+from ..core.coverage_bitmap import SERVICE_FLAGS
+from ..core.coverage_index import coverage_index, load_index
+from ..core.profiling import folded, profile_store, token_matches
+from ..core.job_scheduler import (
+    PRIORITY_INTERACTIVE,
+    QueueFull,
+    job_scheduler,
+)
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Optional, Union
 import asyncio
+import json
+import time
 import uuid
 
 router = APIRouter()
@@ -39,25 +84,115 @@ router = APIRouter()
 processing_status: Dict[str, Dict] = {}
 
 
+def fetch_search_results(state: str, insurance: str, flags: tuple = ()):
+    # Answer from the shared coverage snapshot once one has been built, whose
+    # bitmap also answers flag filters; the RPC path filters its rows
+    if os.getenv("SEARCH_SOURCE", "rpc") == "snapshot":
+        snapshot = coverage_snapshot.get()
+        if snapshot is not None:
+            return snapshot.search(state, insurance, flags)
+    payload = {"_state": state, "_insurance": insurance}
+    response = supabase.rpc(os.getenv("SEARCH_PROVIDERS"), payload).execute()
+    results = response.data if response.data is not None else []
+    if not flags:
+        return results
+    # Filter coverage rows before collapsing them to one per provider, as the
+    # snapshot's bitmap does
+    matches: Dict = {}
+    for row in results:
+        if all(row.get(flag) for flag in flags):
+            matches.setdefault(row["id"], row)
+    return list(matches.values())
+
+
+def fetch_provider(provider_id: str):
+    result = (
+        supabase.table(os.getenv("PROVIDERS_TABLE"))
+        .select("id, name, phone, email, dedicated_link")
+        .eq("id", provider_id)
+        .execute()
+    )
+    return result.data[0] if result.data else None
+
+
 @router.get("/states", response_model=List[State])
 async def get_states():
     try:
-        response = supabase.table(os.getenv("STATES_TABLE")).select("*").execute()
-        return response.data
+        return await reference_data["states"].get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/insurance-providers", response_model=InsuranceProviders)
-async def get_insurance_providers():
+@router.get(
+    "/insurance-providers",
+    response_model=Union[InsuranceChanges, InsuranceProviders],
+)
+async def get_insurance_providers(since: Optional[int] = Query(None, ge=0)):
+    """
+    List insurance names, or only the changes after a catalog version.
+
+    Args:
+        since: Catalog version the client already holds
+
+    Returns:
+        Every name and the catalog version, or with ``since`` the names
+        added and removed since then
+    """
     try:
-        response = supabase.rpc("get_insurance_names").execute()
-        return response.data
+        catalog = await reference_data["insurance_providers"].get()
+        if since is None or catalog.get("version") is None:
+            # Without a change log there are no versions to diff against
+            return catalog
+        changes = insurance_catalog.changes_since(since)
+        if changes is None:
+            # Older than this worker's history, or newer than its copy
+            changes = await flights["insurance_providers"].do(
+                ("since", since), fetch_changes, since
+            )
+        return changes
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/search-dme", response_model=List[DMEProvider])
+@router.get("/bootstrap", response_model=Bootstrap)
+async def get_bootstrap(request: Request):
+    """
+    Everything the search form needs on load: states, insurance names and
+    the version of that data.
+
+    The body is encoded ahead of time whenever reference data changes.
+    Clients revalidate with If-None-Match and get a 304 while the version
+    is unchanged.
+    """
+    try:
+        payload = await bootstrap.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": f"public, max-age={bootstrap.max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if payload.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    encodings = accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding in ("br", "gzip"):
+        if encoding in encodings and encoding in payload.encoded:
+            headers["Content-Encoding"] = encoding
+            return Response(
+                payload.encoded[encoding],
+                media_type="application/json",
+                headers=headers,
+            )
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+
+@router.post(
+    "/search-dme",
+    response_model=List[DMEProvider],
+    dependencies=[Depends(rate_limited(search_limiter))],
+)
 async def search_dme(request: SearchRequest):
     try:
         # Check if email exists
@@ -72,13 +207,15 @@ async def search_dme(request: SearchRequest):
             supabase.table(os.getenv("USER_EMAILS_TABLE")).insert(
                 {"email": request.email}
             ).execute()
-        # Query DME providers
-        payload = {
-            "_state": request.state.upper(),
-            "_insurance": request.insurance_provider.title(),
-        }
-        response = supabase.rpc(os.getenv("SEARCH_PROVIDERS"), payload).execute()
-        return response.data if response.data is not None else []
+        # Query DME providers, sharing one RPC between identical concurrent searches
+        flags = tuple(flag for flag in SERVICE_FLAGS if getattr(request, flag))
+        key = (request.state.upper(), request.insurance_provider.title(), flags)
+        results = search_cache.get(key)
+        if results is None:
+            generation = search_cache.generation
+            results = await flights["search"].do(key, fetch_search_results, *key)
+            search_cache.set(key, results, generation)
+        return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -99,38 +236,264 @@ def get_insurance_id(name: str) -> str:
 
 @router.post("/upload_providers", response_model=Dict[str, str])
 async def upload_providers(
-    background_tasks: BackgroundTasks, file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    on_invalid: str = Query(
+        "quarantine",
+        description="quarantine: skip rows that fail validation; reject: fail the upload",
+    ),
+    force: bool = Query(
+        False, description="Process the file even if it matches the last upload"
+    ),
 ):
-    if not file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+    try:
+        upload_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if on_invalid not in ON_INVALID_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"on_invalid must be one of {ON_INVALID_MODES}"
+        )
+
+    if job_scheduler.is_full():
+        raise_busy()
 
     # Generate unique job ID
     job_id = str(uuid.uuid4())
 
-    # Read file content
-    content = await file.read()
+    # The multipart parser has already spooled the body to a temporary file;
+    # hash it in chunks rather than reading it into memory
+    content_hash = await run_in_threadpool(fingerprints.content_hash, file.file)
 
-    # Start background processing
-    background_tasks.add_task(process_csv_async, job_id, content)
+    # Short-circuit an exact re-upload of the last applied file
+    previous = not force and fingerprints.matches_last_applied(
+        "content_hash", content_hash
+    )
+    if previous:
+        processing_status[job_id] = fingerprints.deduplicated_status(previous)
+        upload_jobs.save_status(job_id, processing_status[job_id])
+        return {"job_id": job_id, "message": "File matches the last upload"}
 
-    # Initialize status
+    # Initialize status and persist the upload so the job can be resumed
     processing_status[job_id] = {
-        "status": "processing",
+        "status": "queued",
         "progress": 0,
         "total": 0,
         "companies_loaded": 0,
         "coverage_entries_loaded": 0,
-        "message": "Starting CSV processing...",
+        "message": "Waiting for an upload worker...",
     }
+    # Copy the spooled upload into the job directory; the job only gets its path
+    await run_in_threadpool(
+        upload_jobs.create_job,
+        job_id,
+        file.file,
+        file.filename,
+        processing_status[job_id],
+        options={
+            "on_invalid": on_invalid,
+            "force": force,
+            "content_hash": content_hash,
+        },
+    )
+
+    # Queue the job; the scheduler bounds how many uploads run at once
+    schedule_upload(job_id)
+
+    # Drop the raw files of jobs that ended long ago, resumable or not
+    await run_in_threadpool(
+        upload_jobs.prune_jobs, float(os.getenv("UPLOAD_JOB_TTL", "604800"))
+    )
 
     return {"job_id": job_id, "message": "CSV processing started"}
 
 
+def raise_busy():
+    raise HTTPException(
+        status_code=503,
+        detail="Too many uploads are waiting; try again shortly",
+        headers={"Retry-After": "30"},
+    )
+
+
+def schedule_upload(job_id: str):
+    try:
+        job_scheduler.submit(
+            job_id,
+            process_csv_async,
+            job_id,
+            on_cancel=lambda: mark_cancelled(job_id, processing_status[job_id]),
+        )
+    except QueueFull:
+        processing_status[job_id].update(
+            {
+                "status": "error",
+                "message": "Too many uploads are waiting; resume this job later",
+                "resumable": True,
+            }
+        )
+        upload_jobs.save_status(job_id, processing_status[job_id])
+        upload_jobs.release_lock(job_id)
+        raise_busy()
+
+
+def schedule_snapshot_refresh():
+    """Rebuild the coverage snapshot on an upload worker."""
+    try:
+        job_scheduler.submit(
+            f"coverage-snapshot-{uuid.uuid4()}",
+            run_in_threadpool,
+            coverage_snapshot.refresh,
+        )
+    except QueueFull:
+        # The next upload or provider edit rebuilds it
+        pass
+
+
+def load_job_status(job_id: str) -> Dict:
+    """Return a job's status from this worker, falling back to the job store."""
+    if job_id in processing_status:
+        return processing_status[job_id]
+    try:
+        status = upload_jobs.load_status(job_id)
+    except ValueError:
+        status = None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
 @router.get("/upload_status/{job_id}")
 async def get_upload_status(job_id: str):
-    if job_id not in processing_status:
+    return load_job_status(job_id)
+
+
+@router.get("/upload_status/{job_id}/stream")
+async def stream_upload_status(job_id: str, request: Request):
+    """
+    Push an upload's status as Server-Sent Events until it finishes.
+
+    Sends a ``status`` event whenever progress, stage timings or the result
+    change, and a comment line as a heartbeat while nothing changes so
+    proxies keep the connection open. The stream ends after the final status.
+    /upload_status/{job_id} remains available for clients that cannot stream.
+
+    Args:
+        job_id: The ID returned by /upload_providers
+
+    Returns:
+        A text/event-stream response
+    """
+    load_job_status(job_id)
+    interval = float(os.getenv("UPLOAD_STREAM_INTERVAL", "0.5"))
+    heartbeat = float(os.getenv("UPLOAD_STREAM_HEARTBEAT", "15"))
+
+    async def events():
+        # Tell EventSource how long to wait before reconnecting, in ms
+        yield "retry: 3000\n\n"
+        last_payload = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            # Jobs running on another worker are followed through the job store
+            status = load_job_status(job_id)
+            payload = json.dumps(status)
+            now = time.monotonic()
+            if payload != last_payload:
+                yield f"event: status\ndata: {payload}\n\n"
+                last_payload, last_sent = payload, now
+                if status["status"] in upload_jobs.TERMINAL_STATUSES:
+                    return
+            elif now - last_sent >= heartbeat:
+                yield ": heartbeat\n\n"
+                last_sent = now
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/upload_status/{job_id}", response_model=Dict[str, str])
+async def cancel_upload(job_id: str):
+    """
+    Cancel a queued or running upload.
+
+    A cancelled upload keeps its checkpoint and can be resumed later.
+
+    Args:
+        job_id: The ID returned by /upload_providers
+
+    Returns:
+        The job ID and a message indicating the job was cancelled
+    """
+    load_job_status(job_id)
+    if not job_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not running")
+    return {"job_id": job_id, "message": "CSV processing cancelled"}
+
+
+@router.get("/upload_quarantine/{job_id}")
+async def get_upload_quarantine(job_id: str):
+    """
+    Download the rows of an upload that were skipped by validation.
+
+    Args:
+        job_id: The ID returned by /upload_providers
+
+    Returns:
+        A CSV file of the quarantined rows with their original row numbers
+    """
+    try:
+        path = upload_jobs.job_path(job_id, upload_jobs.QUARANTINE_FILE)
+    except ValueError:
         raise HTTPException(status_code=404, detail="Job not found")
-    return processing_status[job_id]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No quarantined rows for job")
+    return FileResponse(
+        path, media_type="text/csv", filename=f"quarantine_{job_id}.csv"
+    )
+
+
+@router.post("/upload_resume/{job_id}", response_model=Dict[str, str])
+async def resume_upload(job_id: str):
+    """
+    Resume a failed or interrupted upload from its last checkpoint.
+
+    Args:
+        job_id: The ID returned by /upload_providers
+
+    Returns:
+        The job ID and a message indicating the job was restarted
+    """
+    status = load_job_status(job_id)
+    if job_id in job_scheduler.jobs:
+        raise HTTPException(status_code=409, detail="Job is already running")
+
+    # Another worker may be running it; the lock file is shared
+    if not upload_jobs.acquire_lock(job_id):
+        raise HTTPException(status_code=409, detail="Job is already running")
+    checkpoint = upload_jobs.load_checkpoint(job_id)
+    if status["status"] == "completed" or checkpoint is None:
+        upload_jobs.release_lock(job_id)
+        raise HTTPException(status_code=409, detail="Job has nothing left to resume")
+
+    status.update(
+        {
+            "status": "queued",
+            "message": (
+                "Resuming CSV processing from batch "
+                f"{checkpoint['coverage_batches_committed']}..."
+            ),
+        }
+    )
+    status.pop("resumable", None)
+    processing_status[job_id] = status
+    upload_jobs.save_status(job_id, status)
+
+    schedule_upload(job_id)
+
+    return {"job_id": job_id, "message": "CSV processing resumed"}
 
 
 @router.patch("/provider/{provider_id}", response_model=Dict[str, str])
@@ -154,30 +517,32 @@ async def update_provider(provider_id: str, update_data: ProviderUpdate):
                 status_code=400, detail="No valid fields to update provided"
             )
 
-        # Check if provider exists
-        provider = (
+        # Update the provider; no returned row means no provider had this ID
+        result = (
             supabase.table(os.getenv("PROVIDERS_TABLE"))
-            .select("id")
+            .update(update_dict)
             .eq("id", provider_id)
             .execute()
         )
 
-        if not provider.data:
+        if not result.data:
             raise HTTPException(
                 status_code=404, detail=f"Provider with ID {provider_id} not found"
             )
 
-        # Update the provider
-        result = (
-            supabase.table(os.getenv("PROVIDERS_TABLE"))
-            .update(update_dict)
-            .eq("id", provider_id)
-            .execute()
+        invalidate_provider(provider_id)
+        reference_data["provider_directory"].invalidate()
+        fingerprints.clear_last_applied()
+        schedule_snapshot_refresh()
+        row = result.data[0]
+        provider_cache.set(
+            provider_id,
+            {
+                field: row.get(field)
+                for field in ("id", "name", "phone", "email", "dedicated_link")
+            },
         )
 
-        if not result.data:
-            raise HTTPException(status_code=500, detail="Failed to update provider")
-
         return {"message": f"Provider {provider_id} updated successfully"}
 
     except Exception as e:
@@ -255,19 +620,20 @@ async def get_provider(provider_id: str):
         The provider details
     """
     try:
-        result = (
-            supabase.table(os.getenv("PROVIDERS_TABLE"))
-            .select("id, name, phone, email, dedicated_link")
-            .eq("id", provider_id)
-            .execute()
-        )
+        provider = provider_cache.get(provider_id)
+        if provider is None:
+            provider = await flights["provider"].do(
+                provider_id, fetch_provider, provider_id
+            )
+            if provider is not None:
+                provider_cache.set(provider_id, provider)
 
-        if not result.data:
+        if provider is None:
             raise HTTPException(
                 status_code=404, detail=f"Provider with ID {provider_id} not found"
             )
 
-        return result.data[0]
+        return provider
 
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -275,6 +641,55 @@ async def get_provider(provider_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def get_coverage_index():
+    index = coverage_index.current()
+    if index is None:
+        # Rebuild off the event loop, once however many requests are waiting,
+        # building the snapshot first if there is none yet
+        index = await flights["coverage_index"].do("build", load_index)
+    if index is None:
+        raise HTTPException(status_code=503, detail="Coverage index is not built yet")
+    return index
+
+
+@router.get("/coverage/by-insurance/{name}", response_model=InsuranceCoverage)
+async def get_coverage_by_insurance(name: str):
+    """
+    List the states where an insurance has coverage, and the providers in each.
+
+    Args:
+        name: The insurance name, matched exactly but ignoring case
+
+    Returns:
+        The insurance's states, each with its providers
+    """
+    coverage = (await get_coverage_index()).by_insurance(name)
+    if coverage is None:
+        raise HTTPException(
+            status_code=404, detail=f"No coverage found for insurance {name}"
+        )
+    return coverage
+
+
+@router.get("/coverage/by-provider/{provider_id}", response_model=ProviderCoverage)
+async def get_coverage_by_provider(provider_id: int):
+    """
+    List the insurances a provider accepts and the states each is covered in.
+
+    Args:
+        provider_id: The ID of the provider
+
+    Returns:
+        The provider, every state it covers and its insurances with their states
+    """
+    coverage = (await get_coverage_index()).by_provider(provider_id)
+    if coverage is None:
+        raise HTTPException(
+            status_code=404, detail=f"No coverage found for provider {provider_id}"
+        )
+    return coverage
+
+
 @router.delete("/provider/{provider_id}", response_model=Dict[str, str])
 async def delete_provider(provider_id: str):
     """
@@ -292,6 +707,11 @@ async def delete_provider(provider_id: str):
             os.getenv("DELETE_PROVIDER_CASCADE"), {"p_provider_id": provider_id}
         ).execute()
 
+        invalidate_provider(provider_id)
+        reference_data["provider_directory"].invalidate()
+        fingerprints.clear_last_applied()
+        schedule_snapshot_refresh()
+
         return {"message": f"Provider {provider_id} deleted successfully"}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -347,6 +767,9 @@ async def upload_provider_insurance_states(
     """
     Upload a CSV file with insurance-state mappings for a specific provider.
 
+    The CSV may be gzip or zip compressed; Parquet and XLSX files with the same
+    columns are accepted too.
+
     CSV must have exactly 2 columns: "Insurances" and "States"
     States can be 2-letter codes or "ALL" for all states.
 
@@ -359,8 +782,7 @@ async def upload_provider_insurance_states(
     """
     try:
         # Validate file type
-        if not file.filename.lower().endswith(".csv"):
-            raise HTTPException(status_code=400, detail="File must be a CSV")
+        upload_format(file.filename)
 
         # Check if provider exists
         provider = (
@@ -375,14 +797,23 @@ async def upload_provider_insurance_states(
                 status_code=404, detail=f"Provider with ID {provider_id} not found"
             )
 
-        # Read file content
-        content = await file.read()
-
-        # Process the CSV
-        result = process_provider_insurance_states_csv(provider_id, content)
+        # Process the CSV on an upload worker, ahead of queued bulk uploads,
+        # parsing straight from the spooled upload
+        result = await job_scheduler.run(
+            str(uuid.uuid4()),
+            run_in_threadpool,
+            process_provider_insurance_states_csv,
+            provider_id,
+            file.file,
+            file.filename,
+            priority=PRIORITY_INTERACTIVE,
+        )
+        fingerprints.clear_last_applied()
 
         return InsuranceStateUploadResponse(**result)
 
+    except QueueFull:
+        raise_busy()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -392,7 +823,11 @@ async def upload_provider_insurance_states(
 
 
 ## TRACKING ROUTES
-@router.post("/track-click", response_model=ClickTrackingResponse)
+@router.post(
+    "/track-click",
+    response_model=ClickTrackingResponse,
+    dependencies=[Depends(rate_limited(track_click_limiter))],
+)
 async def track_provider_click(request: ClickTrackingRequest):
     """
     Track when a user clicks on a provider link.
@@ -414,23 +849,46 @@ async def track_provider_click(request: ClickTrackingRequest):
         }
         print("Click data route:", click_data)
 
+        # Retries and double clicks inside the window succeed without
+        # inserting another row
+        dedupe_key = click_deduper.key(
+            request.provider_id,
+            request.click_type,
+            request.user_email,
+            request.session_id,
+        )
+        duplicate, click_id = click_deduper.seen(dedupe_key)
+        if duplicate:
+            return ClickTrackingResponse(
+                success=True,
+                message="Duplicate click ignored",
+                click_id=click_id,
+            )
+
         # Remove None values
         click_data = {k: v for k, v in click_data.items() if v is not None}
 
         # Insert into database
-        result = (
-            supabase.table(os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks"))
-            .insert(click_data)
-            .execute()
-        )
+        try:
+            result = (
+                supabase.table(os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks"))
+                .insert(click_data)
+                .execute()
+            )
+        except Exception:
+            click_deduper.forget(dedupe_key)
+            raise
 
         if result.data:
+            click_deduper.stored(dedupe_key, result.data[0]["id"])
+            click_sketches.add(request.provider_id, request.user_email)
             return ClickTrackingResponse(
                 success=True,
                 message="Click tracked successfully",
                 click_id=result.data[0]["id"],
             )
         else:
+            click_deduper.forget(dedupe_key)
             raise HTTPException(status_code=500, detail="Failed to track click")
 
     except Exception as e:
@@ -461,6 +919,30 @@ async def get_click_analytics(request: ClickAnalyticsRequest):
         # Call the analytics RPC function
         result = supabase.rpc("get_click_analytics", params).execute()
 
+        if result.data and not request.state:
+            # Distinct users come from the daily sketches rather than a
+            # COUNT(DISTINCT) over raw clicks. Sketches are not split by
+            # state, so state-filtered requests keep the exact count.
+            end = (
+                datetime.strptime(request.end_date, "%Y-%m-%d").date()
+                if request.end_date
+                else datetime.now(timezone.utc).date()
+            )
+            start = (
+                datetime.strptime(request.start_date, "%Y-%m-%d").date()
+                if request.start_date
+                else end - timedelta(days=30)
+            )
+            unique = await run_in_threadpool(
+                click_sketches.estimate_by_provider, start, end, request.provider_id
+            )
+            for row in result.data:
+                users = unique.get(row["provider_id"], 0)
+                row["unique_users"] = users
+                row["avg_clicks_per_user"] = (
+                    round(row["total_clicks"] / users, 2) if users else 0
+                )
+
         if result.data:
             return [
                 ClickAnalytics(
@@ -511,30 +993,11 @@ async def get_click_summary():
         )
 
         # Get provider IDs for Babylist Health and breastpumps.com
-        providers_table = os.getenv("PROVIDERS_TABLE", "providers")
         clicks_table = os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks")
-
-        # Get Babylist Health provider ID
-        babylist_provider = (
-            supabase.table(providers_table)
-            .select("id")
-            .eq("name", "Babylist Health")
-            .execute()
-        )
-        babylist_id = (
-            babylist_provider.data[0]["id"] if babylist_provider.data else None
-        )
-
-        # Get breastpumps.com provider ID
-        breastpumps_provider = (
-            supabase.table(providers_table)
-            .select("id")
-            .eq("name", "Breastpumps.com")
-            .execute()
-        )
-        breastpumps_id = (
-            breastpumps_provider.data[0]["id"] if breastpumps_provider.data else None
-        )
+        directory = await reference_data["provider_directory"].get()
+        provider_ids = {provider["name"]: provider["id"] for provider in directory}
+        babylist_id = provider_ids.get("Babylist Health")
+        breastpumps_id = provider_ids.get("Breastpumps.com")
 
         # Babylist Health clicks (all time)
         babylist_clicks = 0
@@ -558,18 +1021,9 @@ async def get_click_summary():
             )
             breastpumps_clicks = breastpumps_result.count or 0
 
-        # Unique users in last 30 days
-        unique_users_result = (
-            supabase.table(os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks"))
-            .select("user_email")
-            .gte("clicked_at", thirty_days_ago.isoformat())
-            .execute()
-        )
-
-        unique_users = (
-            len(set([row["user_email"] for row in unique_users_result.data]))
-            if unique_users_result.data
-            else 0
+        # Unique users in last 30 days, estimated from the daily sketches
+        unique_users = await run_in_threadpool(
+            click_sketches.estimate, thirty_days_ago, datetime.now().date()
         )
 
         return {
@@ -583,3 +1037,161 @@ async def get_click_summary():
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching summary: {str(e)}")
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Report in-process counters for admission control and request coalescing.
+
+    Returns:
+        Per-component counters for this worker
+    """
+    return {
+        "rate_limit": {
+            "search": search_limiter.stats(),
+            "track_click": track_click_limiter.stats(),
+        },
+        "single_flight": {name: flight.stats() for name, flight in flights.items()},
+        "click_sketches": click_sketches.stats(),
+        "click_dedupe": click_deduper.stats(),
+        "upload_jobs": job_scheduler.stats(),
+        "coverage_snapshot": coverage_snapshot.stats(),
+        "coverage_index": coverage_index.stats(),
+        "cache": {"provider": provider_cache.stats(), "search": search_cache.stats()},
+        "reference_data": {
+            name: value.stats() for name, value in reference_data.items()
+        },
+        "bootstrap": bootstrap.stats(),
+        "insurance_catalog": insurance_catalog.stats(),
+    }
+
+
+def require_profiling_token(request: Request):
+    token = os.getenv("PROFILING_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not token_matches(request.headers, token):
+        raise HTTPException(
+            status_code=403, detail="A valid X-Profile-Token header is required"
+        )
+
+
+@router.get("/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """
+    List the captured request profiles, newest first.
+
+    Returns:
+        Each profile's request, status, duration and sample count
+    """
+    return await run_in_threadpool(profile_store.list)
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def download_profile(
+    profile_id: str,
+    format: str = Query("json", description="json, or folded for flame graphs"),
+):
+    """
+    Download one request profile.
+
+    Args:
+        profile_id: The id from the X-Profile-Id response header or the list
+        format: json for the full profile, folded for flamegraph.pl/speedscope
+
+    Returns:
+        The profile as an attachment
+    """
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="format must be json or folded")
+    profile = await run_in_threadpool(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    headers = {"Content-Disposition": f'attachment; filename="{profile_id}.{format}"'}
+    if format == "folded":
+        return PlainTextResponse(folded(profile), headers=headers)
+    return JSONResponse(profile, headers=headers)
+
+
+@router.get("/analytics/clicks/unique-users")
+async def get_unique_users(
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    provider_id: Optional[int] = Query(None, description="Filter by provider"),
+):
+    """
+    Estimate distinct users who clicked in a date range.
+
+    Merges the per-day HyperLogLog sketches for the range instead of counting
+    distinct emails over raw clicks, so cost does not grow with click volume.
+
+    Returns:
+        The estimate and its relative standard error
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+
+    try:
+        unique_users = await run_in_threadpool(
+            click_sketches.estimate, start, end, provider_id
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error estimating unique users: {str(e)}"
+        )
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "provider_id": provider_id,
+        "unique_users": unique_users,
+        "approximate": True,
+        "relative_error": round(HyperLogLog.relative_error(), 4),
+    }
+
+
+@router.get("/analytics/clicks/export")
+async def export_click_events(
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    format: str = Query("ndjson", description="ndjson, csv or parquet"),
+    page_size: int = Query(5000, ge=100, le=10000),
+):
+    """
+    Stream raw click events for a date range.
+
+    Rows are read with keyset pagination on (clicked_at, id) and written out
+    page by page, so memory stays bounded by the page size regardless of how
+    many clicks are exported. NDJSON and CSV are compressed by
+    CompressionMiddleware when the client accepts it; Parquet is already
+    compressed internally.
+
+    Returns:
+        A streaming response with the exported clicks
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {list(EXPORT_FORMATS)}"
+        )
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+
+    body = export_clicks(start, end, format, page_size)
+    headers = {
+        "Content-Disposition": (
+            f"attachment; filename=clicks_{start_date}_{end_date}.{format}"
+        )
+    }
+    # A sync iterator is consumed in the threadpool, off the event loop
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
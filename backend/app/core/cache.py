@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after ``ttl`` seconds.
+
+    Safe to use from several threads: uploads and snapshot rebuilds clear it
+    from worker threads while requests read it on the event loop.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Bumped on clear so loads that started before it are not stored
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Provider details keyed by provider id (as a string), written through on PATCH
+provider_cache = TTLCache(
+    ttl=float(os.getenv("PROVIDER_CACHE_TTL", "300")),
+    max_size=int(os.getenv("PROVIDER_CACHE_MAX_SIZE", "2048")),
+)
+
+# search_dme results keyed by (state, insurance). The cache is per worker and
+# only the worker that handled an upload clears it, so other workers may serve
+# results up to SEARCH_CACHE_TTL seconds old after coverage changes.
+search_cache = TTLCache(
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "60")),
+    max_size=int(os.getenv("SEARCH_CACHE_MAX_SIZE", "4096")),
+)
+
+
+def invalidate_provider(provider_id: str):
+    """Drop a provider and every cached search that could include it."""
+    provider_cache.pop(str(provider_id))
+    search_cache.clear()
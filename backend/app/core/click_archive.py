@@ -0,0 +1,128 @@
+import argparse
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from app.core.click_export import export_clicks
+from app.core.supabase import supabase as sb
+
+# Postgres' insufficient_privilege
+PERMISSION_DENIED_CODE = "42501"
+
+
+def month_end(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(
+        days=1
+    )
+
+
+def retention_cutoff(today: date, keep_months: int) -> date:
+    """First month that is kept: months before it are archived."""
+    months = today.year * 12 + today.month - 1 - keep_months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def archive_path(directory: str, month: date) -> str:
+    return os.path.join(directory, f"provider_clicks_{month:%Y_%m}.parquet")
+
+
+def archive_month(month: date, directory: str) -> int:
+    """Write one month of clicks to a Parquet file; returns its row count.
+
+    The file is written under a temporary name and renamed once complete,
+    so an interrupted run never leaves a truncated archive behind.
+    """
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(directory, month)
+    partial = path + ".partial"
+    with open(partial, "wb") as f:
+        for chunk in export_clicks(month, month_end(month), "parquet"):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    rows = pq.ParquetFile(partial).metadata.num_rows
+    os.replace(partial, path)
+    return rows
+
+
+def apply_retention(
+    keep_months: int,
+    directory: str,
+    months_ahead: int = 3,
+    today: Optional[date] = None,
+    drop: bool = True,
+) -> List[Dict]:
+    """Archive click partitions older than ``keep_months`` and drop them.
+
+    Upcoming partitions are created first. Each expired month is exported
+    to ``directory`` and its partition dropped only if it still holds
+    exactly the rows the archive does; otherwise it is left for the next
+    run. With ``drop=False`` months are archived but kept. The partition
+    functions are executable by service_role only, so a client with any other
+    key raises ``PermissionError`` before anything is exported.
+    """
+    try:
+        sb.rpc("ensure_click_partitions", {"p_months_ahead": months_ahead}).execute()
+    except Exception as e:
+        if getattr(e, "code", None) != PERMISSION_DENIED_CODE:
+            raise
+        raise PermissionError(
+            "Click partition maintenance is granted to service_role only; "
+            "run the archive job with SUPABASE_KEY set to the service key"
+        ) from e
+    cutoff = retention_cutoff(today or date.today(), keep_months)
+    partitions = sb.rpc("list_click_partitions").execute().data or []
+
+    results = []
+    for partition in partitions:
+        month = date.fromisoformat(partition["month"])
+        if month >= cutoff:
+            continue
+        rows = archive_month(month, directory)
+        result = {"month": month.isoformat(), "rows": rows, "dropped": False}
+        if drop:
+            try:
+                result["dropped"] = bool(
+                    sb.rpc(
+                        "drop_click_partition",
+                        {"p_month": month.isoformat(), "p_expected_rows": rows},
+                    )
+                    .execute()
+                    .data
+                )
+            except Exception as e:
+                # Rows arrived after the export; the next run archives again
+                result["error"] = str(e)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    # python -m app.core.click_archive --keep-months 13
+    parser = argparse.ArgumentParser(
+        description="Archive old click partitions to Parquet and drop them"
+    )
+    parser.add_argument(
+        "--keep-months",
+        type=int,
+        default=int(os.getenv("CLICK_RETENTION_MONTHS", "13")),
+    )
+    parser.add_argument(
+        "--dir", default=os.getenv("CLICK_ARCHIVE_DIR", "click_archive")
+    )
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument(
+        "--keep-partitions",
+        action="store_true",
+        help="Write the archives but do not drop anything",
+    )
+    args = parser.parse_args()
+    for result in apply_retention(
+        args.keep_months,
+        args.dir,
+        months_ahead=args.months_ahead,
+        drop=not args.keep_partitions,
+    ):
+        print(result)
@@ -0,0 +1,89 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+# Stands in for a click id while the first insert for a key is still running
+PENDING = object()
+
+
+class ClickDeduper:
+    """Remember recent clicks for ``window`` seconds to drop repeats.
+
+    A click is keyed by who clicked (session id, else email), the provider
+    and the click type. The window runs from the first click and is not
+    extended by repeats, so steady retries cannot hold a key open forever.
+    Keys are kept in expiry order: expired ones are dropped from the front
+    on every call, and past ``max_keys`` the oldest is evicted early.
+    A window of 0 turns de-duplication off.
+    """
+
+    def __init__(self, window: float, max_keys: int = 10000):
+        self.window = window
+        self.max_keys = max_keys
+        self.accepted = 0
+        self.suppressed = 0
+        self.evicted = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+
+    @staticmethod
+    def key(
+        provider_id: int,
+        click_type: str,
+        user_email: str,
+        session_id: Optional[str] = None,
+    ) -> Hashable:
+        who = ("session", session_id) if session_id else ("email", user_email)
+        return (who, provider_id, click_type)
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[key]
+
+    def seen(self, key: Hashable) -> Tuple[bool, Optional[int]]:
+        """Record a click; returns whether it repeats one inside the window
+        and, if so, the id the first one was stored under (when known)."""
+        if self.window <= 0:
+            self.accepted += 1
+            return False, None
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.suppressed += 1
+            click_id = entry[1]
+            return True, None if click_id is PENDING else click_id
+        self._entries[key] = (now + self.window, PENDING)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        self.accepted += 1
+        return False, None
+
+    def stored(self, key: Hashable, click_id: Optional[int]):
+        """Attach the inserted click's id so repeats can report it."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (entry[0], click_id)
+
+    def forget(self, key: Hashable):
+        """Drop a key whose insert failed, so a retry is not suppressed."""
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "keys": len(self._entries),
+            "accepted": self.accepted,
+            "suppressed": self.suppressed,
+            "evicted": self.evicted,
+        }
+
+
+click_deduper = ClickDeduper(
+    window=float(os.getenv("CLICK_DEDUPE_WINDOW", "10")),
+    max_keys=int(os.getenv("CLICK_DEDUPE_MAX_KEYS", "10000")),
+)
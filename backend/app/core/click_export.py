@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+from app.core.supabase import supabase as sb
+
+CLICK_COLUMNS = [
+    "id",
+    "provider_id",
+    "user_email",
+    "search_state",
+    "search_insurance",
+    "click_type",
+    "clicked_at",
+    "session_id",
+    "user_agent",
+    "referrer",
+]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def iter_click_pages(
+    start: date, end: date, page_size: int = 5000
+) -> Iterator[List[Dict]]:
+    """Yield clicks in ``[start, end]`` page by page, ordered by (clicked_at, id).
+
+    Each page continues strictly after the last (clicked_at, id) seen, so the
+    scan never uses OFFSET, never skips or repeats rows with equal timestamps,
+    and every page stays under PostgREST's row cap.
+    """
+    clicks_table = os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks")
+    last = None
+    while True:
+        query = (
+            sb.table(clicks_table)
+            .select(", ".join(CLICK_COLUMNS))
+            .gte("clicked_at", start.isoformat())
+            .lt("clicked_at", (end + timedelta(days=1)).isoformat())
+        )
+        if last is not None:
+            clicked_at, click_id = last
+            query = query.or_(
+                f'clicked_at.gt."{clicked_at}",'
+                f'and(clicked_at.eq."{clicked_at}",id.gt.{click_id})'
+            )
+        rows = (
+            query.order("clicked_at").order("id").limit(page_size).execute().data or []
+        )
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = (rows[-1]["clicked_at"], rows[-1]["id"])
+
+
+def _ndjson(pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for rows in pages:
+        yield "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def _csv(pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CLICK_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in pages:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out as they arrive."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet(pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("provider_id", pa.int64()),
+            ("user_email", pa.string()),
+            ("search_state", pa.string()),
+            ("search_insurance", pa.string()),
+            ("click_type", pa.string()),
+            ("clicked_at", pa.timestamp("us", tz="UTC")),
+            ("session_id", pa.string()),
+            ("user_agent", pa.string()),
+            ("referrer", pa.string()),
+        ]
+    )
+    sink = _DrainableSink()
+    # One row group per page keeps memory bounded by the page size
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in pages:
+            frame = pd.DataFrame(rows, columns=CLICK_COLUMNS)
+            # A real timestamp column lets readers filter and partition on it
+            frame["clicked_at"] = pd.to_datetime(
+                frame["clicked_at"], utc=True, format="ISO8601"
+            )
+            writer.write_table(
+                pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_clicks(
+    start: date, end: date, fmt: str, page_size: int = 5000
+) -> Iterator[bytes]:
+    pages = iter_click_pages(start, end, page_size)
+    if fmt == "ndjson":
+        return _ndjson(pages)
+    if fmt == "csv":
+        return _csv(pages)
+    return _parquet(pages)
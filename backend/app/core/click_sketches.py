@@ -0,0 +1,196 @@
+import asyncio
+import base64
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.hll import HyperLogLog
+from app.core.supabase import supabase as sb
+
+
+def _decode_registers(value) -> bytes:
+    # PostgREST returns bytea as a "\x"-prefixed hex string
+    if isinstance(value, str) and value.startswith("\\x"):
+        return bytes.fromhex(value[2:])
+    return base64.b64decode(value)
+
+
+class ClickSketchStore:
+    """Per-day, per-provider HyperLogLog sketches of the users who clicked.
+
+    Clicks update an in-memory sketch; ``flush`` merges pending sketches into
+    Supabase through the ``merge_click_user_sketch`` RPC, which takes the
+    register-wise maximum under a row lock so concurrent workers never lose
+    updates. Estimates merge the stored sketches for a window in the database
+    and add the pending ones.
+    """
+
+    def __init__(self):
+        self.pending: Dict[Tuple[str, int], HyperLogLog] = {}
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def add(self, provider_id: int, user_email: str, day: Optional[date] = None):
+        day = day or datetime.now(timezone.utc).date()
+        key = (day.isoformat(), provider_id)
+        sketch = self.pending.get(key)
+        if sketch is None:
+            sketch = self.pending[key] = HyperLogLog()
+        sketch.add(user_email.strip().lower())
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for (day, provider_id), sketch in pending.items():
+            try:
+                sb.rpc(
+                    os.getenv("MERGE_CLICK_USER_SKETCH", "merge_click_user_sketch"),
+                    {
+                        "p_day": day,
+                        "p_provider_id": provider_id,
+                        "p_registers": base64.b64encode(sketch.to_bytes()).decode(),
+                    },
+                ).execute()
+                self.flushed += 1
+            except Exception as e:
+                # Keep the sketch so the next flush retries it
+                self.flush_errors += 1
+                existing = self.pending.get((day, provider_id))
+                self.pending[(day, provider_id)] = (
+                    sketch.merge(existing) if existing else sketch
+                )
+                print(f"Failed to flush click sketch {day}/{provider_id}: {e}")
+
+    def union(
+        self,
+        start: date,
+        end: date,
+        provider_id: Optional[int] = None,
+        by_provider: bool = False,
+    ) -> Dict[Optional[int], HyperLogLog]:
+        """Merged sketches of the users who clicked between ``start`` and ``end``.
+
+        Stored sketches are merged in Supabase by the
+        ``union_click_user_sketches`` RPC, so one sketch per group comes back
+        however many days the range covers; pending sketches are merged on
+        top. Keyed by provider with ``by_provider``, otherwise by ``None``.
+        """
+        rows = (
+            sb.rpc(
+                os.getenv("UNION_CLICK_USER_SKETCHES", "union_click_user_sketches"),
+                {
+                    "p_start": start.isoformat(),
+                    "p_end": end.isoformat(),
+                    "p_provider_id": provider_id,
+                    "p_by_provider": by_provider,
+                },
+            )
+            .execute()
+            .data
+            or []
+        )
+        merged: Dict[Optional[int], HyperLogLog] = {}
+        for row in rows:
+            key = row["provider_id"] if by_provider else None
+            merged[key] = HyperLogLog.from_bytes(_decode_registers(row["registers"]))
+        for (day, pending_provider), sketch in list(self.pending.items()):
+            if start.isoformat() <= day <= end.isoformat() and (
+                provider_id is None or pending_provider == provider_id
+            ):
+                key = pending_provider if by_provider else None
+                merged.setdefault(key, HyperLogLog()).merge(sketch)
+        return merged
+
+    def estimate(
+        self, start: date, end: date, provider_id: Optional[int] = None
+    ) -> int:
+        """Approximate distinct users who clicked between ``start`` and ``end``."""
+        sketch = self.union(start, end, provider_id).get(None)
+        return sketch.count() if sketch else 0
+
+    def estimate_by_provider(
+        self, start: date, end: date, provider_id: Optional[int] = None
+    ) -> Dict[int, int]:
+        """Approximate distinct users per provider between ``start`` and ``end``."""
+        return {
+            key: sketch.count()
+            for key, sketch in self.union(
+                start, end, provider_id, by_provider=True
+            ).items()
+        }
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+        }
+
+
+class SketchFlusher:
+    """Background loop that periodically flushes pending click sketches."""
+
+    def __init__(self, store: ClickSketchStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.store.flush)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.store.pending:
+                await run_in_threadpool(self.store.flush)
+
+
+def backfill(start: date, end: date, page_size: int = 1000):
+    """Build sketches from existing clicks, e.g. after creating the table."""
+    store = ClickSketchStore()
+    clicks_table = os.getenv("PROVIDER_CLICKS_TABLE", "provider_clicks")
+    last_id = 0
+    while True:
+        rows = (
+            sb.table(clicks_table)
+            .select("id, provider_id, user_email, clicked_at")
+            .gte("clicked_at", start.isoformat())
+            .lt("clicked_at", (end + timedelta(days=1)).isoformat())
+            .gt("id", last_id)
+            .order("id")
+            .limit(page_size)
+            .execute()
+            .data
+        )
+        if not rows:
+            break
+        for row in rows:
+            day = datetime.fromisoformat(row["clicked_at"]).astimezone(timezone.utc)
+            store.add(row["provider_id"], row["user_email"], day.date())
+        last_id = rows[-1]["id"]
+    store.flush()
+
+
+click_sketches = ClickSketchStore()
+sketch_flusher = SketchFlusher(
+    click_sketches, float(os.getenv("CLICK_SKETCH_FLUSH_INTERVAL", "10"))
+)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m app.core.click_sketches 2024-01-01 2024-12-31
+    backfill(date.fromisoformat(sys.argv[1]), date.fromisoformat(sys.argv[2]))
@@ -0,0 +1,127 @@
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+# Service flags a search can require, in the order of their bit in the snapshot
+SERVICE_FLAGS = (
+    "medicaid",
+    "resupply_available",
+    "accessories_available",
+    "lactation_services_available",
+)
+
+
+class CoverageBitmap:
+    """Coverage as one bitset of states per (provider, insurance) pair.
+
+    Bit ``i`` of ``coverage[p]`` is set when pair ``p`` has a coverage row in
+    state ``i``; the wildcard ``ALL`` is just another state bit. Each service
+    flag has a parallel array whose bit ``i`` is set when that same row offers
+    the service. Pairs are sorted by insurance, so the pairs of one insurance
+    are a contiguous slice found through ``insurance_offsets``.
+
+    A lookup ORs the requested state's bit with the ``ALL`` bit and ANDs it
+    with the coverage and flag words of the candidate pairs: a few vectorized
+    bitwise operations over 8-byte words instead of a query.
+    """
+
+    def __init__(
+        self,
+        state_codes: Sequence[str],
+        insurance_count: int,
+        pair_provider: np.ndarray,
+        pair_insurance: np.ndarray,
+        coverage: np.ndarray,
+        flags: Dict[str, np.ndarray],
+    ):
+        if len(state_codes) > 64:
+            raise ValueError("CoverageBitmap supports at most 64 state codes")
+        self.state_bits = {
+            code: np.uint64(1) << np.uint64(i) for i, code in enumerate(state_codes)
+        }
+        self.pair_provider = pair_provider
+        self.pair_insurance = pair_insurance
+        self.coverage = coverage
+        self.flags = flags
+        self.insurance_offsets = np.searchsorted(
+            pair_insurance, np.arange(insurance_count + 1)
+        )
+
+    @classmethod
+    def from_rows(
+        cls,
+        state_codes: Sequence[str],
+        insurance_count: int,
+        row_provider: np.ndarray,
+        row_insurance: np.ndarray,
+        row_state: np.ndarray,
+        row_flags: np.ndarray,
+        flag_bits: Dict[str, int],
+    ) -> "CoverageBitmap":
+        """Build from coverage rows given as parallel index arrays.
+
+        ``row_flags`` packs each row's service flags using ``flag_bits``.
+        """
+        pair_key = row_insurance.astype(np.int64) << 32 | row_provider.astype(np.int64)
+        keys, pair_of_row = np.unique(pair_key, return_inverse=True)
+        state_word = np.uint64(1) << row_state.astype(np.uint64)
+
+        coverage = np.zeros(len(keys), dtype=np.uint64)
+        np.bitwise_or.at(coverage, pair_of_row, state_word)
+        flags = {}
+        for flag in SERVICE_FLAGS:
+            words = np.zeros(len(keys), dtype=np.uint64)
+            offered = (row_flags & flag_bits[flag]) != 0
+            np.bitwise_or.at(words, pair_of_row[offered], state_word[offered])
+            flags[flag] = words
+
+        # np.unique sorts the keys, which puts pairs in (insurance, provider) order
+        return cls(
+            state_codes,
+            insurance_count,
+            (keys & 0xFFFFFFFF).astype(np.uint32),
+            (keys >> 32).astype(np.uint32),
+            coverage,
+            flags,
+        )
+
+    def lookup(
+        self, state: str, insurances: Iterable[int], flags: Sequence[str] = ()
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs covering ``state`` (directly or through ALL) with every flag.
+
+        Returns the matching pair indexes, in (insurance, provider) order, and
+        for each the bits of the states it matched through.
+        """
+        query = self.state_bits.get(state, np.uint64(0)) | self.state_bits.get(
+            "ALL", np.uint64(0)
+        )
+        candidates = np.concatenate(
+            [
+                np.arange(self.insurance_offsets[i], self.insurance_offsets[i + 1])
+                for i in insurances
+            ]
+            or [np.empty(0, dtype=np.int64)]
+        )
+        matched = self.coverage[candidates] & query
+        for flag in flags:
+            matched &= self.flags[flag][candidates]
+        keep = matched != 0
+        return candidates[keep], matched[keep]
+
+    def row_flags(self, pair: int, state: str) -> Dict[str, bool]:
+        """The service flags of a pair's coverage row in ``state``."""
+        bit = self.state_bits[state]
+        return {flag: bool(self.flags[flag][pair] & bit) for flag in SERVICE_FLAGS}
+
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (
+                self.pair_provider,
+                self.pair_insurance,
+                self.coverage,
+                self.insurance_offsets,
+                *self.flags.values(),
+            )
+        )
@@ -0,0 +1,129 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+from app.core.coverage_snapshot import CoverageSnapshot, coverage_snapshot
+
+
+class CoverageIndex:
+    """Inverted coverage indexes: insurance → state → providers, provider →
+    insurance → states.
+
+    Both are built in one pass over a snapshot's coverage rows and hold the
+    finished response bodies, so a lookup is a dict access. Insurances are
+    keyed by lower-cased name, providers by id.
+    """
+
+    def __init__(self, snapshot: CoverageSnapshot):
+        self.built_at = snapshot.built_at
+        providers = [
+            {"id": int(snapshot.provider_ids[i]), "name": snapshot.provider(i)["name"]}
+            for i in range(snapshot.provider_count)
+        ]
+        names = snapshot.insurance_names
+        states = snapshot.state_codes
+
+        by_insurance = defaultdict(lambda: defaultdict(set))
+        by_provider = defaultdict(lambda: defaultdict(set))
+        for provider, insurance, state in zip(
+            snapshot.coverage_provider.tolist(),
+            snapshot.coverage_insurance.tolist(),
+            snapshot.coverage_state.tolist(),
+        ):
+            by_insurance[insurance][state].add(provider)
+            by_provider[provider][insurance].add(state)
+
+        self._insurances: Dict[str, Dict] = {}
+        for insurance, coverage in by_insurance.items():
+            self._insurances[names[insurance].lower()] = {
+                "insurance": names[insurance],
+                "states": [
+                    {
+                        "state": states[state],
+                        "providers": sorted(
+                            (providers[p] for p in coverage[state]),
+                            key=lambda row: row["name"].lower(),
+                        ),
+                    }
+                    for state in sorted(coverage, key=states.__getitem__)
+                ],
+            }
+
+        self._providers: Dict[int, Dict] = {}
+        for provider, coverage in by_provider.items():
+            self._providers[providers[provider]["id"]] = {
+                "provider": providers[provider],
+                "states": sorted(
+                    {states[s] for codes in coverage.values() for s in codes}
+                ),
+                "insurances": [
+                    {
+                        "insurance": names[insurance],
+                        "states": sorted(states[s] for s in coverage[insurance]),
+                    }
+                    for insurance in sorted(coverage, key=lambda i: names[i].lower())
+                ],
+            }
+
+    def by_insurance(self, name: str) -> Optional[Dict]:
+        return self._insurances.get(name.strip().lower())
+
+    def by_provider(self, provider_id: int) -> Optional[Dict]:
+        return self._providers.get(provider_id)
+
+    def stats(self) -> dict:
+        return {
+            "built_at": self.built_at,
+            "insurances": len(self._insurances),
+            "providers": len(self._providers),
+        }
+
+
+class CoverageIndexStore:
+    """Keeps a CoverageIndex in step with the current coverage snapshot.
+
+    Uploads and provider edits rebuild the snapshot; the next lookup sees the
+    new file and rebuilds the index from it once.
+    """
+
+    def __init__(self, snapshots=coverage_snapshot):
+        self.snapshots = snapshots
+        self._source: Optional[CoverageSnapshot] = None
+        self._index: Optional[CoverageIndex] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self) -> Optional[CoverageIndex]:
+        """The index for the latest snapshot, or None if none has been built."""
+        snapshot = self.snapshots.get()
+        if snapshot is None:
+            return None
+        if snapshot is not self._source:
+            with self._lock:
+                if snapshot is not self._source:
+                    self._index = CoverageIndex(snapshot)
+                    self._source = snapshot
+                    self.builds += 1
+        return self._index
+
+    def current(self) -> Optional[CoverageIndex]:
+        """The index if it is up to date with the snapshot, without building."""
+        snapshot = self.snapshots.get()
+        if snapshot is None or snapshot is not self._source:
+            return None
+        return self._index
+
+    def stats(self) -> dict:
+        index = self._index
+        return {"builds": self.builds, **(index.stats() if index else {})}
+
+
+coverage_index = CoverageIndexStore()
+
+
+def load_index() -> Optional[CoverageIndex]:
+    """The current index, building the snapshot first if there is none yet."""
+    index = coverage_index.get()
+    if index is None and coverage_index.snapshots.refresh():
+        index = coverage_index.get()
+    return index
@@ -0,0 +1,460 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.supabase import supabase as sb
+from app.core.coverage_bitmap import SERVICE_FLAGS, CoverageBitmap
+
+MAGIC = b"COVSNAP\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIId")
+
+SECTIONS = (
+    "provider_ids",
+    "provider_text_offsets",
+    "provider_text",
+    "insurance_ids",
+    "insurance_text_offsets",
+    "insurance_text",
+    "state_text_offsets",
+    "state_text",
+    "coverage_provider",
+    "coverage_insurance",
+    "coverage_state",
+    "coverage_flags",
+    "state_index",
+)
+SECTION_TABLE = struct.Struct("<" + "QQ" * len(SECTIONS))
+
+SECTION_DTYPES = {
+    "provider_ids": "<i8",
+    "provider_text_offsets": "<u4",
+    "provider_text": "u1",
+    "insurance_ids": "<i8",
+    "insurance_text_offsets": "<u4",
+    "insurance_text": "u1",
+    "state_text_offsets": "<u4",
+    "state_text": "u1",
+    "coverage_provider": "<u4",
+    "coverage_insurance": "<u4",
+    "coverage_state": "<u2",
+    "coverage_flags": "u1",
+    "state_index": "<u4",
+}
+
+# Provider strings are stored in this order, one entry per field
+PROVIDER_FIELDS = ("name", "phone", "email", "dedicated_link")
+
+# Bit per service flag in coverage_flags
+FLAG_BITS = {flag: 1 << i for i, flag in enumerate(SERVICE_FLAGS)}
+
+
+def _encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [(value or "").encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum(np.array([len(value) for value in encoded], np.int64))
+    return offsets, b"".join(encoded)
+
+
+def write_snapshot(
+    path: str,
+    providers: List[Dict],
+    insurances: List[Dict],
+    coverage: List[Dict],
+):
+    """Encode rows into a snapshot at ``path``, replacing any existing file.
+
+    Coverage rows whose provider or insurance is unknown are dropped.
+    """
+    provider_index = {row["id"]: i for i, row in enumerate(providers)}
+    insurance_index = {row["id"]: i for i, row in enumerate(insurances)}
+    rows = [
+        row
+        for row in coverage
+        if row["provider_id"] in provider_index
+        and row["insurance_id"] in insurance_index
+    ]
+    states = sorted({row["state_code"] for row in rows})
+    state_index = {code: i for i, code in enumerate(states)}
+
+    coverage_provider = np.array(
+        [provider_index[row["provider_id"]] for row in rows], dtype="<u4"
+    )
+    coverage_insurance = np.array(
+        [insurance_index[row["insurance_id"]] for row in rows], dtype="<u4"
+    )
+    coverage_state = np.array(
+        [state_index[row["state_code"]] for row in rows], dtype="<u2"
+    )
+    coverage_flags = np.zeros(len(rows), dtype="u1")
+    for flag, bit in FLAG_BITS.items():
+        coverage_flags |= np.array([bool(row.get(flag)) for row in rows], "u1") * bit
+
+    order = np.lexsort((coverage_provider, coverage_insurance, coverage_state))
+    coverage_state = coverage_state[order]
+    state_offsets = np.searchsorted(coverage_state, np.arange(len(states) + 1))
+
+    provider_text_offsets, provider_text = _encode_strings(
+        [row.get(field) for row in providers for field in PROVIDER_FIELDS]
+    )
+    insurance_text_offsets, insurance_text = _encode_strings(
+        [row["name"] for row in insurances]
+    )
+    state_text_offsets, state_text = _encode_strings(states)
+    sections = {
+        "provider_ids": np.array([row["id"] for row in providers], dtype="<i8"),
+        "provider_text_offsets": provider_text_offsets,
+        "provider_text": provider_text,
+        "insurance_ids": np.array([row["id"] for row in insurances], dtype="<i8"),
+        "insurance_text_offsets": insurance_text_offsets,
+        "insurance_text": insurance_text,
+        "state_text_offsets": state_text_offsets,
+        "state_text": state_text,
+        "coverage_provider": coverage_provider[order],
+        "coverage_insurance": coverage_insurance[order],
+        "coverage_state": coverage_state,
+        "coverage_flags": coverage_flags[order],
+        "state_index": state_offsets.astype("<u4"),
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # A unique temporary name lets several workers rebuild at once safely
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            position = HEADER.size + SECTION_TABLE.size
+            table = []
+            payloads = []
+            for name in SECTIONS:
+                data = sections[name]
+                data = data.tobytes() if isinstance(data, np.ndarray) else data
+                position += -position % 8
+                table += [position, len(data)]
+                payloads.append((position, data))
+                position += len(data)
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(providers),
+                    len(insurances),
+                    len(states),
+                    len(rows),
+                    time.time(),
+                )
+            )
+            f.write(SECTION_TABLE.pack(*table))
+            for offset, data in payloads:
+                f.write(b"\x00" * (offset - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CoverageSnapshot:
+    """Read-only, memory-mapped view of providers, insurances and coverage.
+
+    The file is a header with row counts, a table of (offset, length) for each
+    entry of SECTIONS, then 8-byte aligned little-endian arrays. Strings are
+    dictionary-encoded: every provider field, insurance name and state code is
+    stored once in a UTF-8 blob addressed through a uint32 offsets array.
+    Coverage rows are fixed-width parallel arrays sorted by (state, insurance,
+    provider), and ``state_index`` holds the first row of each state, so one
+    state's coverage is a contiguous slice.
+
+    The arrays point straight into the map, so every worker mapping the same
+    file shares its pages through the OS and opening it only parses the
+    header. Writers rename a new file into place instead of editing this one.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *counts, built_at = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} coverage snapshot")
+        self.provider_count, self.insurance_count, self.state_count = counts[:3]
+        self.coverage_count = counts[3]
+        self.built_at = built_at
+        table = SECTION_TABLE.unpack_from(self._map, HEADER.size)
+        for i, name in enumerate(SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            dtype = np.dtype(SECTION_DTYPES[name])
+            setattr(
+                self,
+                name,
+                np.frombuffer(
+                    self._map, dtype, length // dtype.itemsize, offset=offset
+                ),
+            )
+        self._states = {self._string("state", i): i for i in range(self.state_count)}
+        self._insurance_names: Optional[List[str]] = None
+        self._bitmap: Optional[CoverageBitmap] = None
+
+    def _string(self, table: str, i: int) -> str:
+        offsets = getattr(self, f"{table}_text_offsets")
+        text = getattr(self, f"{table}_text")
+        return text[offsets[i] : offsets[i + 1]].tobytes().decode()
+
+    @property
+    def state_codes(self) -> List[str]:
+        return list(self._states)
+
+    @property
+    def insurance_names(self) -> List[str]:
+        if self._insurance_names is None:
+            self._insurance_names = [
+                self._string("insurance", i) for i in range(self.insurance_count)
+            ]
+        return self._insurance_names
+
+    @property
+    def bitmap(self) -> CoverageBitmap:
+        """Per-(provider, insurance) state bitsets, built on first use."""
+        if self._bitmap is None:
+            self._bitmap = CoverageBitmap.from_rows(
+                self.state_codes,
+                self.insurance_count,
+                self.coverage_provider,
+                self.coverage_insurance,
+                self.coverage_state,
+                self.coverage_flags,
+                FLAG_BITS,
+            )
+        return self._bitmap
+
+    def provider(self, i: int) -> Dict:
+        fields = len(PROVIDER_FIELDS)
+        row = {
+            field: self._string("provider", i * fields + j)
+            for j, field in enumerate(PROVIDER_FIELDS)
+        }
+        row["id"] = int(self.provider_ids[i])
+        return row
+
+    def state_rows(self, state: str) -> slice:
+        """The contiguous coverage rows for a state code."""
+        i = self._states.get(state)
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.state_index[i]), int(self.state_index[i + 1]))
+
+    def matching_insurances(self, insurance: str) -> np.ndarray:
+        """Indexes of insurances whose name contains ``insurance``, ignoring case."""
+        query = insurance.strip().lower()
+        return np.array(
+            [i for i, name in enumerate(self.insurance_names) if query in name.lower()],
+            dtype="<u4",
+        )
+
+    def _result(self, provider: int, state: str, flags: Dict[str, bool]) -> Dict:
+        details = self.provider(provider)
+        return {
+            "id": details["id"],
+            "dme_name": details["name"],
+            "state": state,
+            "phone": details["phone"],
+            "email": details["email"],
+            "dedicated_link": details["dedicated_link"],
+            **flags,
+        }
+
+    def search(
+        self, state: str, insurance: str, flags: Sequence[str] = ()
+    ) -> List[Dict]:
+        """Providers covering ``insurance`` in ``state`` or in every state.
+
+        Returns one row per provider, shaped like the search RPC's results.
+        With ``flags``, only coverage rows offering every one of those
+        services count, and the lookup goes through the bitmap.
+        """
+        insurances = self.matching_insurances(insurance)
+        if flags:
+            return self._search_bitmap(state, insurances, flags)
+        results: Dict[int, Dict] = {}
+        for code in (state, "ALL"):
+            rows = self.state_rows(code)
+            matches = np.isin(self.coverage_insurance[rows], insurances)
+            for row in np.flatnonzero(matches) + rows.start:
+                provider = int(self.coverage_provider[row])
+                if provider not in results:
+                    row_flags = int(self.coverage_flags[row])
+                    results[provider] = self._result(
+                        provider,
+                        state,
+                        {
+                            flag: bool(row_flags & bit)
+                            for flag, bit in FLAG_BITS.items()
+                        },
+                    )
+        return list(results.values())
+
+    def _search_bitmap(
+        self, state: str, insurances: np.ndarray, flags: Sequence[str]
+    ) -> List[Dict]:
+        bitmap = self.bitmap
+        pairs, matched = bitmap.lookup(state, insurances, flags)
+        direct = (matched & bitmap.state_bits.get(state, np.uint64(0))) != 0
+        results: Dict[int, Dict] = {}
+        # Same order as the row scan: the state's own rows first, then ALL
+        for in_state, code in ((True, state), (False, "ALL")):
+            for pair in pairs[direct == in_state]:
+                provider = int(bitmap.pair_provider[pair])
+                if provider not in results:
+                    results[provider] = self._result(
+                        provider, state, bitmap.row_flags(pair, code)
+                    )
+        return list(results.values())
+
+
+def snapshot_path() -> str:
+    # A blank COVERAGE_SNAPSHOT_PATH= in .env means the default too
+    return os.getenv("COVERAGE_SNAPSHOT_PATH") or os.path.join(
+        tempfile.gettempdir(), "annabella_coverage.snapshot"
+    )
+
+
+def _read_table(
+    table: str, columns: str, order: Sequence[str], page_size: int = 1000
+) -> Iterator[Dict]:
+    start = 0
+    while True:
+        query = sb.table(table).select(columns)
+        for column in order:
+            query = query.order(column)
+        rows = query.range(start, start + page_size - 1).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def load_rows() -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    providers = list(
+        _read_table(
+            os.getenv("PROVIDERS_TABLE", "providers"),
+            "id, name, phone, email, dedicated_link",
+            ["id"],
+        )
+    )
+    insurances = list(_read_table(os.getenv("INSURANCES_TABLE"), "id, name", ["id"]))
+    coverage = list(
+        _read_table(
+            os.getenv("PROVIDER_COVERAGE_TABLE"),
+            "provider_id, insurance_id, state_code, " + ", ".join(FLAG_BITS),
+            ["provider_id", "insurance_id", "state_code"],
+        )
+    )
+    return providers, insurances, coverage
+
+
+class SnapshotStore:
+    """Opens the current snapshot and swaps to a new one after a rebuild."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._snapshot: Optional[CoverageSnapshot] = None
+        self._file_id = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_error: Optional[str] = None
+        self.listeners: List[Callable[[], None]] = []
+        self._stale = False
+        self._rebuilding = False
+
+    @property
+    def path(self) -> str:
+        return self._path or snapshot_path()
+
+    def get(self) -> Optional[CoverageSnapshot]:
+        """The latest snapshot on disk, or None if none has been built yet."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            with self._lock:
+                if file_id != self._file_id:
+                    # The old map is released once no reader holds its arrays
+                    self._snapshot = CoverageSnapshot(self.path)
+                    self._file_id = file_id
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """Rebuild the snapshot from the database; failures keep the old one."""
+        try:
+            write_snapshot(self.path, *load_rows())
+        except Exception as e:
+            self.refresh_errors += 1
+            self.last_error = str(e)
+            return False
+        self.refreshes += 1
+        self.last_error = None
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                # The snapshot itself was written; keep serving it
+                print(f"Coverage snapshot listener failed: {e}")
+        return True
+
+    def refresh_in_background(self):
+        """Mark the snapshot stale and rebuild it on a background thread.
+
+        Requests arriving while a rebuild runs collapse into one more rebuild
+        after it, so a burst of small uploads costs at most two.
+        """
+        with self._lock:
+            self._stale = True
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild, name="coverage-snapshot", daemon=True
+        ).start()
+
+    def _rebuild(self):
+        while True:
+            with self._lock:
+                if not self._stale:
+                    self._rebuilding = False
+                    return
+                self._stale = False
+            self.refresh()
+
+    def stats(self) -> dict:
+        snapshot = self.get()
+        return {
+            "path": self.path,
+            "built_at": snapshot.built_at if snapshot else None,
+            "providers": snapshot.provider_count if snapshot else 0,
+            "insurances": snapshot.insurance_count if snapshot else 0,
+            "coverage_rows": snapshot.coverage_count if snapshot else 0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_error": self.last_error,
+            "rebuilding": self._rebuilding,
+        }
+
+
+coverage_snapshot = SnapshotStore()
+
+
+if __name__ == "__main__":
+    # python -m app.core.coverage_snapshot
+    if not coverage_snapshot.refresh():
+        raise SystemExit(coverage_snapshot.last_error)
+    print(coverage_snapshot.stats())
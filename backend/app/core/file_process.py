@@ -1,8 +1,27 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, List
+import asyncio
 import os
-import io
+import math
+import time
+from starlette.concurrency import run_in_threadpool
 from app.core.supabase import supabase as sb
+from app.core.reference_cache import reference_data
+from app.core.cache import search_cache
+from app.core import upload_jobs
+from app.core.validation import validate_coverage_frame
+from app.core.readers import read_upload_frame, COVERAGE_COLUMNS, UploadSource
+from app.core import fingerprints
+from app.core.job_scheduler import stage_timer
+from app.core.coverage_snapshot import coverage_snapshot
+from app.core.coverage_index import coverage_index
+
+# Coverage rows per upsert; also the granularity of upload checkpoints
+COVERAGE_BATCH_SIZE = 500
+
+# Search results cached before a snapshot rebuild finished are out of date
+coverage_snapshot.listeners.append(search_cache.clear)
 
 
 def convert_bool(val: str) -> bool:
@@ -89,7 +108,47 @@ def process_dme_data(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
 
 
 # V4 Functions
+BOOLEAN_COLUMNS = (
+    "resupply_available",
+    "accessories_available",
+    "lactation_services_available",
+    "medicaid",
+)
+
+
+def to_category(series: pd.Series, strip: bool = False) -> pd.Series:
+    """Dictionary-encode a text column, stripping each distinct value once."""
+    codes, uniques = pd.factorize(series)
+    values = pd.Series(uniques, dtype=object)
+    if strip:
+        values = values.str.strip()
+    # Stripping can merge values, so re-encode the distinct values
+    categories = pd.Categorical(values)
+    codes = pd.api.extensions.take(
+        categories.codes, codes, allow_fill=True, fill_value=-1
+    )
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories.categories),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def to_yes_mask(series: pd.Series) -> np.ndarray:
+    """True where a column says "yes", comparing each distinct value once."""
+    codes, uniques = pd.factorize(series)
+    yes = pd.Index(uniques).astype(str).str.strip().str.lower() == "yes"
+    return pd.api.extensions.take(yes, codes, allow_fill=True, fill_value=False)
+
+
 def normalize_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    """Normalize an upload's headers and values in place.
+
+    Low-cardinality text columns become categoricals, so each provider,
+    insurance and state string is stored once however many rows repeat it,
+    and every per-value operation (strip, ffill, "yes" checks) runs on the
+    distinct values or on integer codes rather than on every row.
+    """
     # Strip weird chars, lower-case headers
     raw.columns = (
         raw.columns.str.replace(r"\xa0", " ", regex=True)
@@ -98,28 +157,51 @@ def normalize_frame(raw: pd.DataFrame) -> pd.DataFrame:
         .str.replace(" ", "_")
     )
 
-    # Forward-fill provider-level fields down the block
-    raw[["dme_name", "phone_number", "email"]] = raw[
-        ["dme_name", "phone_number", "email"]
-    ].ffill()
+    # Forward-fill provider-level fields down the block; on a categorical
+    # this only copies integer codes
+    for col in ["dme_name", "phone_number", "email"]:
+        if raw[col].dtype == object:
+            raw[col] = to_category(raw[col])
+        raw[col] = raw[col].ffill()
 
     # Clean booleans
-    for col in [
-        "resupply_available",
-        "accessories_available",
-        "lactation_services_available",
-        "medicaid",
-    ]:
-        if col in raw:
-            raw[col] = raw[col].astype(str).str.strip().str.lower().eq("yes")
+    for col in BOOLEAN_COLUMNS:
+        # Parquet and XLSX files may already carry real booleans
+        if col in raw and raw[col].dtype != bool:
+            raw[col] = to_yes_mask(raw[col])
 
     # Trim whitespace in text cols
-    raw["state"] = raw["state"].str.strip()
-    raw["insurance"] = raw["insurance"].str.strip()
+    raw["state"] = to_category(raw["state"], strip=True)
+    raw["insurance"] = to_category(raw["insurance"], strip=True)
 
     return raw
 
 
+def map_codes(series: pd.Series, mapping: Dict) -> np.ndarray:
+    """Map a categorical column through ``mapping``, once per category."""
+    # An object array keeps ids as Python ints next to unknown names' None
+    looked_up = np.array(
+        [mapping.get(name) for name in series.cat.categories], dtype=object
+    )
+    return pd.api.extensions.take(
+        looked_up, series.cat.codes.to_numpy(), allow_fill=True, fill_value=None
+    )
+
+
+def coverage_batch(
+    df: pd.DataFrame, provider_ids: np.ndarray, insurance_ids: np.ndarray, rows: slice
+) -> List[Dict]:
+    """Build the coverage upsert payload for one slice of rows."""
+    part = df.iloc[rows]
+    columns = {
+        "provider_id": provider_ids[rows].tolist(),
+        "insurance_id": insurance_ids[rows].tolist(),
+        "state_code": part["state"].tolist(),
+        **{col: part[col].tolist() for col in BOOLEAN_COLUMNS},
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
 # --- 🟢 1. provider fields: booleans removed
 def batch_upsert_providers(
     df: pd.DataFrame, sb, batch_size: int = 100
@@ -189,86 +271,216 @@ def batch_get_insurance_ids(insurance_names: List[str], sb) -> Dict[str, str]:
     return name_to_id
 
 
-async def process_csv_async(job_id: str, file_content: bytes):
-    """Async CSV processing with progress tracking."""
+def parse_upload(job_id: str, filename: str) -> pd.DataFrame:
+    """Read and normalize a stored upload."""
+    df = read_upload_frame(upload_jobs.raw_path(job_id), filename, COVERAGE_COLUMNS)
+    return normalize_frame(df)
+
+
+def upsert_coverage_batch(batch: List[Dict]):
+    sb.table(os.getenv("PROVIDER_COVERAGE_TABLE")).upsert(
+        batch, on_conflict="provider_id,insurance_id,state_code"
+    ).execute()
+
+
+async def process_csv_async(job_id: str):
+    """Async CSV processing with progress tracking.
+
+    Each stage records its result in the job checkpoint, so a failed or
+    interrupted job resumes from the last committed coverage batch instead of
+    row zero. Every stage is idempotent: providers and insurances are looked up
+    by name before inserting and coverage is upserted on its natural key, so
+    replaying a batch that already committed is harmless.
+
+    Parsing and database calls run in the threadpool, which keeps the event
+    loop free for searches and makes every stage boundary a point where the
+    job scheduler can cancel the upload. The job's lock is released however
+    the run ends.
+    """
+    from app.api.routes import processing_status
+
+    status = processing_status[job_id]
+    status["status"] = "processing"
     try:
-        from app.api.routes import processing_status
+        checkpoint = upload_jobs.load_checkpoint(job_id)
+
+        # Parse the upload (CSV, compressed CSV, Parquet or XLSX)
+        with stage_timer(status, "parse"):
+            df = await run_in_threadpool(parse_upload, job_id, checkpoint["filename"])
+
+        # Skip files whose content matches the last applied upload, ignoring
+        # row order and whitespace
+        options = checkpoint["options"]
+        hashes = {"content_hash": options.get("content_hash")}
+        if os.getenv("UPLOAD_DEDUPE_NORMALIZED", "true").lower() == "true":
+            hashes["normalized_hash"] = await run_in_threadpool(
+                fingerprints.normalized_hash, df
+            )
+            previous = not options.get("force") and (
+                fingerprints.matches_last_applied(
+                    "normalized_hash", hashes["normalized_hash"]
+                )
+            )
+            if previous:
+                status.update(fingerprints.deduplicated_status(previous))
+                upload_jobs.save_status(job_id, status)
+                upload_jobs.finish_job(job_id)
+                return
 
-        # Parse CSV
-        df = pd.read_csv(io.StringIO(file_content.decode()))
-        df = normalize_frame(df)
+        # Validate every row before any write
+        with stage_timer(status, "validate"):
+            states = await reference_data["states"].get()
+            valid_states = {state["abbreviation"] for state in states} | {"ALL"}
+            invalid, report = await run_in_threadpool(
+                validate_coverage_frame, df, valid_states
+            )
+        status["validation"] = report
+        if report["invalid_rows"]:
+            if options.get("on_invalid") == "reject":
+                status.update(
+                    {
+                        "status": "error",
+                        "message": (
+                            f"Upload rejected: {report['invalid_rows']} of "
+                            f"{report['total_rows']} rows failed validation"
+                        ),
+                        "resumable": False,
+                    }
+                )
+                upload_jobs.save_status(job_id, status)
+                # Nothing was written and a resume would fail the same way
+                upload_jobs.finish_job(job_id)
+                return
+            upload_jobs.save_quarantine(job_id, df[invalid])
+            df = df[~invalid]
 
         total_rows = len(df)
-        processing_status[job_id]["total"] = total_rows
-        processing_status[job_id]["message"] = f"Processing {total_rows} rows..."
+        status["total"] = total_rows
+        status["message"] = f"Processing {total_rows} rows..."
 
         # Batch process providers
-        provider_name_to_id = batch_upsert_providers(df, sb)
-        processing_status[job_id]["progress"] = total_rows * 0.6
-        processing_status[job_id]["companies_loaded"] = len(provider_name_to_id)
+        with stage_timer(status, "providers"):
+            provider_name_to_id = checkpoint["provider_name_to_id"]
+            if provider_name_to_id is None:
+                provider_name_to_id = await run_in_threadpool(
+                    batch_upsert_providers, df, sb
+                )
+                checkpoint["provider_name_to_id"] = provider_name_to_id
+                upload_jobs.save_checkpoint(job_id, checkpoint)
+        status["progress"] = total_rows * 0.6
+        status["companies_loaded"] = len(provider_name_to_id)
 
         # Batch process insurance IDs
-        insurance_names = df["insurance"].unique().tolist()
-        insurance_name_to_id = batch_get_insurance_ids(insurance_names, sb)
-        processing_status[job_id]["progress"] = total_rows * 0.8
-
-        # Prepare coverage records with vectorized operations
-        df["provider_id"] = df["dme_name"].map(provider_name_to_id)
-        df["insurance_id"] = df["insurance"].map(insurance_name_to_id)
-
-        coverage_records = (
-            df[
-                [
-                    "provider_id",
-                    "insurance_id",
-                    "state",
-                    "resupply_available",
-                    "accessories_available",
-                    "lactation_services_available",
-                    "medicaid",
-                ]
-            ]
-            .rename(columns={"state": "state_code"})
-            .to_dict("records")
-        )
-
-        # Batch upsert coverage records
-        batch_size = 500
-        for i in range(0, len(coverage_records), batch_size):
-            batch = coverage_records[i : i + batch_size]
-            sb.table(os.getenv("PROVIDER_COVERAGE_TABLE")).upsert(
-                batch, on_conflict="provider_id,insurance_id,state_code"
-            ).execute()
-
-            # Update progress
-            progress = min(
-                total_rows, (i + batch_size) / len(coverage_records) * total_rows
-            )
-            processing_status[job_id]["progress"] = progress
+        with stage_timer(status, "insurances"):
+            insurance_name_to_id = checkpoint["insurance_name_to_id"]
+            if insurance_name_to_id is None:
+                insurance_names = df["insurance"].unique().tolist()
+                insurance_name_to_id = await run_in_threadpool(
+                    batch_get_insurance_ids, insurance_names, sb
+                )
+                checkpoint["insurance_name_to_id"] = insurance_name_to_id
+                upload_jobs.save_checkpoint(job_id, checkpoint)
+        status["progress"] = total_rows * 0.8
+        upload_jobs.save_status(job_id, status)
+
+        with stage_timer(status, "coverage"):
+            # Look each provider and insurance up once, through category codes
+            provider_ids = map_codes(df["dme_name"], provider_name_to_id)
+            insurance_ids = map_codes(df["insurance"], insurance_name_to_id)
+
+            # Batch upsert coverage records, skipping batches already committed;
+            # each batch's records are built only when it is sent
+            batch_size = COVERAGE_BATCH_SIZE
+            first_batch = checkpoint["coverage_batches_committed"]
+            total_batches = math.ceil(total_rows / batch_size)
+            save_interval = float(os.getenv("UPLOAD_STATUS_SAVE_INTERVAL", "1"))
+            last_saved = time.monotonic()
+            for batch_index in range(first_batch, total_batches):
+                i = batch_index * batch_size
+                batch = coverage_batch(
+                    df, provider_ids, insurance_ids, slice(i, i + batch_size)
+                )
+                await run_in_threadpool(upsert_coverage_batch, batch)
+
+                checkpoint["coverage_batches_committed"] = batch_index + 1
+                upload_jobs.save_checkpoint(job_id, checkpoint)
+
+                # Update progress, saving it at most once per interval so
+                # status streams served by other workers see it move
+                progress = min(total_rows, i + batch_size)
+                status["progress"] = progress
+                if time.monotonic() - last_saved >= save_interval:
+                    upload_jobs.save_status(job_id, status)
+                    last_saved = time.monotonic()
+
+        # New providers and insurances are visible once the refresher reloads
+        reference_data["insurance_providers"].invalidate()
+        reference_data["provider_directory"].invalidate()
+        search_cache.clear()
+
+        # Swap in a fresh coverage snapshot for every worker, and rebuild this
+        # worker's reverse coverage index from it
+        with stage_timer(status, "snapshot"):
+            await run_in_threadpool(coverage_snapshot.refresh)
+            await run_in_threadpool(coverage_index.get)
 
         # Final status
-        processing_status[job_id].update(
+        status.update(
             {
                 "status": "completed",
                 "progress": total_rows,
-                "coverage_entries_loaded": len(coverage_records),
+                "coverage_entries_loaded": total_rows,
                 "message": "CSV processing completed successfully!",
             }
         )
+        upload_jobs.save_status(job_id, status)
+        upload_jobs.finish_job(job_id)
+        fingerprints.record_applied(
+            job_id,
+            hashes,
+            {
+                "total": total_rows,
+                "companies_loaded": status["companies_loaded"],
+                "coverage_entries_loaded": total_rows,
+            },
+        )
 
+    except asyncio.CancelledError:
+        mark_cancelled(job_id, status)
+        raise
     except Exception as e:
-        processing_status[job_id].update(
-            {"status": "error", "message": f"Error processing CSV: {str(e)}"}
+        status.update(
+            {
+                "status": "error",
+                "message": f"Error processing CSV: {str(e)}",
+                "resumable": upload_jobs.load_checkpoint(job_id) is not None,
+            }
         )
+        upload_jobs.save_status(job_id, status)
+    finally:
+        upload_jobs.release_lock(job_id)
+
+
+def mark_cancelled(job_id: str, status: Dict):
+    """Record that an upload was cancelled; it can be resumed later."""
+    status.update(
+        {
+            "status": "cancelled",
+            "message": "CSV processing was cancelled",
+            "resumable": upload_jobs.load_checkpoint(job_id) is not None,
+        }
+    )
+    upload_jobs.save_status(job_id, status)
+    upload_jobs.release_lock(job_id)
 
 
 def process_provider_insurance_states_csv(
-    provider_id: str, file_content: bytes
+    provider_id: str, file_content: UploadSource, filename: str = "upload.csv"
 ) -> dict:
     """Process CSV with Insurances and States columns for a specific provider."""
     try:
-        # Parse CSV
-        df = pd.read_csv(io.StringIO(file_content.decode()))
+        # Parse the upload (CSV, compressed CSV, Parquet or XLSX)
+        df = read_upload_frame(file_content, filename, {"insurance", "state"})
 
         # Clean headers
         df.columns = df.columns.str.strip().str.lower()
@@ -332,6 +544,12 @@ def process_provider_insurance_states_csv(
                 print("skipped row", skipped_rows)
                 return
 
+        # Rebuild the snapshot off the request path; the search cache is
+        # cleared again once the new one is written
+        reference_data["insurance_providers"].invalidate()
+        search_cache.clear()
+        coverage_snapshot.refresh_in_background()
+
         return {
             "mappings_added": mappings_added,
             "skipped_rows": skipped_rows,
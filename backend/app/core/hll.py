@@ -0,0 +1,74 @@
+import hashlib
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+DEFAULT_PRECISION = 12
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with ``2 ** precision`` one-byte registers.
+
+    With the default precision of 12 a sketch is 4 KiB and the relative
+    standard error of ``count`` is ``1.04 / sqrt(4096)``, about 1.6%; 95% of
+    estimates fall within roughly 3.3% of the true count. Sketches built with
+    the same precision merge losslessly by taking the register-wise maximum,
+    so the union of any set of days or providers costs one pass per sketch.
+    """
+
+    def __init__(
+        self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None
+    ):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            self.registers = np.zeros(self.m, dtype=np.uint8)
+        else:
+            if len(registers) != self.m:
+                raise ValueError("register count does not match precision")
+            self.registers = np.frombuffer(registers, dtype=np.uint8).copy()
+
+    @staticmethod
+    def relative_error(precision: int = DEFAULT_PRECISION) -> float:
+        return 1.04 / math.sqrt(1 << precision)
+
+    def add(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, "big")
+        width = 64 - self.precision
+        index = x >> width
+        remainder = x & ((1 << width) - 1)
+        rank = width - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        harmonic = float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        estimate = alpha * m * m / harmonic
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(int(math.log2(len(data))), data)
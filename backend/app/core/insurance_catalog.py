@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from app.core.supabase import supabase as sb
+
+# PostgREST's "function not found", and Postgres' undefined table / function
+MISSING_CHANGE_LOG_CODES = {"PGRST202", "42P01", "42883"}
+
+
+def fetch_changes(since: Optional[int]) -> dict:
+    """Changes to the insurance catalog after ``since`` from the change log.
+
+    The reply is ``{"version", "full", "added", "removed"}``; ``full`` means
+    ``added`` is the whole catalog (no ``since``, or one the log no longer
+    covers) and the caller should replace rather than patch its copy.
+
+    Until insurance_catalog_migration.sql is applied there is no change log;
+    the whole catalog then comes from ``get_insurance_names``, unversioned.
+    """
+    try:
+        return sb.rpc("get_insurance_changes", {"p_since": since}).execute().data
+    except Exception as e:
+        if getattr(e, "code", None) not in MISSING_CHANGE_LOG_CODES:
+            raise
+        print(f"Insurance change log unavailable, listing every name: {e}")
+    listing = sb.rpc("get_insurance_names").execute().data or {}
+    return {
+        "version": None,
+        "full": True,
+        "added": listing.get("insurances") or [],
+        "removed": [],
+    }
+
+
+def merge_changes(changes: Iterable[Dict[str, str]]) -> Tuple[list, list]:
+    """Collapse ``{name: "added" | "removed"}`` deltas, later ones winning."""
+    latest: Dict[str, str] = {}
+    for ops in changes:
+        latest.update(ops)
+    added = sorted(name for name, op in latest.items() if op == "added")
+    removed = sorted(name for name, op in latest.items() if op == "removed")
+    return added, removed
+
+
+class InsuranceCatalog:
+    """Insurance names kept current from the catalog's change log.
+
+    The first load pulls every name; later loads only ask for the changes
+    after the version already held, so a refresh transfers just the names
+    that were added or removed. The last ``history`` deltas are kept, and a
+    client syncing from any version they cover is answered from memory.
+    """
+
+    def __init__(self, history: int = 256):
+        self.names: set = set()
+        self.version: Optional[int] = None
+        self.value: Optional[dict] = None
+        self.full_loads = 0
+        self.delta_loads = 0
+        # (from_version, to_version, {name: op}) per load that changed something
+        self._history: Deque[Tuple[int, int, Dict[str, str]]] = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        """Bring the catalog up to date; the reference data loader."""
+        with self._lock:
+            self.apply(fetch_changes(self.version))
+            return self.value
+
+    def apply(self, changes: dict):
+        # None until there is a change log; every load is then a full list
+        version = None if changes["version"] is None else int(changes["version"])
+        added, removed = changes.get("added") or [], changes.get("removed") or []
+        if changes.get("full") or version is None or self.version is None:
+            self.names = set(added)
+            self._history.clear()
+            self.full_loads += 1
+        else:
+            self.delta_loads += 1
+            if version == self.version and not added and not removed:
+                # Same object back, so nothing downstream rebuilds
+                return
+            ops = {name: "removed" for name in removed}
+            ops.update((name, "added") for name in added)
+            self._history.append((self.version, version, ops))
+            self.names.difference_update(removed)
+            self.names.update(added)
+        self.version = version
+        self.value = {"insurances": sorted(self.names), "version": version}
+
+    def changes_since(self, since: int) -> Optional[dict]:
+        """The delta from ``since`` to the held version, if it can be built
+        from memory; None when the caller has to ask the change log."""
+        version = self.version
+        if version is None or since > version:
+            return None
+        if since == version:
+            return {"version": version, "full": False, "added": [], "removed": []}
+        history = list(self._history)
+        if not history or since < history[0][0]:
+            return None
+        # A delta is the end state of every name it touched, so applying one
+        # that starts before ``since`` is still correct
+        added, removed = merge_changes(ops for _, end, ops in history if end > since)
+        return {"version": version, "full": False, "added": added, "removed": removed}
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "names": len(self.names),
+            "full_loads": self.full_loads,
+            "delta_loads": self.delta_loads,
+            "history": len(self._history),
+        }
+
+
+insurance_catalog = InsuranceCatalog(
+    history=int(os.getenv("INSURANCE_CATALOG_HISTORY", "256"))
+)
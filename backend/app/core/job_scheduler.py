@@ -0,0 +1,191 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Lower numbers run first; interactive loads jump ahead of bulk uploads
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(
+        self,
+        job_id: str,
+        priority: int,
+        fn: Callable[..., Awaitable],
+        args,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ):
+        self.id = job_id
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.on_cancel = on_cancel
+        self.state = "queued"
+        self.submitted_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.future: Optional[asyncio.Future] = None
+
+
+class JobScheduler:
+    """Bounded pool of asyncio workers pulling jobs from a priority queue.
+
+    Jobs are coroutines that push their blocking work to the threadpool, so a
+    running job never stalls the event loop serving searches. Each await is a
+    cancellation point: cancelling a running job cancels its task, cancelling a
+    queued job just marks it so workers skip it.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.jobs: Dict[str, Job] = {}
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._counter = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker_tasks = []
+        self._loop = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker_tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._worker_tasks = [
+            loop.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        running = [job.task for job in self.jobs.values() if job.state == "running"]
+        for job in list(self.jobs.values()):
+            self.cancel(job.id)
+        # Let cancelled jobs record their state before the workers go away
+        await asyncio.gather(*running, return_exceptions=True)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._loop = None
+
+    def submit(
+        self,
+        job_id: str,
+        fn: Callable[..., Awaitable],
+        *args,
+        priority: int = PRIORITY_BULK,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> Job:
+        """Queue ``fn(*args)``; ``on_cancel`` runs if it is cancelled before starting."""
+        self._ensure_started()
+        if self.is_full():
+            raise QueueFull(f"{self.max_queue} jobs are already waiting")
+        job = Job(job_id, priority, fn, args, on_cancel)
+        job.future = self._loop.create_future()
+        self.jobs[job_id] = job
+        self._queue.put_nowait((priority, next(self._counter), job))
+        return job
+
+    async def run(
+        self,
+        job_id: str,
+        fn: Callable[..., Awaitable],
+        *args,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Any:
+        """Submit a job and wait for its result."""
+        job = self.submit(job_id, fn, *args, priority=priority)
+        return await asyncio.shield(job.future)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in ("queued", "running"):
+            return False
+        if job.state == "running":
+            job.task.cancel()
+        else:
+            self._finish(job, "cancelled", error=asyncio.CancelledError())
+            if job.on_cancel is not None:
+                job.on_cancel()
+        return True
+
+    def _finish(self, job: Job, state: str, result=None, error=None):
+        job.state = state
+        self.jobs.pop(job.id, None)
+        if state == "completed":
+            self.completed += 1
+        elif state == "cancelled":
+            self.cancelled += 1
+        else:
+            self.failed += 1
+        if job.future is not None and not job.future.done():
+            if error is None:
+                job.future.set_result(result)
+            elif isinstance(error, asyncio.CancelledError):
+                job.future.cancel()
+            else:
+                job.future.set_exception(error)
+                job.future.exception()
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.state != "queued":
+                continue
+            job.state = "running"
+            job.task = asyncio.ensure_future(job.fn(*job.args))
+            try:
+                result = await job.task
+            except asyncio.CancelledError:
+                self._finish(job, "cancelled", error=asyncio.CancelledError())
+                if not job.task.cancelled():
+                    raise
+            except Exception as e:
+                self._finish(job, "error", error=e)
+            else:
+                self._finish(job, "completed", result=result)
+
+    def is_full(self) -> bool:
+        queued = sum(1 for job in self.jobs.values() if job.state == "queued")
+        return queued >= self.max_queue
+
+    def stats(self) -> dict:
+        states = [job.state for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
+
+
+@contextmanager
+def stage_timer(status: Dict, stage: str):
+    """Record how long a job stage took, in seconds, under status["timings"]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        status.setdefault("timings", {})[stage] = round(
+            time.perf_counter() - started, 3
+        )
+
+
+job_scheduler = JobScheduler(
+    workers=int(os.getenv("UPLOAD_WORKERS", "2")),
+    max_queue=int(os.getenv("UPLOAD_QUEUE_MAX", "20")),
+)
@@ -0,0 +1,251 @@
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = "x-profile-token"
+SAMPLER_THREAD_NAME = "request-profiler"
+
+# Leaf frames of threads that are parked waiting for work
+IDLE_LEAVES = {("threading.py", "wait"), ("queue.py", "get")}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stack of every thread at a fixed interval.
+
+    The event loop thread shows where the request spends time in async code,
+    including the loop waiting in ``select``; threadpool workers show pandas,
+    pydantic, JSON encoding and blocking Supabase calls. Stacks are kept in
+    folded form (``thread;outer;...;leaf`` → sample count) so they load
+    straight into flamegraph.pl or speedscope. Other requests running at the
+    same time are sampled too, so traces read best under light load.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=SAMPLER_THREAD_NAME, daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = threads.get(ident, "thread")
+            if name == SAMPLER_THREAD_NAME:
+                continue
+            leaf = frame.f_code
+            if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join([name, *reversed(labels)])] += 1
+        self.samples += 1
+
+
+class ProfileStore:
+    """A bounded ring of request profiles on disk, oldest evicted first."""
+
+    def __init__(self, directory: Optional[str] = None, max_profiles: int = None):
+        self._directory = directory
+        self._max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        # A blank PROFILES_DIR= in .env means the default too
+        return (
+            self._directory
+            or os.getenv("PROFILES_DIR")
+            or os.path.join(tempfile.gettempdir(), "annabella_profiles")
+        )
+
+    @property
+    def max_profiles(self) -> int:
+        return self._max_profiles or int(os.getenv("PROFILES_MAX", "50"))
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            tmp_path = self._path(profile["id"]) + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(profile, f)
+            os.replace(tmp_path, self._path(profile["id"]))
+            names = sorted(
+                name for name in os.listdir(self.directory) if name.endswith(".json")
+            )
+            # Ids start with the capture time, so name order is age order
+            for name in names[: max(0, len(names) - self.max_profiles)]:
+                os.unlink(os.path.join(self.directory, name))
+
+    def list(self) -> List[Dict]:
+        """Profile metadata, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                profile = self.get(name[: -len(".json")])
+                if profile is not None:
+                    profile.pop("stacks")
+                    profiles.append(profile)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Evicted, or never existed
+            return None
+
+
+profile_store = ProfileStore()
+
+
+def folded(profile: Dict) -> str:
+    """A profile's stacks in the folded format flame graph tools read."""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+
+
+def token_matches(headers: Headers, token: Optional[str]) -> bool:
+    supplied = headers.get(PROFILE_HEADER)
+    return bool(token and supplied) and hmac.compare_digest(supplied, token)
+
+
+class ProfilingMiddleware:
+    """Profile a request when it carries the admin token, or by sampling.
+
+    Only installed when profiling is configured (see ``profiling_settings``),
+    so it costs nothing when off. A profiled request runs with a
+    StackSampler, its trace is written to the ProfileStore once the response
+    has been sent, and the response carries an X-Profile-Id header.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        store: ProfileStore = profile_store,
+        exclude_prefixes=("/api/profiles",),
+    ):
+        self.app = app
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.store = store
+        self.exclude_prefixes = tuple(exclude_prefixes)
+        self.in_flight = 0
+
+    def _should_profile(self, scope: Scope) -> Optional[str]:
+        if scope["path"].startswith(self.exclude_prefixes):
+            return None
+        if token_matches(Headers(scope=scope), self.token):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._should_profile(scope)
+        if trigger is None:
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+            return
+
+        profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        status_code = None
+
+        async def send_with_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(raw=message["headers"])["X-Profile-Id"] = profile_id
+            await send(message)
+
+        concurrent = self.in_flight
+        sampler = StackSampler(self.interval)
+        started = time.time()
+        self.in_flight += 1
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.time() - started
+            self.in_flight -= 1
+            await run_in_threadpool(sampler.stop)
+            await run_in_threadpool(
+                self.store.save,
+                {
+                    "id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status_code,
+                    "trigger": trigger,
+                    "started_at": started,
+                    "duration_ms": duration * 1000,
+                    "interval_ms": self.interval * 1000,
+                    "samples": sampler.samples,
+                    "concurrent_requests": concurrent,
+                    "stacks": dict(sampler.stacks.most_common()),
+                },
+            )
+
+
+def profiling_settings() -> Optional[dict]:
+    """ProfilingMiddleware options, or None when profiling is off."""
+    token = os.getenv("PROFILING_TOKEN") or None
+    sample_rate = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    if not token and sample_rate <= 0:
+        return None
+    return {
+        "token": token,
+        "sample_rate": sample_rate,
+        "interval": float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000,
+    }
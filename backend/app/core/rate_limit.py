@@ -0,0 +1,262 @@
+import ipaddress
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+
+class TokenBucket:
+    """Token bucket state for a single client."""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class SharedBucketStore:
+    """SQLite-backed bucket store so several workers on one host share limits.
+
+    Each take runs in its own IMMEDIATE transaction, which serializes the
+    read-modify-write of a bucket across processes.
+    """
+
+    def __init__(self, path: str, idle_ttl: float = 300.0):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) "
+                "VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            if now - self._last_sweep > self.idle_ttl:
+                conn.execute(
+                    "DELETE FROM rate_limit_buckets WHERE updated < ?",
+                    (now - self.idle_ttl,),
+                )
+                self._last_sweep = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+
+class RateLimiter:
+    """Per-client token buckets plus a concurrency cap for one route.
+
+    A bucket that has been idle for ``burst / rate`` seconds is full again and
+    indistinguishable from a fresh one, so idle buckets are evicted after
+    ``idle_ttl`` without changing behaviour.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_concurrency: int,
+        idle_ttl: float = 300.0,
+        max_buckets: int = 10000,
+        store: Optional[SharedBucketStore] = None,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.idle_ttl = max(idle_ttl, burst / rate)
+        self.max_buckets = max_buckets
+        self.store = store
+        self.in_flight = 0
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, key: str, now: Optional[float] = None) -> float:
+        """Consume one token for ``key``.
+
+        Returns:
+            0 if the request is admitted, otherwise the seconds until a token
+            becomes available.
+        """
+        now = time.monotonic() if now is None else now
+        if self.store is not None:
+            retry_after = self.store.take(
+                f"{self.name}:{key}", self.rate, self.burst, time.time()
+            )
+        else:
+            retry_after = self._take_local(key, now)
+        if retry_after:
+            self.rejected += 1
+        return retry_after
+
+    def _take_local(self, key: str, now: float) -> float:
+        self._evict(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(
+                self.burst, bucket.tokens + (now - bucket.updated) * self.rate
+            )
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def _evict(self, now: float):
+        # Buckets are kept in least-recently-used order, so idle ones sit at
+        # the front and eviction stops at the first active bucket.
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if (
+                now - bucket.updated < self.idle_ttl
+                and len(self._buckets) < self.max_buckets
+            ):
+                break
+            self._buckets.popitem(last=False)
+
+    def enter(self) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+def trusted_proxies() -> list:
+    """Networks from RATE_LIMIT_TRUSTED_PROXIES (comma-separated IPs or CIDRs)."""
+    networks = []
+    for entry in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(","):
+        if entry.strip():
+            networks.append(ipaddress.ip_network(entry.strip(), strict=False))
+    return networks
+
+
+def _is_trusted(host: str, proxies: list) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in proxies)
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller by peer IP.
+
+    X-Forwarded-For is only read when RATE_LIMIT_TRUST_FORWARDED is on and
+    the peer is one of RATE_LIMIT_TRUSTED_PROXIES. The chain is then walked
+    from the right and the first hop that is not a trusted proxy is the
+    client; entries further left are whatever the client chose to send.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() != "true":
+        return f"ip:{peer}"
+    proxies = trusted_proxies()
+    if not _is_trusted(peer, proxies):
+        return f"ip:{peer}"
+    forwarded = request.headers.get("x-forwarded-for", "")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, proxies):
+            return f"ip:{hop}"
+    return f"ip:{hops[0] if hops else peer}"
+
+
+def rate_limited(limiter: RateLimiter):
+    """Build a route dependency that admits requests through ``limiter``."""
+
+    async def dependency(request: Request):
+        if os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "true":
+            yield
+            return
+
+        retry_after = limiter.take(client_key(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        if not limiter.enter():
+            raise HTTPException(
+                status_code=429,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            limiter.leave()
+
+    return dependency
+
+
+def _limiter_from_env(
+    name: str, rate: str, burst: str, concurrency: str
+) -> RateLimiter:
+    prefix = name.upper().replace("-", "_")
+    store_path = os.getenv("RATE_LIMIT_STORE_PATH")
+    idle_ttl = float(os.getenv("RATE_LIMIT_IDLE_TTL", "300"))
+    return RateLimiter(
+        name=name,
+        rate=float(os.getenv(f"{prefix}_RATE_LIMIT_PER_SEC", rate)),
+        burst=float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", burst)),
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+        idle_ttl=idle_ttl,
+        max_buckets=int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "10000")),
+        store=SharedBucketStore(store_path, idle_ttl) if store_path else None,
+    )
+
+
+search_limiter = _limiter_from_env("search", "2", "10", "32")
+track_click_limiter = _limiter_from_env("track-click", "5", "20", "64")
@@ -0,0 +1,134 @@
+import io
+import zipfile
+from typing import BinaryIO, Iterable, Optional, Union
+
+import pandas as pd
+
+# Longest suffixes first so "x.csv.gz" is not taken for a plain ".gz"
+UPLOAD_FORMATS = {
+    ".csv.gz": "csv.gz",
+    ".csv.zip": "zip",
+    ".csv": "csv",
+    ".gz": "csv.gz",
+    ".zip": "zip",
+    ".parquet": "parquet",
+    ".xlsx": "xlsx",
+}
+
+# Raw bytes, a path to the stored upload, or a binary file object
+UploadSource = Union[bytes, str, BinaryIO]
+
+# Columns the coverage pipeline reads, as named after normalize_frame
+COVERAGE_COLUMNS = {
+    "dme_name",
+    "phone_number",
+    "email",
+    "dedicated_link",
+    "insurance",
+    "state",
+    "medicaid",
+    "resupply_available",
+    "accessories_available",
+    "lactation_services_available",
+}
+
+
+def upload_format(filename: str) -> str:
+    """Map an upload filename to one of the supported formats.
+
+    Raises:
+        ValueError: If the extension is not supported
+    """
+    name = (filename or "").lower()
+    for suffix, fmt in UPLOAD_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    raise ValueError(
+        "File must be a CSV (optionally .gz or .zip compressed), Parquet or XLSX"
+    )
+
+
+def normalize_column_name(name: str) -> str:
+    """Same header normalization normalize_frame applies to whole frames."""
+    return str(name).replace("\xa0", " ").strip().lower().replace(" ", "_")
+
+
+def _as_file(source: UploadSource) -> Union[str, BinaryIO]:
+    # Paths and file objects are read in place; only bytes need a wrapper
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _read_zip(source: UploadSource) -> pd.DataFrame:
+    with zipfile.ZipFile(_as_file(source)) as archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and info.filename.lower().endswith(".csv")
+        ]
+        if len(members) != 1:
+            raise ValueError("ZIP upload must contain exactly one CSV file")
+        # ZipFile.open decompresses lazily as the parser reads
+        with archive.open(members[0]) as member:
+            return pd.read_csv(member)
+
+
+def _read_parquet(
+    source: UploadSource, columns: Optional[Iterable[str]]
+) -> pd.DataFrame:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads require the pyarrow package")
+
+    parquet_file = pq.ParquetFile(_as_file(source))
+    selected = None
+    if columns is not None:
+        wanted = set(columns)
+        selected = [
+            name
+            for name in parquet_file.schema_arrow.names
+            if normalize_column_name(name) in wanted
+        ]
+    return parquet_file.read(columns=selected).to_pandas()
+
+
+def _read_xlsx(source: UploadSource) -> pd.DataFrame:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        raise ValueError("XLSX uploads require the openpyxl package")
+    return pd.read_excel(_as_file(source), engine="openpyxl")
+
+
+def read_upload_frame(
+    source: UploadSource, filename: str, columns: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """Parse an uploaded file into a raw DataFrame.
+
+    Files are read in binary mode straight from disk: the CSV parser decodes
+    UTF-8 itself, compressed CSVs are decompressed as a stream and Parquet
+    files only read the requested columns. The result still has the file's
+    original headers and goes through the usual normalization.
+
+    Args:
+        source: Path of the stored upload, a binary file object or raw bytes
+        filename: Original filename, used to pick the format
+        columns: Normalized column names the caller needs (Parquet only)
+
+    Returns:
+        The parsed DataFrame
+    """
+    fmt = upload_format(filename)
+    if fmt == "csv":
+        return pd.read_csv(_as_file(source), encoding="utf-8")
+    if fmt == "csv.gz":
+        return pd.read_csv(_as_file(source), compression="gzip", encoding="utf-8")
+    if fmt == "zip":
+        return _read_zip(source)
+    if fmt == "parquet":
+        return _read_parquet(source, columns)
+    return _read_xlsx(source)
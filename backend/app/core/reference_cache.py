@@ -0,0 +1,265 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.compression import brotli
+from app.core.insurance_catalog import insurance_catalog
+from app.core.singleflight import flights, SingleFlight
+from app.core.supabase import supabase as sb
+
+
+class RefreshingValue:
+    """A cached value that is reloaded ahead of expiry and served stale on error.
+
+    ``get`` only blocks when nothing has ever been loaded. Once a value exists
+    it is always returned immediately; an expired value triggers a background
+    reload and failed reloads back off exponentially while the last good copy
+    keeps being served.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        ttl: float,
+        refresh_ahead: float,
+        flight: SingleFlight,
+        max_backoff: float = 60.0,
+    ):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        self.flight = flight
+        self.max_backoff = max_backoff
+        self.value: Any = None
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.next_attempt = 0.0
+        self.listeners: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def is_stale(self, now: float) -> bool:
+        return not self.loaded or now - self.loaded_at >= self.ttl
+
+    def is_due(self, now: float) -> bool:
+        """Whether the refresher should reload now (ahead of expiry, after backoff)."""
+        if now < self.next_attempt:
+            return False
+        return not self.loaded or now - self.loaded_at >= self.ttl - self.refresh_ahead
+
+    async def get(self) -> Any:
+        if not self.loaded:
+            await self.refresh(raise_errors=True)
+        elif self.is_stale(time.monotonic()):
+            self.refresh_in_background()
+        return self.value
+
+    def refresh_in_background(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.refresh())
+
+    async def refresh(self, raise_errors: bool = False):
+        try:
+            value = await self.flight.do(self.name, self.loader)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            backoff = min(self.max_backoff, 2 ** (self.failures - 1))
+            self.next_attempt = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+            print(f"Reference data refresh failed for {self.name}: {e}")
+            if raise_errors:
+                raise
+            return
+        self.value = value
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+        self.failures = 0
+        self.last_error = None
+        self.next_attempt = 0.0
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                # The value itself loaded fine; keep serving it
+                print(f"Reference data listener failed for {self.name}: {e}")
+
+    def invalidate(self):
+        """Mark the value as expired; it keeps being served until reloaded."""
+        self.loaded_at = 0.0
+        self.next_attempt = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "age_seconds": (
+                round(time.monotonic() - self.loaded_at, 1) if self.loaded else None
+            ),
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class ReferenceDataRefresher:
+    """Background loop that reloads every reference value before it expires."""
+
+    def __init__(self, values: Dict[str, RefreshingValue], interval: float = 1.0):
+        self.values = values
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = [value for value in self.values.values() if value.is_due(now)]
+            if due:
+                await asyncio.gather(*(value.refresh() for value in due))
+            await asyncio.sleep(self.interval)
+
+
+def load_states():
+    return sb.table(os.getenv("STATES_TABLE")).select("*").execute().data
+
+
+def load_provider_directory():
+    return (
+        sb.table(os.getenv("PROVIDERS_TABLE", "providers"))
+        .select("id, name, phone, email, dedicated_link")
+        .execute()
+        .data
+    )
+
+
+def _reference_value(name: str, loader: Callable[[], Any]) -> RefreshingValue:
+    return RefreshingValue(
+        name=name,
+        loader=loader,
+        ttl=float(os.getenv("REFERENCE_DATA_TTL", "300")),
+        refresh_ahead=float(os.getenv("REFERENCE_DATA_REFRESH_AHEAD", "60")),
+        flight=flights[name],
+        max_backoff=float(os.getenv("REFERENCE_DATA_MAX_BACKOFF", "60")),
+    )
+
+
+reference_data: Dict[str, RefreshingValue] = {
+    "states": _reference_value("states", load_states),
+    # Loads only what changed since the version already held
+    "insurance_providers": _reference_value(
+        "insurance_providers", insurance_catalog.load
+    ),
+    "provider_directory": _reference_value(
+        "provider_directory", load_provider_directory
+    ),
+}
+
+
+class EncodedPayload:
+    """A JSON response body encoded once, with its version and ETag."""
+
+    def __init__(self, data: dict, gzip_level: int = 9, brotli_quality: int = 11):
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        self.version = hashlib.sha256(canonical.encode()).hexdigest()[:16]
+        # Weak, because the same ETag covers every Content-Encoding
+        self.etag = f'W/"{self.version}"'
+        self.body = json.dumps(
+            {**data, "version": self.version}, separators=(",", ":")
+        ).encode()
+        self.encoded: Dict[str, bytes] = {
+            "gzip": gzip.compress(self.body, compresslevel=gzip_level, mtime=0)
+        }
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=brotli_quality)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header names this payload (weak comparison)."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(
+            tag.removeprefix("W/") == self.etag.removeprefix("W/") for tag in tags
+        )
+
+
+class BootstrapPayload:
+    """States and insurance names for the search page as one encoded body.
+
+    The payload is rebuilt whenever either reference value reloads with new
+    data, so requests only pick up bytes that were compressed ahead of time.
+    """
+
+    def __init__(self, states: RefreshingValue, insurances: RefreshingValue):
+        self.states = states
+        self.insurances = insurances
+        self.current: Optional[EncodedPayload] = None
+        self.builds = 0
+        self._sources: tuple = (None, None)
+        states.listeners.append(self.rebuild)
+        insurances.listeners.append(self.rebuild)
+
+    def rebuild(self):
+        if not (self.states.loaded and self.insurances.loaded):
+            return
+        sources = (self.states.value, self.insurances.value)
+        if all(a is b for a, b in zip(sources, self._sources)):
+            return
+        states, insurances = sources
+        self.current = EncodedPayload(
+            {
+                "states": [
+                    {
+                        "id": row.get("id"),
+                        "name": row.get("name"),
+                        "abbreviation": row.get("abbreviation"),
+                    }
+                    for row in states
+                ],
+                "insurances": insurances.get("insurances") or [],
+                "insurance_version": insurances.get("version"),
+            }
+        )
+        self._sources = sources
+        self.builds += 1
+
+    async def get(self) -> EncodedPayload:
+        await asyncio.gather(self.states.get(), self.insurances.get())
+        # Values set without a reload (tests, first load) are caught here
+        self.rebuild()
+        return self.current
+
+    @property
+    def max_age(self) -> int:
+        return int(os.getenv("BOOTSTRAP_MAX_AGE", "60"))
+
+    def stats(self) -> dict:
+        return {
+            "version": self.current.version if self.current else None,
+            "bytes": len(self.current.body) if self.current else None,
+            "builds": self.builds,
+        }
+
+
+refresher = ReferenceDataRefresher(reference_data)
+
+bootstrap = BootstrapPayload(
+    reference_data["states"], reference_data["insurance_providers"]
+)
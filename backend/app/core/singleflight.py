@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one in-flight execution.
+
+    The first caller for a key starts ``fn`` in the threadpool as a task, so
+    the blocking Supabase client does not stall the event loop; callers
+    arriving while it is running await the same task and receive the same
+    result or exception. Every caller, the first included, awaits the task
+    through ``asyncio.shield``, so a caller that disconnects never cancels
+    the call the others are waiting on. Nothing is cached once it completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.collapsed = 0
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(run_in_threadpool(fn, *args))
+            self._inflight[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight),
+        }
+
+
+flights: Dict[str, SingleFlight] = {
+    name: SingleFlight(name)
+    for name in (
+        "states",
+        "insurance_providers",
+        "provider_directory",
+        "search",
+        "provider",
+        "coverage_index",
+    )
+}
@@ -1,6 +1,7 @@
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import os
+from app.core.transport import install
 
 load_dotenv()
 
@@ -10,4 +11,5 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Missing Supabase credentials in environment variables")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Database calls share a bounded connection pool with retries and a breaker
+supabase: Client = install(create_client(SUPABASE_URL, SUPABASE_KEY))
@@ -0,0 +1,215 @@
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Union
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+
+# Methods that are safe to replay; PostgREST RPCs are POSTs and never retried
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling Supabase while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by every request thread.
+
+    After ``failure_threshold`` failures in a row the breaker opens and calls
+    fail immediately. Once ``reset_timeout`` seconds have passed a single
+    trial call is let through (half-open); its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            failed_trial, self.trial_in_flight = self.trial_in_flight, False
+            if failed_trial or (
+                self.opened_at is None and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """httpx transport adding retries and a circuit breaker to a pooled one.
+
+    Idempotent requests that fail with a network error or a 502/503/504 are
+    retried with full-jitter exponential backoff, as long as the retry still
+    fits in ``retry_budget`` seconds. Every attempt goes through the breaker.
+    """
+
+    def __init__(
+        self,
+        inner: httpx.BaseTransport,
+        breaker: CircuitBreaker,
+        retries: int = 2,
+        backoff: float = 0.2,
+        retry_budget: float = 5.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.inner = inner
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_budget = retry_budget
+        self.sleep = sleep
+        self.retried = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempts = 1 + (self.retries if request.method in IDEMPOTENT_METHODS else 0)
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(
+                    "Supabase circuit breaker is open", request=request
+                )
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.inner.handle_request(request)
+            except Exception as e:
+                self.breaker.record_failure()
+                retryable = isinstance(e, httpx.TransportError)
+                if not retryable or last_attempt or not self._wait(attempt, deadline):
+                    raise
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+            if last_attempt or not self._wait(attempt, deadline):
+                return response
+            response.close()
+        raise AssertionError("unreachable")
+
+    def _wait(self, attempt: int, deadline: float) -> bool:
+        delay = random.uniform(0, self.backoff * 2**attempt)
+        if time.monotonic() + delay > deadline:
+            return False
+        self.retried += 1
+        self.sleep(delay)
+        return True
+
+    def close(self):
+        self.inner.close()
+
+
+def transport_settings() -> Dict[str, Union[int, float, bool]]:
+    return {
+        "max_connections": int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20")),
+        "max_keepalive": int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10")),
+        "keepalive_expiry": float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30")),
+        "http2": os.getenv("SUPABASE_HTTP2", "true").lower() == "true",
+        "connect_timeout": float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3")),
+        "read_timeout": float(os.getenv("SUPABASE_READ_TIMEOUT", "10")),
+        "pool_timeout": float(os.getenv("SUPABASE_POOL_TIMEOUT", "2")),
+        "retries": int(os.getenv("SUPABASE_RETRIES", "2")),
+        "retry_backoff": float(os.getenv("SUPABASE_RETRY_BACKOFF", "0.2")),
+        "retry_budget": float(os.getenv("SUPABASE_RETRY_BUDGET", "5")),
+    }
+
+
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("SUPABASE_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("SUPABASE_BREAKER_RESET", "30")),
+)
+
+
+def build_transport(settings: Dict) -> ResilientTransport:
+    pooled = httpx.HTTPTransport(
+        http2=settings["http2"],
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+    )
+    return ResilientTransport(
+        pooled,
+        breaker,
+        retries=settings["retries"],
+        backoff=settings["retry_backoff"],
+        retry_budget=settings["retry_budget"],
+    )
+
+
+def build_timeout(settings: Dict) -> httpx.Timeout:
+    return httpx.Timeout(
+        settings["read_timeout"],
+        connect=settings["connect_timeout"],
+        pool=settings["pool_timeout"],
+    )
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose session uses the pooled, resilient transport."""
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        settings = transport_settings()
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=build_timeout(settings),
+            follow_redirects=True,
+            transport=build_transport(settings),
+        )
+
+
+def install(client):
+    """Route a Supabase client's database calls through the pooled transport."""
+
+    def init_postgrest_client(rest_url, headers, schema, **kwargs):
+        return PooledPostgrestClient(rest_url, headers=headers, schema=schema)
+
+    client._init_postgrest_client = init_postgrest_client
+    # The PostgREST client is built lazily, and again after auth changes
+    client._postgrest = None
+    return client
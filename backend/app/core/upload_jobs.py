@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Dict, Optional, Union
+import pandas as pd
+
+RAW_FILE = "upload.raw"
+STATUS_FILE = "status.json"
+CHECKPOINT_FILE = "checkpoint.json"
+QUARANTINE_FILE = "quarantine.csv"
+LOCK_FILE = "job.lock"
+
+# Bytes copied per read when spooling an upload to its job directory
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Statuses after which a job no longer changes until it is resumed
+TERMINAL_STATUSES = ("completed", "error", "cancelled")
+
+
+def jobs_dir() -> str:
+    # A blank UPLOAD_JOBS_DIR= in .env means the default too
+    return os.getenv("UPLOAD_JOBS_DIR") or os.path.join(
+        tempfile.gettempdir(), "annabella_upload_jobs"
+    )
+
+
+def job_path(job_id: str, name: str = "") -> str:
+    # Job ids are generated server-side as UUIDs; reject anything path-like
+    if not job_id or os.path.basename(job_id) != job_id or job_id.startswith("."):
+        raise ValueError(f"Invalid job id: {job_id}")
+    return os.path.join(jobs_dir(), job_id, name)
+
+
+def _write_json(path: str, data: Dict):
+    # Write then rename so a crash never leaves a half-written file behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def create_job(
+    job_id: str,
+    content: Union[bytes, BinaryIO],
+    filename: str,
+    status: Dict,
+    options: Optional[Dict] = None,
+):
+    """Persist the raw upload and its initial status and checkpoint.
+
+    ``content`` may be a file object, which is copied to disk in chunks
+    from its current position. The new job is locked for its first run.
+    """
+    os.makedirs(job_path(job_id), exist_ok=True)
+    acquire_lock(job_id)
+    with open(job_path(job_id, RAW_FILE), "wb") as f:
+        if isinstance(content, (bytes, bytearray)):
+            f.write(content)
+        else:
+            shutil.copyfileobj(content, f, COPY_CHUNK_SIZE)
+    save_status(job_id, status)
+    save_checkpoint(
+        job_id,
+        {
+            "filename": filename,
+            "options": options or {},
+            "provider_name_to_id": None,
+            "insurance_name_to_id": None,
+            "coverage_batches_committed": 0,
+        },
+    )
+
+
+def job_exists(job_id: str) -> bool:
+    return os.path.isdir(job_path(job_id))
+
+
+def raw_path(job_id: str) -> str:
+    return job_path(job_id, RAW_FILE)
+
+
+def save_status(job_id: str, status: Dict):
+    os.makedirs(job_path(job_id), exist_ok=True)
+    _write_json(job_path(job_id, STATUS_FILE), status)
+
+
+def load_status(job_id: str) -> Optional[Dict]:
+    return _read_json(job_path(job_id, STATUS_FILE))
+
+
+def save_checkpoint(job_id: str, checkpoint: Dict):
+    _write_json(job_path(job_id, CHECKPOINT_FILE), checkpoint)
+
+
+def load_checkpoint(job_id: str) -> Optional[Dict]:
+    return _read_json(job_path(job_id, CHECKPOINT_FILE))
+
+
+def save_quarantine(job_id: str, rows: pd.DataFrame):
+    """Keep rows that failed validation, with their original row numbers."""
+    rows.assign(row=rows.index + 2).to_csv(
+        job_path(job_id, QUARANTINE_FILE), index=False
+    )
+
+
+def finish_job(job_id: str):
+    """Drop the raw file and checkpoint once a job has fully committed."""
+    for name in (RAW_FILE, CHECKPOINT_FILE):
+        try:
+            os.remove(job_path(job_id, name))
+        except FileNotFoundError:
+            pass
+
+
+def _lock_holder_alive(path: str) -> bool:
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def acquire_lock(job_id: str) -> bool:
+    """Claim a job for this process; False if another process is running it.
+
+    The lock file is created with O_EXCL, so only one worker can hold it. A
+    lock left behind by a process that no longer exists is taken over.
+    """
+    path = job_path(job_id, LOCK_FILE)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _lock_holder_alive(path):
+                return False
+            release_lock(job_id)
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+def release_lock(job_id: str):
+    try:
+        os.remove(job_path(job_id, LOCK_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def prune_jobs(ttl: float, now: Optional[float] = None):
+    """Drop the raw files of jobs that ended more than ``ttl`` seconds ago.
+
+    Completed, failed and cancelled jobs all keep their status (and any
+    quarantined rows); jobs that could have been resumed no longer can.
+    """
+    now = now or time.time()
+    try:
+        job_ids = os.listdir(jobs_dir())
+    except FileNotFoundError:
+        return
+    for job_id in job_ids:
+        try:
+            status_path = job_path(job_id, STATUS_FILE)
+            if now - os.path.getmtime(status_path) < ttl:
+                continue
+            status = load_status(job_id)
+        except (ValueError, OSError):
+            continue
+        if not status or status.get("status") not in TERMINAL_STATUSES:
+            continue
+        if os.path.exists(job_path(job_id, LOCK_FILE)):
+            continue
+        if not os.path.exists(raw_path(job_id)):
+            continue
+        finish_job(job_id)
+        if status.get("resumable"):
+            status.update({"resumable": False, "message": "Upload expired"})
+            save_status(job_id, status)
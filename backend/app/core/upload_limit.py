@@ -0,0 +1,69 @@
+import os
+from typing import Iterable
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the {max_bytes // (1024 * 1024)} MiB limit",
+    )
+
+
+class UploadLimitMiddleware:
+    """Cap request bodies on upload routes before they are spooled.
+
+    A declared Content-Length over ``max_bytes`` is answered with 413 before
+    any of the body is read. Otherwise the body is counted as the multipart
+    parser pulls it in, and the request fails with 413 as soon as the limit
+    is crossed, so an oversized chunked upload never fills the disk.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, path_suffixes: Iterable[str] = ()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_suffixes = tuple(path_suffixes)
+
+    def _limited(self, scope: Scope) -> bool:
+        return scope["method"] == "POST" and scope["path"].endswith(self.path_suffixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._limited(scope):
+            await self.app(scope, receive, send)
+            return
+
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit():
+            if int(declared) > self.max_bytes:
+                error = too_large(self.max_bytes)
+                response = JSONResponse(
+                    {"detail": error.detail}, status_code=error.status_code
+                )
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def counted_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI turns this into the response while parsing the form
+                    raise too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, counted_receive, send)
+
+
+def upload_limit_settings() -> dict:
+    """UploadLimitMiddleware options from the environment."""
+    return {
+        "max_bytes": int(os.getenv("UPLOAD_MAX_MB", "200")) * 1024 * 1024,
+        "path_suffixes": ("/upload_providers", "/upload-insurance-states"),
+    }
@@ -0,0 +1,101 @@
+import pandas as pd
+from typing import Callable, Dict, Iterable, Tuple
+
+# Close to what EmailStr accepts, without per-row calls into email_validator
+EMAIL_PATTERN = r"^[^@\s,;]+@[^@\s,;]+\.[A-Za-z]{2,}$"
+
+# Keep status payloads small; the summary counts always cover every row
+MAX_REPORTED_ROWS = 500
+
+ON_INVALID_MODES = ("quarantine", "reject")
+
+
+def _per_value(series: pd.Series, check: Callable) -> pd.Series:
+    """Apply a vectorized check, once per category for categorical columns."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return check(series)
+    values = pd.Series(series.cat.categories, dtype=object)
+    # The trailing entry answers for missing values (code -1)
+    results = check(pd.concat([values, pd.Series([None])], ignore_index=True))
+    return pd.Series(
+        results.to_numpy()[series.cat.codes.to_numpy()], index=series.index
+    )
+
+
+def _blank(series: pd.Series) -> pd.Series:
+    return series.isna() | series.astype(str).str.strip().eq("")
+
+
+def _bad_email(series: pd.Series) -> pd.Series:
+    return ~series.fillna("").astype(str).str.strip().str.match(EMAIL_PATTERN)
+
+
+def _is_blank(series: pd.Series) -> pd.Series:
+    return _per_value(series, _blank)
+
+
+def _email_text(value) -> str:
+    return "" if pd.isna(value) else str(value).strip()
+
+
+def validate_coverage_frame(
+    df: pd.DataFrame, valid_states: Iterable[str]
+) -> Tuple[pd.DataFrame, Dict]:
+    """Check a normalized coverage frame before anything is written.
+
+    Every rule is evaluated as a vectorized mask over the whole frame, so the
+    only external input is the set of valid state codes.
+
+    Args:
+        df: Frame produced by ``normalize_frame``
+        valid_states: Accepted state codes, including "ALL"
+
+    Returns:
+        A boolean mask of invalid rows and a report with per-rule counts and
+        per-row messages (row numbers match the uploaded file, header = row 1)
+    """
+    checks = {
+        "missing_dme_name": (_is_blank(df["dme_name"]), "Missing DME name"),
+        "missing_insurance": (_is_blank(df["insurance"]), "Missing insurance"),
+        "unknown_state": (
+            ~df["state"].isin(set(valid_states)),
+            "Unknown state",
+        ),
+        "invalid_email": (
+            _per_value(df["email"], _bad_email),
+            "Invalid email",
+        ),
+        "duplicate_coverage": (
+            df.duplicated(["dme_name", "insurance", "state"], keep="first")
+            & ~_is_blank(df["dme_name"]),
+            "Duplicate provider/insurance/state row",
+        ),
+    }
+
+    invalid = pd.Series(False, index=df.index)
+    for mask, _ in checks.values():
+        invalid |= mask
+
+    row_errors: Dict[int, list] = {}
+    reported = df.index[invalid][:MAX_REPORTED_ROWS]
+    for rule, (mask, message) in checks.items():
+        for index in reported[mask[reported].to_numpy()]:
+            detail = message
+            if rule == "unknown_state":
+                detail = f"{message} '{df.at[index, 'state']}'"
+            elif rule == "invalid_email":
+                detail = f"{message} '{_email_text(df.at[index, 'email'])}'"
+            row_errors.setdefault(int(index), []).append(detail)
+
+    report = {
+        "total_rows": len(df),
+        "valid_rows": int((~invalid).sum()),
+        "invalid_rows": int(invalid.sum()),
+        "counts": {rule: int(mask.sum()) for rule, (mask, _) in checks.items()},
+        "errors": [
+            {"row": index + 2, "errors": row_errors[index]}
+            for index in sorted(row_errors)
+        ],
+        "errors_truncated": int(invalid.sum()) > MAX_REPORTED_ROWS,
+    }
+    return invalid, report
@@ -1,18 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 from app.api import routes
+from app.core.reference_cache import refresher
+from app.core.click_sketches import sketch_flusher
+from app.core.job_scheduler import job_scheduler
+from app.core.compression import CompressionMiddleware, compression_settings
+from app.core.transport import breaker
+from app.core.profiling import ProfilingMiddleware, profiling_settings
+from app.core.upload_limit import UploadLimitMiddleware, upload_limit_settings
 import uvicorn
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 # Load environment variables
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep states, insurance names and the provider directory warm
+    refresher.start()
+    sketch_flusher.start()
+    job_scheduler.start()
+    yield
+    # Running uploads are cancelled and keep their checkpoints for a resume
+    await job_scheduler.stop()
+    await refresher.stop()
+    await sketch_flusher.stop()
+
+
 app = FastAPI(
     title="Annabella DME Search Tool API",
     description="API for searching Durable Medical Equipment providers",
     version=os.getenv("APP_VERSION"),
+    lifespan=lifespan,
 )
 
 # Include the router with a prefix
@@ -27,6 +50,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress exports, analytics lists and reference data
+app.add_middleware(CompressionMiddleware, **compression_settings())
+
+# Reject oversized uploads before they are spooled to disk
+app.add_middleware(UploadLimitMiddleware, **upload_limit_settings())
+
+# Profile requests on demand; not installed at all unless configured
+profiling = profiling_settings()
+if profiling is not None:
+    app.add_middleware(ProfilingMiddleware, **profiling)
+
 # Add timeout middleware for long-running requests
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
@@ -38,7 +72,12 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    # An open breaker means Supabase calls are failing fast
+    supabase_status = breaker.stats()
+    return {
+        "status": "healthy" if supabase_status["state"] == "closed" else "degraded",
+        "supabase": supabase_status,
+    }
 
 
 # If running with uvicorn, configure timeouts
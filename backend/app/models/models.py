@@ -52,12 +52,39 @@ class State(BaseModel):
 
 class InsuranceProviders(BaseModel):
     insurances: List[str]
+    version: Optional[int] = None
+
+
+class InsuranceChanges(BaseModel):
+    version: int
+    full: bool = Field(
+        ..., description="added is the whole catalog; replace rather than patch"
+    )
+    added: List[str]
+    removed: List[str]
+
+
+class Bootstrap(BaseModel):
+    states: List[State]
+    insurances: List[str]
+    insurance_version: Optional[int] = None
+    version: str
 
 
 class SearchRequest(BaseModel):
     state: str = Field(..., min_length=2, max_length=2, description="US state code")
     insurance_provider: str = Field(..., description="Full or partial insurance name")
     email: EmailStr
+    medicaid: bool = Field(False, description="Only providers accepting Medicaid")
+    resupply_available: bool = Field(
+        False, description="Only providers offering resupply"
+    )
+    accessories_available: bool = Field(
+        False, description="Only providers offering accessories"
+    )
+    lactation_services_available: bool = Field(
+        False, description="Only providers offering lactation services"
+    )
 
 
 class DMECompany(BaseModel):
@@ -103,6 +130,32 @@ class InsuranceStateUploadResponse(BaseModel):
     message: str
 
 
+class CoverageProvider(BaseModel):
+    id: int
+    name: str
+
+
+class StateCoverage(BaseModel):
+    state: str
+    providers: List[CoverageProvider]
+
+
+class InsuranceCoverage(BaseModel):
+    insurance: str
+    states: List[StateCoverage]
+
+
+class InsuranceStates(BaseModel):
+    insurance: str
+    states: List[str]
+
+
+class ProviderCoverage(BaseModel):
+    provider: CoverageProvider
+    states: List[str]
+    insurances: List[InsuranceStates]
+
+
 ## TRACKING MODELS
 
 
@@ -0,0 +1,170 @@
+"""Benchmark flag-filtered coverage lookups on synthetic data.
+
+Compares three ways of answering "providers covering insurance X in state S
+that offer every requested service":
+
+  rows    filtering a Python list of coverage dicts, as a naive local cache would
+  scan    the snapshot's per-state row slice, then a Python flag check per row
+  bitmap  CoverageBitmap: bitwise ANDs over per-(provider, insurance) words
+
+Run from backend/ with the usual .env (nothing is sent to Supabase), passing
+ten times the production provider count:
+
+    python scripts/bench_coverage_bitmap.py --providers 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.coverage_bitmap import SERVICE_FLAGS  # noqa: E402
+from app.core.coverage_snapshot import (  # noqa: E402
+    FLAG_BITS,
+    CoverageSnapshot,
+    write_snapshot,
+)
+
+STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL",
+    "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT",
+    "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI",
+    "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+]  # fmt: skip
+
+
+def synthetic_rows(providers: int, insurances: int, seed: int):
+    rng = random.Random(seed)
+    provider_rows = [
+        {
+            "id": i + 1,
+            "name": f"Provider {i}",
+            "phone": f"555-{i:04d}",
+            "email": f"provider{i}@example.com",
+            "dedicated_link": f"https://provider{i}.example",
+        }
+        for i in range(providers)
+    ]
+    insurance_rows = [{"id": i + 1, "name": f"Plan {i:04d}"} for i in range(insurances)]
+    coverage = []
+    for provider in provider_rows:
+        plans = rng.sample(insurance_rows, rng.randint(3, 30))
+        nationwide = rng.random() < 0.1
+        states = ["ALL"] if nationwide else rng.sample(STATES, rng.randint(1, 8))
+        for plan in plans:
+            for state in states:
+                coverage.append(
+                    {
+                        "provider_id": provider["id"],
+                        "insurance_id": plan["id"],
+                        "state_code": state,
+                        **{flag: rng.random() < 0.5 for flag in SERVICE_FLAGS},
+                    }
+                )
+    return provider_rows, insurance_rows, coverage
+
+
+def timed(fn, queries, repeat: int) -> float:
+    """Mean microseconds per query."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(*query)
+    return (time.perf_counter() - started) / (repeat * len(queries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--providers", type=int, default=2000)
+    parser.add_argument("--insurances", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    providers, insurances, coverage = synthetic_rows(
+        args.providers, args.insurances, args.seed
+    )
+    rows_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "coverage.snapshot")
+        write_snapshot(path, providers, insurances, coverage)
+        snapshot = CoverageSnapshot(path)
+        started = time.perf_counter()
+        bitmap = snapshot.bitmap
+        build_ms = (time.perf_counter() - started) * 1000
+
+        rng = random.Random(args.seed)
+        queries = []
+        for _ in range(args.queries):
+            plan = rng.choice(insurances)
+            flags = tuple(rng.sample(SERVICE_FLAGS, rng.randint(1, 2)))
+            queries.append((rng.choice(STATES), plan["id"] - 1, flags))
+
+        def rows_lookup(state, insurance, flags):
+            return {
+                row["provider_id"]
+                for row in coverage
+                if row["insurance_id"] == insurance + 1
+                and row["state_code"] in (state, "ALL")
+                and all(row[flag] for flag in flags)
+            }
+
+        def scan_lookup(state, insurance, flags):
+            required = sum(FLAG_BITS[flag] for flag in flags)
+            found = set()
+            for code in (state, "ALL"):
+                rows = snapshot.state_rows(code)
+                for row in range(rows.start, rows.stop):
+                    if (
+                        snapshot.coverage_insurance[row] == insurance
+                        and snapshot.coverage_flags[row] & required == required
+                    ):
+                        found.add(int(snapshot.coverage_provider[row]))
+            return found
+
+        def bitmap_lookup(state, insurance, flags):
+            pairs, _ = bitmap.lookup(state, [insurance], flags)
+            return set(bitmap.pair_provider[pairs].tolist())
+
+        # All three must agree before their timings mean anything
+        for state, insurance, flags in queries[:20]:
+            expected = {
+                int(snapshot.provider_ids[i])
+                for i in bitmap_lookup(state, insurance, flags)
+            }
+            assert rows_lookup(state, insurance, flags) == expected
+            assert scan_lookup(state, insurance, flags) == bitmap_lookup(
+                state, insurance, flags
+            )
+
+        print(
+            f"{args.providers} providers, {args.insurances} insurances, "
+            f"{len(coverage)} coverage rows, {len(bitmap.coverage)} pairs"
+        )
+        print(f"{'':8}{'memory':>14}{'lookup':>14}")
+        print(
+            f"{'rows':8}{rows_bytes / 2**20:>11.1f} MiB"
+            f"{timed(rows_lookup, queries, 1):>11.1f} us"
+        )
+        print(
+            f"{'scan':8}{os.path.getsize(path) / 2**20:>11.1f} MiB"
+            f"{timed(scan_lookup, queries, 1):>11.1f} us"
+        )
+        print(
+            f"{'bitmap':8}{bitmap.nbytes() / 2**20:>11.1f} MiB"
+            f"{timed(bitmap_lookup, queries, args.repeat):>11.1f} us"
+        )
+        print(f"bitmap built in {build_ms:.1f} ms from the mapped snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Measure peak memory of the upload ingest pipeline on a large synthetic file.
+
+Runs parse → normalize → validate → id mapping → coverage records twice, each
+in a fresh process so peaks do not mix:
+
+  before  object-dtype normalization as it was, then one to_dict("records")
+          list for the whole file
+  after   the current normalize_frame (categoricals, per-value booleans) and
+          coverage_batch building one batch of records at a time
+
+Run from backend/ with the usual .env (nothing is sent to Supabase):
+
+    python scripts/bench_ingest_memory.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STATES = ["ALL", "CA", "NY", "TX", "FL", "WA", "IL", "PA", "OH", "GA", "NC", "MI"]
+HEADER = (
+    "DME Name,Phone Number,Email,Dedicated Link,Insurance,State,Medicaid,"
+    "Resupply Available,Accessories Available,Lactation Services Available\n"
+)
+
+
+def write_csv(path: str, rows: int, seed: int):
+    rng = random.Random(seed)
+    insurances = [f"Insurance Plan {i:04d}" for i in range(400)]
+    with open(path, "w") as f:
+        f.write(HEADER)
+        written, provider = 0, 0
+        while written < rows:
+            block = min(rows - written, rng.randint(50, 400))
+            for i in range(block):
+                # Provider fields only on the first row of a block, as in real files
+                head = (
+                    f"Provider {provider},555-{provider % 10000:04d},"
+                    f"p{provider}@example.com,https://p{provider}.example"
+                    if i == 0
+                    else ",,,"
+                )
+                flags = ",".join(rng.choice(("yes", "no", "")) for _ in range(4))
+                f.write(
+                    f"{head},{rng.choice(insurances)},{rng.choice(STATES)},{flags}\n"
+                )
+            written += block
+            provider += 1
+
+
+def legacy_normalize(raw):
+    raw.columns = (
+        raw.columns.str.replace(r"\xa0", " ", regex=True)
+        .str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+    )
+    raw[["dme_name", "phone_number", "email"]] = raw[
+        ["dme_name", "phone_number", "email"]
+    ].ffill()
+    for col in [
+        "resupply_available",
+        "accessories_available",
+        "lactation_services_available",
+        "medicaid",
+    ]:
+        if col in raw and raw[col].dtype != bool:
+            raw[col] = raw[col].astype(str).str.strip().str.lower().eq("yes")
+    raw["state"] = raw["state"].str.strip()
+    raw["insurance"] = raw["insurance"].str.strip()
+    return raw
+
+
+def ids_for(values):
+    return {name: i + 1 for i, name in enumerate(sorted(set(values)))}
+
+
+def run_variant(variant: str, path: str, batch_size: int):
+    import pandas as pd
+
+    from app.core import file_process
+    from app.core.validation import validate_coverage_frame
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = pd.read_csv(path)
+    if variant == "before":
+        df = legacy_normalize(df)
+    else:
+        df = file_process.normalize_frame(df)
+    invalid, _ = validate_coverage_frame(df, set(STATES))
+    df = df[~invalid].copy() if variant == "before" else df[~invalid]
+
+    provider_ids = ids_for(df["dme_name"].unique().tolist())
+    insurance_ids = ids_for(df["insurance"].unique().tolist())
+    records = 0
+    if variant == "before":
+        df["provider_id"] = df["dme_name"].map(provider_ids)
+        df["insurance_id"] = df["insurance"].map(insurance_ids)
+        coverage_records = (
+            df[
+                [
+                    "provider_id",
+                    "insurance_id",
+                    "state",
+                    *file_process.BOOLEAN_COLUMNS,
+                ]
+            ]
+            .rename(columns={"state": "state_code"})
+            .to_dict("records")
+        )
+        for i in range(0, len(coverage_records), batch_size):
+            records += len(coverage_records[i : i + batch_size])
+    else:
+        provider_column = file_process.map_codes(df["dme_name"], provider_ids)
+        insurance_column = file_process.map_codes(df["insurance"], insurance_ids)
+        for i in range(0, len(df), batch_size):
+            records += len(
+                file_process.coverage_batch(
+                    df, provider_column, insurance_column, slice(i, i + batch_size)
+                )
+            )
+    elapsed = time.perf_counter() - started
+    frame_bytes = df.memory_usage(deep=True).sum()
+    _, peak = tracemalloc.get_traced_memory()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(
+        f"{variant:8}{records:>10}{frame_bytes / 2**20:>12.1f}"
+        f"{peak / 2**20:>12.1f}{max_rss / 2**20:>12.1f}{elapsed:>10.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--variant", choices=("before", "after"))
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.path, args.batch_size)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "coverage.csv")
+        write_csv(path, args.rows, args.seed)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 2**20:.1f} MiB CSV")
+        print(
+            f"{'':8}{'records':>10}{'frame MiB':>12}{'peak MiB':>12}"
+            f"{'max RSS MiB':>12}{'seconds':>10}"
+        )
+        for variant in ("before", "after"):
+            subprocess.run(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--variant",
+                    variant,
+                    "--path",
+                    path,
+                    "--batch-size",
+                    str(args.batch_size),
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
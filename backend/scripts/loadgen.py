@@ -0,0 +1,486 @@
+"""Replay the search page's traffic mix and report latency per step.
+
+A visit follows the discovery flow in BreastPumps-discovery-flow.md: the
+search form loads /bootstrap (states and insurance names), the visitor
+thinks, searches, then clicks through. A Breastpumps.com result is an
+auto_redirect click; further results get manual clicks. A share of visits
+are admins reading click analytics and, only when asked for, uploading a
+small provider CSV. States and insurances are drawn from Zipf
+distributions, so a handful of them carry most searches as in production.
+
+Visits arrive as a Poisson process at each --rps stage, with at most
+--concurrency in flight; arrivals beyond that are shed and counted. Every
+stage prints per-step latency percentiles, and the summary names the
+saturation point: the highest stage that served every offered visit
+without errors and with p99 search latency inside --slo-ms.
+
+The rate limiter keys clients on their IP, so every simulated visitor
+shares one bucket: run the app with RATE_LIMIT_ENABLED=false, or raise the
+*_RATE_LIMIT_* settings, unless the limiter itself is under test.
+
+Calibrate against the stand-in backend first (it mimics the API with fixed
+latency and never touches Supabase), then point it at the app:
+
+    python scripts/loadgen.py stand-in --port 8100 --latency-ms 20
+    python scripts/loadgen.py run --url http://localhost:8100 --rps 10,20,40,80
+    python scripts/loadgen.py run --url http://localhost:8000 --rps 2,4,8 --duration 60
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+STEPS = (
+    "bootstrap",
+    "search",
+    "track_click_auto",
+    "track_click_manual",
+    "analytics_summary",
+    "analytics_clicks",
+    "upload",
+)
+
+CSV_HEADER = (
+    "DME Name,Phone Number,Email,Insurance,State,Medicaid,Resupply Available,"
+    "Accessories Available,Lactation Services Available,Dedicated Link\n"
+)
+
+
+class Zipf:
+    """Draws items with probability proportional to 1 / rank ** exponent."""
+
+    def __init__(self, items: Sequence, exponent: float, rng: random.Random):
+        self.items = list(items)
+        # Popularity should not follow alphabetical order
+        rng.shuffle(self.items)
+        weights = [1 / (rank**exponent) for rank in range(1, len(self.items) + 1)]
+        self.cumulative = list(itertools.accumulate(weights))
+        self.rng = rng
+
+    def draw(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect(self.cumulative, point)]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+class StageStats:
+    def __init__(self, offered_rps: float, window: float, slo: float):
+        self.offered_rps = offered_rps
+        self.window = window
+        self.slo = slo
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.visits = Counter()
+
+    def record(self, step: str, seconds: float, status):
+        self.latencies[step].append(seconds)
+        self.statuses[step][status] += 1
+
+    def errors(self, step: str) -> int:
+        return sum(
+            count
+            for status, count in self.statuses[step].items()
+            if status == "error" or status >= 500
+        )
+
+    def total_errors(self) -> int:
+        return sum(self.errors(step) for step in self.statuses)
+
+    def achieved_rps(self) -> float:
+        return self.visits["completed"] / self.window
+
+    def kept_up(self) -> bool:
+        """No visit shed, cut off or failed, and searches within the SLO."""
+        searches = sorted(self.latencies.get("search", []))
+        return (
+            self.visits["shed"] == 0
+            and self.visits["timed_out"] == 0
+            and self.total_errors() == 0
+            and percentile(searches, 99) <= self.slo
+        )
+
+    def report(self) -> dict:
+        steps = {}
+        for step in STEPS:
+            values = sorted(self.latencies.get(step, []))
+            if not values:
+                continue
+            steps[step] = {
+                "count": len(values),
+                "rps": len(values) / self.window,
+                "errors": self.errors(step),
+                "statuses": {str(k): v for k, v in self.statuses[step].items()},
+                **{f"p{q}_ms": percentile(values, q) * 1000 for q in (50, 90, 99)},
+                "max_ms": values[-1] * 1000,
+            }
+        return {
+            "offered_rps": self.offered_rps,
+            "achieved_rps": self.achieved_rps(),
+            "visits": dict(self.visits),
+            "kept_up": self.kept_up(),
+            "steps": steps,
+        }
+
+
+class Visitor:
+    """One simulated page visit, from loading the form to the last click."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        stats: StageStats,
+        args: argparse.Namespace,
+        states: Zipf,
+        insurances: Zipf,
+        rng: random.Random,
+    ):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.states = states
+        self.insurances = insurances
+        self.rng = rng
+        self.session_id = f"loadgen_{uuid.uuid4().hex}"
+        self.email = f"loadgen+{rng.randrange(args.users)}@example.com"
+
+    async def think(self):
+        if self.args.think > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+    async def call(self, step: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(step, time.perf_counter() - started, "error")
+            return None
+        self.stats.record(step, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def run(self):
+        if self.rng.random() < self.args.admin_share:
+            await self.admin()
+            return
+        await self.call("bootstrap", "GET", "/api/bootstrap")
+        await self.think()
+
+        state, insurance = self.states.draw(), self.insurances.draw()
+        response = await self.call(
+            "search",
+            "POST",
+            "/api/search-dme",
+            json={"state": state, "insurance_provider": insurance, "email": self.email},
+        )
+        if response is None or response.status_code != 200:
+            return
+        results = response.json()
+        if not results:
+            return
+
+        clicks = []
+        redirect = [
+            row for row in results if row["dme_name"].lower() == "breastpumps.com"
+        ]
+        if redirect:
+            clicks.append((redirect[0], "auto_redirect"))
+        # Manual clicks per visit are geometric with mean --clicks
+        while self.rng.random() < self.args.clicks / (1 + self.args.clicks):
+            clicks.append((self.rng.choice(results), "manual"))
+
+        for provider, click_type in clicks:
+            if click_type == "manual":
+                await self.think()
+            await self.call(
+                (
+                    "track_click_auto"
+                    if click_type == "auto_redirect"
+                    else "track_click_manual"
+                ),
+                "POST",
+                "/api/track-click",
+                json={
+                    "provider_id": provider["id"],
+                    "user_email": self.email,
+                    "search_state": state,
+                    "search_insurance": insurance,
+                    "click_type": click_type,
+                    "session_id": self.session_id,
+                    "user_agent": "loadgen",
+                    "referrer": self.args.url,
+                },
+            )
+
+    async def admin(self):
+        await self.call("analytics_summary", "GET", "/api/analytics/clicks/summary")
+        await self.think()
+        await self.call("analytics_clicks", "POST", "/api/analytics/clicks", json={})
+        if self.rng.random() < self.args.upload_share:
+            await self.think()
+            await self.call(
+                "upload",
+                "POST",
+                "/api/upload_providers",
+                files={"file": ("loadgen.csv", self.upload_csv(), "text/csv")},
+            )
+
+    def upload_csv(self) -> bytes:
+        # A fresh provider name keeps the upload from matching the last one
+        name = f"Loadgen {uuid.uuid4().hex[:8]}"
+        rows = [
+            f"{name},555-0100,loadgen@example.com,{self.insurances.draw()},"
+            f"{self.states.draw()},yes,no,yes,no,https://example.com\n"
+            for _ in range(20)
+        ]
+        return (CSV_HEADER + "".join(rows)).encode()
+
+
+async def run_stage(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    rps: float,
+    states: Zipf,
+    insurances: Zipf,
+    rng: random.Random,
+) -> StageStats:
+    stats = StageStats(rps, args.duration, args.slo_ms / 1000)
+    in_flight = set()
+
+    async def visit():
+        await Visitor(client, stats, args, states, insurances, rng).run()
+        stats.visits["completed"] += 1
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_arrival = started
+    while True:
+        next_arrival += rng.expovariate(rps)
+        if next_arrival >= deadline:
+            break
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        stats.visits["offered"] += 1
+        if len(in_flight) >= args.concurrency:
+            stats.visits["shed"] += 1
+            continue
+        task = asyncio.create_task(visit())
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.wait(in_flight, timeout=args.drain)
+    # Visits still running after the drain count against the stage
+    stats.visits["timed_out"] = len(in_flight)
+    for task in list(in_flight):
+        task.cancel()
+    return stats
+
+
+async def reference_lists(client: httpx.AsyncClient):
+    data = (await client.get("/api/bootstrap")).raise_for_status().json()
+    return [row["abbreviation"] for row in data["states"]], data["insurances"]
+
+
+def print_stage(report: dict):
+    print(
+        f"\n== offered {report['offered_rps']:g} visits/s, achieved "
+        f"{report['achieved_rps']:.1f}/s, visits {report['visits']}"
+    )
+    print(
+        f"{'step':20}{'count':>7}{'rps':>8}{'errors':>8}"
+        f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+    for step, row in report["steps"].items():
+        print(
+            f"{step:20}{row['count']:>7}{row['rps']:>8.1f}{row['errors']:>8}"
+            f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+        )
+
+
+async def run(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        state_codes, insurance_names = await reference_lists(client)
+        states = Zipf(state_codes, args.zipf, rng)
+        insurances = Zipf(insurance_names, args.zipf, rng)
+
+        reports = []
+        for rps in args.rps:
+            stats = await run_stage(client, args, rps, states, insurances, rng)
+            reports.append(stats.report())
+            print_stage(reports[-1])
+
+    saturated = [report for report in reports if report["kept_up"]]
+    print(
+        "\nsaturation: "
+        + (
+            f"kept up to {saturated[-1]['offered_rps']:g} visits/s "
+            f"({saturated[-1]['achieved_rps']:.1f}/s achieved)"
+            if saturated
+            else "no stage kept up with its offered rate"
+        )
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+def stand_in_app(latency: float, seed: int):
+    """A FastAPI app answering the same routes with synthetic data."""
+    from fastapi import FastAPI, File, Request, UploadFile
+
+    rng = random.Random(seed)
+    states = [
+        "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID",
+        "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS",
+        "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH", "OK",
+        "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV",
+        "WI", "WY",
+    ]  # fmt: skip
+    insurances = ["Aetna", "Cigna", "Humana", "Kaiser", "Medicaid"] + [
+        f"Plan {i:03d}" for i in range(195)
+    ]
+    providers = [{"id": 1, "dme_name": "Breastpumps.com"}] + [
+        {"id": i, "dme_name": f"Provider {i}"} for i in range(2, 201)
+    ]
+    app = FastAPI(title="loadgen stand-in")
+
+    async def pause():
+        # Log-normal around the median, like a real backend's tail
+        await asyncio.sleep(latency * rng.lognormvariate(0, 0.5))
+
+    @app.get("/api/bootstrap")
+    async def get_bootstrap():
+        await pause()
+        return {
+            "states": [
+                {"id": i, "name": code, "abbreviation": code}
+                for i, code in enumerate(states)
+            ],
+            "insurances": insurances,
+            "version": "stand-in",
+        }
+
+    @app.post("/api/search-dme")
+    async def search_dme(request: Request):
+        body = await request.json()
+        await pause()
+        return [
+            {
+                **provider,
+                "state": body["state"],
+                "phone": "555-0100",
+                "email": "provider@example.com",
+                "dedicated_link": "https://example.com",
+                "resupply_available": True,
+                "accessories_available": False,
+                "lactation_services_available": True,
+            }
+            for provider in rng.sample(providers, rng.randint(0, 8))
+        ]
+
+    @app.post("/api/track-click")
+    async def track_click():
+        await pause()
+        return {"success": True, "message": "Click tracked", "click_id": 1}
+
+    @app.get("/api/analytics/clicks/summary")
+    async def click_summary():
+        await pause()
+        return {"total_clicks": 0, "unique_users": 0}
+
+    @app.post("/api/analytics/clicks")
+    async def click_analytics():
+        await pause()
+        return []
+
+    @app.post("/api/upload_providers")
+    async def upload_providers(file: UploadFile = File(...)):
+        await file.read()
+        await pause()
+        return {"job_id": str(uuid.uuid4()), "message": "CSV processing started"}
+
+    return app
+
+
+def comma_floats(value: str) -> List[float]:
+    return [float(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay the traffic mix")
+    run_parser.add_argument("--url", default="http://localhost:8000")
+    run_parser.add_argument(
+        "--rps", type=comma_floats, default=[5.0], help="visits/s per stage: 5,10,20"
+    )
+    run_parser.add_argument("--duration", type=float, default=30, help="s per stage")
+    run_parser.add_argument("--concurrency", type=int, default=100)
+    run_parser.add_argument(
+        "--think", type=float, default=1.0, help="mean think time between steps (s)"
+    )
+    run_parser.add_argument(
+        "--zipf", type=float, default=1.1, help="state/insurance popularity skew"
+    )
+    run_parser.add_argument(
+        "--clicks", type=float, default=0.8, help="mean manual clicks per search"
+    )
+    run_parser.add_argument("--admin-share", type=float, default=0.02)
+    run_parser.add_argument(
+        "--upload-share",
+        type=float,
+        default=0.0,
+        help="share of admin visits that upload a CSV; this writes providers",
+    )
+    run_parser.add_argument("--users", type=int, default=5000, help="distinct emails")
+    run_parser.add_argument(
+        "--slo-ms", type=float, default=1000, help="p99 search latency to keep up"
+    )
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument(
+        "--drain", type=float, default=30, help="s to wait for in-flight visits"
+    )
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--json", help="also write the stage reports here")
+
+    stand_in_parser = commands.add_parser("stand-in", help="serve a stand-in backend")
+    stand_in_parser.add_argument("--host", default="127.0.0.1")
+    stand_in_parser.add_argument("--port", type=int, default=8100)
+    stand_in_parser.add_argument("--latency-ms", type=float, default=20)
+    stand_in_parser.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    if args.command == "stand-in":
+        import uvicorn
+
+        uvicorn.run(
+            stand_in_app(args.latency_ms / 1000, args.seed),
+            host=args.host,
+            port=args.port,
+            log_level="warning",
+        )
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,10 @@ from app.main import app
 
 @pytest.fixture
 def client():
-    return TestClient(app)
+    # Entering the client runs the lifespan, so background workers such as the
+    # upload scheduler share one event loop across requests
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture
@@ -24,6 +24,11 @@ class MockTable:
     def execute(self):
         return MagicMock(data=self.data)
 
+    def update(self, data):
+        # No rows match unless a test sets them up
+        self.data = []
+        return self
+
     def insert(self, data):
         if isinstance(data, list):
             self.data = data
@@ -0,0 +1,127 @@
+from datetime import date
+from unittest.mock import MagicMock
+import pyarrow.parquet as pq
+import pytest
+from app.core import click_archive, click_export
+from app.core.click_archive import apply_retention, month_end, retention_cutoff
+
+
+def click(click_id, clicked_at):
+    return {
+        "id": click_id,
+        "provider_id": 1,
+        "user_email": "a@example.com",
+        "search_state": "CA",
+        "search_insurance": "Aetna",
+        "click_type": "manual",
+        "clicked_at": clicked_at,
+        "session_id": None,
+        "user_agent": None,
+        "referrer": None,
+    }
+
+
+def test_month_arithmetic():
+    assert month_end(date(2024, 2, 1)) == date(2024, 2, 29)
+    assert month_end(date(2024, 12, 1)) == date(2024, 12, 31)
+    assert retention_cutoff(date(2026, 10, 19), 13) == date(2025, 9, 1)
+    assert retention_cutoff(date(2026, 1, 5), 1) == date(2025, 12, 1)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    sb = MagicMock()
+    monkeypatch.setattr(click_archive, "sb", sb)
+    monkeypatch.setattr(click_export, "sb", sb)
+    replies = {
+        "list_click_partitions": [
+            {"partition_name": "provider_clicks_2025_01", "month": "2025-01-01"},
+            {"partition_name": "provider_clicks_2025_02", "month": "2025-02-01"},
+            {"partition_name": "provider_clicks_2026_10", "month": "2026-10-01"},
+        ],
+        "drop_click_partition": True,
+    }
+
+    def rpc(name, params=None):
+        call = MagicMock()
+        call.execute.return_value.data = replies.get(name)
+        return call
+
+    sb.rpc.side_effect = rpc
+    pages = {
+        "2025-01-01": [click(1, "2025-01-03T10:00:00+00:00")],
+        "2025-02-01": [
+            click(2, "2025-02-01T00:00:00+00:00"),
+            click(3, "2025-02-28T23:59:59+00:00"),
+        ],
+    }
+
+    def table(name):
+        query = MagicMock()
+        query.select.return_value = query
+        query.gte.side_effect = (
+            lambda column, start: setattr(query, "start", start) or query
+        )
+        query.lt.return_value = query
+        query.order.return_value = query
+        query.limit.return_value = query
+        query.execute.side_effect = lambda: MagicMock(data=pages[query.start])
+        return query
+
+    sb.table.side_effect = table
+    return sb
+
+
+def test_old_months_are_archived_then_dropped(db, tmp_path):
+    results = apply_retention(13, str(tmp_path), today=date(2026, 10, 19))
+
+    assert results == [
+        {"month": "2025-01-01", "rows": 1, "dropped": True},
+        {"month": "2025-02-01", "rows": 2, "dropped": True},
+    ]
+    archive = pq.read_table(tmp_path / "provider_clicks_2025_02.parquet")
+    assert archive.column("id").to_pylist() == [2, 3]
+    assert not list(tmp_path.glob("*.partial"))
+    calls = [
+        (c.args[0], c.args[1] if len(c.args) > 1 else None)
+        for c in db.rpc.call_args_list
+    ]
+    assert calls[0] == ("ensure_click_partitions", {"p_months_ahead": 3})
+    assert (
+        "drop_click_partition",
+        {"p_month": "2025-02-01", "p_expected_rows": 2},
+    ) in calls
+
+
+def test_partition_is_kept_when_rows_changed(db, tmp_path):
+    rpc = db.rpc.side_effect
+
+    def refuse_drop(name, params=None):
+        if name == "drop_click_partition":
+            raise Exception("provider_clicks_2025_01 holds 2 rows, archive has 1")
+        return rpc(name, params)
+
+    db.rpc.side_effect = refuse_drop
+    results = apply_retention(13, str(tmp_path), today=date(2026, 10, 19))
+
+    assert results[0]["dropped"] is False
+    assert "holds 2 rows" in results[0]["error"]
+    # The archive stays for the next run to overwrite
+    assert (tmp_path / "provider_clicks_2025_01.parquet").exists()
+
+
+def test_keep_partitions_only_archives(db, tmp_path):
+    results = apply_retention(13, str(tmp_path), today=date(2026, 10, 19), drop=False)
+
+    assert [result["dropped"] for result in results] == [False, False]
+    assert "drop_click_partition" not in [c.args[0] for c in db.rpc.call_args_list]
+
+
+def test_missing_service_key_fails_before_exporting(db, tmp_path):
+    denied = Exception("permission denied for function ensure_click_partitions")
+    denied.code = "42501"
+    db.rpc.side_effect = denied
+
+    with pytest.raises(PermissionError, match="service key"):
+        apply_retention(13, str(tmp_path), today=date(2026, 10, 19))
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,99 @@
+from unittest.mock import patch
+from app.core.click_dedupe import ClickDeduper
+
+
+def test_repeats_inside_the_window_are_suppressed(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.click_dedupe.time.monotonic", lambda: now[0])
+    deduper = ClickDeduper(window=10)
+    key = deduper.key(1, "manual", "a@example.com", "s1")
+
+    assert deduper.seen(key) == (False, None)
+    deduper.stored(key, 41)
+    now[0] = 5
+    assert deduper.seen(key) == (True, 41)
+    # Other click types and sessions are separate clicks
+    assert (
+        deduper.seen(deduper.key(1, "auto_redirect", "a@example.com", "s1"))[0] is False
+    )
+    assert deduper.seen(deduper.key(1, "manual", "a@example.com", "s2"))[0] is False
+    # The window runs from the first click, not the latest repeat
+    now[0] = 10
+    assert deduper.seen(key) == (False, None)
+    assert deduper.stats()["suppressed"] == 1
+
+
+def test_email_keys_clicks_without_a_session():
+    deduper = ClickDeduper(window=10)
+
+    assert deduper.key(1, "manual", "a@example.com") == deduper.key(
+        1, "manual", "a@example.com", ""
+    )
+    assert deduper.key(1, "manual", "a@example.com") != deduper.key(
+        1, "manual", "b@example.com"
+    )
+
+
+def test_memory_is_bounded(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.click_dedupe.time.monotonic", lambda: now[0])
+    deduper = ClickDeduper(window=10, max_keys=2)
+    for provider_id in range(3):
+        deduper.seen(deduper.key(provider_id, "manual", "a@example.com"))
+
+    assert deduper.stats()["keys"] == 2
+    assert deduper.stats()["evicted"] == 1
+    now[0] = 20
+    deduper.seen(deduper.key(9, "manual", "a@example.com"))
+    assert deduper.stats()["keys"] == 1
+
+
+def test_zero_window_disables():
+    deduper = ClickDeduper(window=0)
+    key = deduper.key(1, "manual", "a@example.com")
+
+    assert deduper.seen(key) == (False, None)
+    assert deduper.seen(key) == (False, None)
+
+
+CLICK = {
+    "provider_id": 3,
+    "user_email": "mom@example.com",
+    "search_state": "ca",
+    "search_insurance": "Aetna",
+    "click_type": "auto_redirect",
+    "session_id": "visit-1",
+}
+
+
+@patch("app.api.routes.supabase")
+def test_duplicate_clicks_succeed_without_a_second_insert(
+    mock_supabase, monkeypatch, client
+):
+    monkeypatch.setattr("app.api.routes.click_deduper", ClickDeduper(window=10))
+    insert = mock_supabase.table.return_value.insert
+    insert.return_value.execute.return_value.data = [{"id": 99}]
+
+    first = client.post("/api/track-click", json=CLICK)
+    retry = client.post("/api/track-click", json=CLICK)
+
+    assert first.json()["click_id"] == 99
+    assert retry.status_code == 200
+    assert retry.json() == {
+        "success": True,
+        "message": "Duplicate click ignored",
+        "click_id": 99,
+    }
+    assert insert.call_count == 1
+    metrics = client.get("/api/metrics").json()["click_dedupe"]
+    assert metrics["suppressed"] == 1
+
+
+@patch("app.api.routes.supabase")
+def test_failed_insert_does_not_suppress_the_retry(mock_supabase, monkeypatch, client):
+    monkeypatch.setattr("app.api.routes.click_deduper", ClickDeduper(window=10))
+    execute = mock_supabase.table.return_value.insert.return_value.execute
+    execute.side_effect = [Exception("timeout"), type("R", (), {"data": [{"id": 7}]})]
+
+    assert client.post("/api/track-click", json=CLICK).status_code == 500
+    assert client.post("/api/track-click", json=CLICK).json()["click_id"] == 7
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import re
+import pytest
+from unittest.mock import MagicMock
+from app.core import click_export
+
+# 250 clicks, five per timestamp, so pages end in the middle of timestamp ties
+CLICKS = [
+    {
+        "id": i + 1,
+        "provider_id": 1,
+        "user_email": f"user{i}@example.com",
+        "search_state": "CA",
+        "search_insurance": "Aetna",
+        "click_type": "manual",
+        "clicked_at": f"2025-01-01T00:{i // 5 // 60:02d}:{i // 5 % 60:02d}+00:00",
+        "session_id": None,
+        "user_agent": "test",
+        "referrer": None,
+    }
+    for i in range(250)
+]
+
+
+class FakeClickQuery:
+    def __init__(self, calls):
+        self.calls = calls
+        self.after = None
+
+    def select(self, *args):
+        return self
+
+    def gte(self, *args):
+        return self
+
+    def lt(self, *args):
+        return self
+
+    def or_(self, expression):
+        match = re.match(
+            r'clicked_at\.gt\."([^"]+)",and\(.*id\.gt\.(\d+)\)', expression
+        )
+        self.after = (match.group(1), int(match.group(2)))
+        return self
+
+    def order(self, *args):
+        return self
+
+    def limit(self, size):
+        self.size = size
+        return self
+
+    def execute(self):
+        self.calls.append(self.after)
+        rows = [
+            row
+            for row in CLICKS
+            if self.after is None or (row["clicked_at"], row["id"]) > self.after
+        ]
+        return MagicMock(data=rows[: self.size])
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    sb = MagicMock()
+    sb.table.side_effect = lambda name: FakeClickQuery(calls)
+    monkeypatch.setattr(click_export, "sb", sb)
+    return calls
+
+
+def export(client, fmt, **headers):
+    return client.get(
+        "/api/analytics/clicks/export",
+        params={
+            "start_date": "2025-01-01",
+            "end_date": "2025-01-31",
+            "format": fmt,
+            "page_size": 100,
+        },
+        headers=headers,
+    )
+
+
+def test_ndjson_export_pages_through_every_row_once(client, calls):
+    response = export(client, "ndjson", **{"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    ids = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert ids == list(range(1, 251))
+    assert len(calls) == 3
+    assert calls[1] == (CLICKS[99]["clicked_at"], 100)
+
+
+def test_csv_export_is_gzipped_when_accepted(client, calls):
+    response = export(client, "csv", **{"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 250
+    assert rows[0]["user_email"] == "user0@example.com"
+
+
+def test_parquet_export_is_readable(client, calls):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = export(client, "parquet")
+
+    parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet_file.metadata.num_rows == 250
+    assert parquet_file.num_row_groups == 3
+    clicked_at = parquet_file.read().column("clicked_at")
+    assert str(clicked_at.type) == "timestamp[us, tz=UTC]"
+    assert clicked_at[0].as_py().isoformat() == CLICKS[0]["clicked_at"]
+
+
+def test_parquet_export_is_not_compressed_again(client, calls):
+    response = export(client, "parquet", **{"Accept-Encoding": "gzip, br"})
+
+    assert "content-encoding" not in response.headers
+
+
+def test_gzip_refused_with_q_zero_is_not_used(client, calls):
+    response = export(client, "csv", **{"Accept-Encoding": "gzip;q=0, identity"})
+
+    assert "content-encoding" not in response.headers
+    assert len(list(csv.DictReader(io.StringIO(response.text)))) == 250
+
+
+def test_invalid_format_is_rejected(client):
+    response = export(client, "xml")
+    assert response.status_code == 400
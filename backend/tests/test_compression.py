@@ -0,0 +1,96 @@
+import gzip
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.core import compression
+from app.core.compression import CompressionMiddleware, accepted_encodings
+
+BIG = "x" * 5000
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.add_middleware(
+        CompressionMiddleware, minimum_size=500, exclude_paths=["/hot"]
+    )
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BIG)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/hot")
+    def hot():
+        return PlainTextResponse(BIG)
+
+    @app.get("/image")
+    def image():
+        return PlainTextResponse(BIG, media_type="image/png")
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse(
+            gzip.compress(BIG.encode()), headers={"Content-Encoding": "gzip"}
+        )
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            (f"line {i}\n" for i in range(1000)), media_type="text/csv"
+        )
+
+    return app
+
+
+def get(app, path, accept="gzip"):
+    return TestClient(app).get(path, headers={"Accept-Encoding": accept})
+
+
+def test_large_response_is_gzipped(app):
+    response = get(app, "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < 100
+    assert response.text == BIG
+
+
+@pytest.mark.parametrize("path", ["/small", "/hot", "/image"])
+def test_small_excluded_and_binary_responses_are_not_compressed(app, path):
+    response = get(app, path)
+    assert "content-encoding" not in response.headers
+
+
+def test_already_encoded_response_passes_through(app):
+    response = get(app, "/encoded")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == BIG
+
+
+def test_streaming_response_is_compressed_incrementally(app):
+    response = get(app, "/stream")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines()[-1] == "line 999"
+
+
+def test_brotli_is_preferred_when_available(app):
+    pytest.importorskip("brotli")
+    response = get(app, "/big", accept="gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == BIG
+
+
+def test_gzip_is_used_without_brotli(app, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    response = get(app, "/big", accept="gzip, br")
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_refused_and_missing_encodings():
+    assert accepted_encodings("gzip;q=0, br") == {"br"}
+    assert accepted_encodings("") == set()
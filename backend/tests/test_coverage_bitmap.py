@@ -0,0 +1,144 @@
+import random
+from unittest.mock import MagicMock
+import pytest
+from app.api import routes
+from app.core.cache import search_cache
+from app.core.coverage_bitmap import SERVICE_FLAGS
+from app.core.coverage_snapshot import CoverageSnapshot, write_snapshot
+
+STATES = ["ALL", "CA", "NY", "TX", "WA"]
+
+
+@pytest.fixture(scope="module")
+def rows():
+    rng = random.Random(7)
+    providers = [
+        {
+            "id": 100 + i,
+            "name": f"Provider {i}",
+            "phone": "555-0100",
+            "email": f"p{i}@example.com",
+            "dedicated_link": "",
+        }
+        for i in range(40)
+    ]
+    insurances = [{"id": i + 1, "name": f"Plan {i}"} for i in range(12)]
+    coverage = {}
+    for _ in range(600):
+        key = (
+            rng.choice(providers)["id"],
+            rng.choice(insurances)["id"],
+            rng.choice(STATES),
+        )
+        coverage[key] = {
+            "provider_id": key[0],
+            "insurance_id": key[1],
+            "state_code": key[2],
+            **{flag: rng.random() < 0.5 for flag in SERVICE_FLAGS},
+        }
+    return providers, insurances, list(coverage.values())
+
+
+@pytest.fixture(scope="module")
+def snapshot(rows, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("bitmap") / "coverage.snapshot")
+    write_snapshot(path, *rows)
+    return CoverageSnapshot(path)
+
+
+def brute_force(rows, state, insurance_ids, flags):
+    providers, _, coverage = rows
+    return {
+        row["provider_id"]
+        for row in coverage
+        if row["state_code"] in (state, "ALL")
+        and row["insurance_id"] in insurance_ids
+        and all(row[flag] for flag in flags)
+    }
+
+
+@pytest.mark.parametrize(
+    "flags",
+    [
+        ("medicaid",),
+        ("resupply_available", "lactation_services_available"),
+        tuple(SERVICE_FLAGS),
+    ],
+)
+@pytest.mark.parametrize("state", ["CA", "TX", "OR"])
+def test_filtered_search_matches_brute_force(rows, snapshot, state, flags):
+    results = snapshot.search(state, "Plan 1", flags)
+
+    # "Plan 1" also matches Plan 10 and Plan 11
+    expected = brute_force(rows, state, {2, 11, 12}, flags)
+    assert {row["id"] for row in results} == expected
+    assert all(row[flag] for row in results for flag in flags)
+
+
+def test_bitmap_agrees_with_row_scan_without_flags(snapshot):
+    for state in ["CA", "NY", "WA"]:
+        insurances = snapshot.matching_insurances("plan")
+        assert snapshot._search_bitmap(state, insurances, ()) == snapshot.search(
+            state, "plan"
+        )
+
+
+def test_bitmap_is_compact(snapshot):
+    bitmap = snapshot.bitmap
+    pairs = len(bitmap.coverage)
+    assert pairs < snapshot.coverage_count
+    assert bitmap.nbytes() <= pairs * 8 * 6 + 8 * (snapshot.insurance_count + 1)
+
+
+def test_search_endpoint_filters_on_flags(monkeypatch, client, tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    providers = [
+        {"id": 1, "name": "Pump Co", "phone": "1", "email": "a@example.com"},
+        {"id": 2, "name": "Milk Inc", "phone": "2", "email": "b@example.com"},
+    ]
+    coverage = [
+        {"provider_id": 1, "insurance_id": 1, "state_code": "CA"},
+        {
+            "provider_id": 2,
+            "insurance_id": 1,
+            "state_code": "ALL",
+            "resupply_available": True,
+        },
+    ]
+    write_snapshot(path, providers, [{"id": 1, "name": "Aetna"}], coverage)
+    monkeypatch.setenv("COVERAGE_SNAPSHOT_PATH", path)
+    monkeypatch.setenv("SEARCH_SOURCE", "snapshot")
+    search_cache.clear()
+    body = {"state": "CA", "insurance_provider": "Aetna", "email": "x@example.com"}
+
+    response = client.post("/api/search-dme", json={**body, "resupply_available": True})
+
+    assert [row["dme_name"] for row in response.json()] == ["Milk Inc"]
+
+
+@pytest.mark.parametrize("flags", [("resupply_available",), SERVICE_FLAGS[:2]])
+def test_rpc_and_snapshot_filter_alike(monkeypatch, rows, snapshot, flags):
+    providers, insurances, coverage = rows
+    names = {provider["id"]: provider["name"] for provider in providers}
+    # The search RPC returns a row per matching coverage row, the state's first
+    rpc_rows = [
+        {"id": row["provider_id"], "dme_name": names[row["provider_id"]], **row}
+        for code in ("CA", "ALL")
+        for row in coverage
+        if row["state_code"] == code and row["insurance_id"] in {2, 11, 12}
+    ]
+    rpc = MagicMock()
+    rpc.rpc.return_value.execute.return_value.data = rpc_rows
+    monkeypatch.setattr(routes, "supabase", rpc)
+    monkeypatch.setattr(routes.coverage_snapshot, "get", lambda: snapshot)
+
+    monkeypatch.setenv("SEARCH_SOURCE", "rpc")
+    from_rpc = routes.fetch_search_results("CA", "Plan 1", flags)
+    monkeypatch.setenv("SEARCH_SOURCE", "snapshot")
+    from_snapshot = routes.fetch_search_results("CA", "Plan 1", flags)
+
+    assert rpc.rpc.call_count == 1
+    assert from_rpc
+    assert sorted(row["id"] for row in from_rpc) == sorted(
+        row["id"] for row in from_snapshot
+    )
@@ -0,0 +1,112 @@
+import pytest
+from app.core.coverage_index import CoverageIndex, CoverageIndexStore, coverage_index
+from app.core.coverage_snapshot import CoverageSnapshot, SnapshotStore, write_snapshot
+
+PROVIDERS = [
+    {"id": 10, "name": "Pump Co", "phone": "", "email": "", "dedicated_link": ""},
+    {"id": 20, "name": "Milk Inc", "phone": "", "email": "", "dedicated_link": ""},
+    {"id": 30, "name": "Idle LLC", "phone": "", "email": "", "dedicated_link": ""},
+]
+INSURANCES = [
+    {"id": 1, "name": "Aetna"},
+    {"id": 2, "name": "Blue Cross Blue Shield"},
+]
+COVERAGE = [
+    {"provider_id": 10, "insurance_id": 1, "state_code": "CA"},
+    {"provider_id": 10, "insurance_id": 1, "state_code": "NY"},
+    {"provider_id": 10, "insurance_id": 2, "state_code": "TX"},
+    {"provider_id": 20, "insurance_id": 1, "state_code": "CA"},
+    {"provider_id": 20, "insurance_id": 1, "state_code": "ALL"},
+]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    write_snapshot(path, PROVIDERS, INSURANCES, COVERAGE)
+    return path
+
+
+def test_insurance_index_groups_providers_by_state(snapshot_path):
+    index = CoverageIndex(CoverageSnapshot(snapshot_path))
+
+    assert index.by_insurance(" aetna ") == {
+        "insurance": "Aetna",
+        "states": [
+            {"state": "ALL", "providers": [{"id": 20, "name": "Milk Inc"}]},
+            {
+                "state": "CA",
+                "providers": [
+                    {"id": 20, "name": "Milk Inc"},
+                    {"id": 10, "name": "Pump Co"},
+                ],
+            },
+            {"state": "NY", "providers": [{"id": 10, "name": "Pump Co"}]},
+        ],
+    }
+    assert index.by_insurance("Aet") is None
+
+
+def test_provider_index_lists_insurances_and_states(snapshot_path):
+    index = CoverageIndex(CoverageSnapshot(snapshot_path))
+
+    assert index.by_provider(10) == {
+        "provider": {"id": 10, "name": "Pump Co"},
+        "states": ["CA", "NY", "TX"],
+        "insurances": [
+            {"insurance": "Aetna", "states": ["CA", "NY"]},
+            {"insurance": "Blue Cross Blue Shield", "states": ["TX"]},
+        ],
+    }
+    # Providers without coverage rows are not indexed
+    assert index.by_provider(30) is None
+    assert index.stats()["providers"] == 2
+
+
+def test_store_rebuilds_once_per_snapshot(snapshot_path):
+    store = CoverageIndexStore(SnapshotStore(snapshot_path))
+    first = store.get()
+    assert store.get() is first
+    assert store.current() is first
+
+    write_snapshot(snapshot_path, PROVIDERS, INSURANCES, COVERAGE[:1])
+    assert store.current() is None
+    second = store.get()
+
+    assert second is not first
+    assert second.by_provider(20) is None
+    assert store.stats()["builds"] == 2
+
+
+@pytest.fixture
+def use_snapshot(monkeypatch, snapshot_path):
+    monkeypatch.setenv("COVERAGE_SNAPSHOT_PATH", snapshot_path)
+
+
+def test_coverage_endpoints(use_snapshot, client):
+    response = client.get("/api/coverage/by-insurance/Blue Cross Blue Shield")
+    assert response.status_code == 200
+    assert response.json()["states"] == [
+        {"state": "TX", "providers": [{"id": 10, "name": "Pump Co"}]}
+    ]
+
+    response = client.get("/api/coverage/by-provider/20")
+    assert response.status_code == 200
+    assert response.json()["insurances"] == [
+        {"insurance": "Aetna", "states": ["ALL", "CA"]}
+    ]
+
+
+def test_coverage_endpoints_404_on_unknown_keys(use_snapshot, client):
+    assert client.get("/api/coverage/by-insurance/Cigna").status_code == 404
+    assert client.get("/api/coverage/by-provider/30").status_code == 404
+    assert client.get("/api/coverage/by-provider/abc").status_code == 422
+
+
+def test_coverage_endpoint_503_without_snapshot(monkeypatch, client, tmp_path):
+    monkeypatch.setenv("COVERAGE_SNAPSHOT_PATH", str(tmp_path / "missing"))
+    monkeypatch.setattr(coverage_index.snapshots, "refresh", lambda: False)
+
+    response = client.get("/api/coverage/by-provider/10")
+
+    assert response.status_code == 503
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+import pytest
+from app.core import coverage_snapshot as snapshot_module
+from app.core.cache import search_cache
+from app.core.coverage_snapshot import (
+    CoverageSnapshot,
+    SnapshotStore,
+    write_snapshot,
+)
+
+PROVIDERS = [
+    {
+        "id": 10,
+        "name": "Pump Co",
+        "phone": "555-0100",
+        "email": "pump@example.com",
+        "dedicated_link": "https://pump.example",
+    },
+    {
+        "id": 20,
+        "name": "Milk Inc",
+        "phone": "555-0101",
+        "email": "milk@example.com",
+        "dedicated_link": None,
+    },
+]
+INSURANCES = [
+    {"id": 1, "name": "Aetna"},
+    {"id": 2, "name": "Blue Cross Blue Shield"},
+    {"id": 3, "name": "Cigna"},
+]
+COVERAGE = [
+    {"provider_id": 10, "insurance_id": 1, "state_code": "CA", "resupply_available": True},
+    {"provider_id": 10, "insurance_id": 3, "state_code": "NY", "medicaid": True},
+    {"provider_id": 20, "insurance_id": 1, "state_code": "ALL"},
+    {"provider_id": 20, "insurance_id": 2, "state_code": "TX"},
+    # Unknown provider, dropped from the snapshot
+    {"provider_id": 99, "insurance_id": 1, "state_code": "CA"},
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    write_snapshot(path, PROVIDERS, INSURANCES, COVERAGE)
+    return CoverageSnapshot(path)
+
+
+def test_snapshot_round_trips_rows(snapshot):
+    assert snapshot.coverage_count == 4
+    assert snapshot.state_codes == ["ALL", "CA", "NY", "TX"]
+    assert snapshot.insurance_names == ["Aetna", "Blue Cross Blue Shield", "Cigna"]
+    assert snapshot.provider(1) == {
+        "id": 20,
+        "name": "Milk Inc",
+        "phone": "555-0101",
+        "email": "milk@example.com",
+        "dedicated_link": "",
+    }
+
+
+def test_search_includes_all_state_coverage_and_flags(snapshot):
+    results = snapshot.search("CA", "aetna")
+
+    assert [row["dme_name"] for row in results] == ["Pump Co", "Milk Inc"]
+    assert results[0]["state"] == "CA"
+    assert results[0]["resupply_available"] is True
+    assert results[0]["medicaid"] is False
+    assert results[1]["id"] == 20
+
+
+def test_search_matches_partial_insurance_names(snapshot):
+    assert [row["dme_name"] for row in snapshot.search("TX", "blue")] == ["Milk Inc"]
+    assert snapshot.search("NY", "Cigna")[0]["medicaid"] is True
+    assert snapshot.search("WA", "Cigna") == []
+
+
+def test_empty_snapshot_opens(tmp_path):
+    path = str(tmp_path / "empty.snapshot")
+    write_snapshot(path, [], [], [])
+    assert CoverageSnapshot(path).search("CA", "Aetna") == []
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "junk"
+    path.write_bytes(b"\x00" * 512)
+    with pytest.raises(ValueError):
+        CoverageSnapshot(str(path))
+
+
+def test_store_swaps_to_rebuilt_file(tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    store = SnapshotStore(path)
+    assert store.get() is None
+
+    write_snapshot(path, PROVIDERS, INSURANCES, COVERAGE)
+    first = store.get()
+    assert store.get() is first
+
+    write_snapshot(path, PROVIDERS[:1], INSURANCES, COVERAGE[:2])
+    second = store.get()
+    assert second is not first
+    assert second.coverage_count == 2
+    # Readers holding the old snapshot keep a consistent view
+    assert first.coverage_count == 4
+    assert [name for name in os.listdir(tmp_path)] == ["coverage.snapshot"]
+
+
+class PagedTable:
+    def __init__(self, rows, calls):
+        self.rows = rows
+        self.calls = calls
+
+    def select(self, *args):
+        return self
+
+    def order(self, *args):
+        return self
+
+    def range(self, start, end):
+        self.calls.append(start)
+        self.page = self.rows[start : end + 1]
+        return self
+
+    def execute(self):
+        return MagicMock(data=self.page)
+
+
+def test_refresh_pages_through_tables(monkeypatch, tmp_path):
+    monkeypatch.setenv("INSURANCES_TABLE", "insurances")
+    monkeypatch.setenv("PROVIDER_COVERAGE_TABLE", "provider_coverage")
+    tables = {
+        "providers": PROVIDERS,
+        "insurances": INSURANCES,
+        "provider_coverage": COVERAGE * 400,
+    }
+    calls = []
+    sb = MagicMock()
+    sb.table.side_effect = lambda name: PagedTable(tables[name], calls)
+    monkeypatch.setattr(snapshot_module, "sb", sb)
+    store = SnapshotStore(str(tmp_path / "coverage.snapshot"))
+
+    assert store.refresh()
+
+    assert calls.count(1000) == 1 and calls.count(2000) == 1
+    assert store.stats()["coverage_rows"] == 1600
+    assert store.stats()["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_previous_snapshot(monkeypatch, tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    write_snapshot(path, PROVIDERS, INSURANCES, COVERAGE)
+    sb = MagicMock()
+    sb.table.side_effect = RuntimeError("connection reset")
+    monkeypatch.setattr(snapshot_module, "sb", sb)
+    store = SnapshotStore(path)
+
+    assert not store.refresh()
+
+    assert store.get().coverage_count == 4
+    assert store.stats()["last_error"] == "connection reset"
+
+
+def test_background_refreshes_collapse(monkeypatch, tmp_path):
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def load_rows():
+        loads.append(1)
+        started.set()
+        release.wait(1)
+        return PROVIDERS, INSURANCES, COVERAGE
+
+    monkeypatch.setattr(snapshot_module, "load_rows", load_rows)
+    store = SnapshotStore(str(tmp_path / "coverage.snapshot"))
+    refreshed = []
+    store.listeners.append(lambda: refreshed.append(store.get().coverage_count))
+
+    store.refresh_in_background()
+    assert started.wait(1)
+    # Uploads landing mid-rebuild share one follow-up rebuild
+    store.refresh_in_background()
+    store.refresh_in_background()
+    assert store.stats()["rebuilding"]
+    release.set()
+
+    deadline = time.monotonic() + 1
+    while store.stats()["rebuilding"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert len(loads) == 2
+    assert refreshed == [4, 4]
+
+
+def test_blank_snapshot_path_uses_the_default(monkeypatch):
+    monkeypatch.setenv("COVERAGE_SNAPSHOT_PATH", "")
+
+    path = snapshot_module.snapshot_path()
+
+    assert path == os.path.join(
+        snapshot_module.tempfile.gettempdir(), "annabella_coverage.snapshot"
+    )
+    assert SnapshotStore().path == path
+
+
+def test_search_endpoint_reads_snapshot(monkeypatch, client, tmp_path):
+    path = str(tmp_path / "coverage.snapshot")
+    write_snapshot(path, PROVIDERS, INSURANCES, COVERAGE)
+    monkeypatch.setenv("COVERAGE_SNAPSHOT_PATH", path)
+    monkeypatch.setenv("SEARCH_SOURCE", "snapshot")
+    search_cache.clear()
+
+    response = client.post(
+        "/api/search-dme",
+        json={"state": "CA", "insurance_provider": "Aetna", "email": "a@example.com"},
+    )
+
+    assert response.status_code == 200
+    assert [row["dme_name"] for row in response.json()] == ["Pump Co", "Milk Inc"]
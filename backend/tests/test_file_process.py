@@ -0,0 +1,57 @@
+import io
+import pandas as pd
+from app.core.file_process import coverage_batch, map_codes, normalize_frame
+
+HEADER = (
+    "DME Name,Phone Number,Email,Dedicated Link,Insurance,State,Medicaid,"
+    "Resupply Available,Accessories Available,Lactation Services Available\n"
+)
+
+
+def frame(csv: str) -> pd.DataFrame:
+    return normalize_frame(pd.read_csv(io.StringIO(HEADER + csv)))
+
+
+def test_text_columns_become_categoricals():
+    df = frame(
+        "Pump Co,555,pump@example.com,https://p, Aetna ,CA , Yes,no,,YES\n"
+        ",,,,Aetna,CA,no,yes,yes,no\n"
+        "Milk Inc,556,milk@example.com,https://m,Cigna,NY,no,no,no,no\n"
+    )
+
+    for column in ("dme_name", "email", "insurance", "state"):
+        assert df[column].dtype == "category"
+    # Values that only differed by whitespace share one category
+    assert df["insurance"].cat.categories.tolist() == ["Aetna", "Cigna"]
+    assert df["state"].tolist() == ["CA", "CA", "NY"]
+    assert df["dme_name"].tolist() == ["Pump Co", "Pump Co", "Milk Inc"]
+    assert df["email"].tolist()[1] == "pump@example.com"
+    assert df["medicaid"].tolist() == [True, False, False]
+    assert df["lactation_services_available"].tolist() == [True, False, False]
+    assert df["accessories_available"].dtype == bool
+
+
+def test_coverage_batches_map_ids_through_codes():
+    df = frame(
+        "Pump Co,555,pump@example.com,https://p,Aetna,CA,yes,no,no,no\n"
+        ",,,,Humana,NY,no,yes,no,no\n"
+        "Milk Inc,556,milk@example.com,https://m,Aetna,ALL,no,no,no,yes\n"
+    )
+    # Rows dropped by validation leave unused categories behind
+    df = df.iloc[[0, 2]]
+    provider_ids = map_codes(df["dme_name"], {"Pump Co": 1, "Milk Inc": 2})
+    insurance_ids = map_codes(df["insurance"], {"Aetna": 7})
+
+    assert coverage_batch(df, provider_ids, insurance_ids, slice(1, 5)) == [
+        {
+            "provider_id": 2,
+            "insurance_id": 7,
+            "state_code": "ALL",
+            "resupply_available": False,
+            "accessories_available": False,
+            "lactation_services_available": True,
+            "medicaid": False,
+        }
+    ]
+    batch = coverage_batch(df, provider_ids, insurance_ids, slice(0, 1))
+    assert type(batch[0]["provider_id"]) is int
@@ -0,0 +1,151 @@
+import base64
+from datetime import date
+from unittest.mock import MagicMock, patch
+import pytest
+from app.core import click_sketches as sketches_module
+from app.core.click_sketches import ClickSketchStore
+from app.core.hll import HyperLogLog
+
+
+@pytest.mark.parametrize("n", [10, 1000, 50000])
+def test_count_is_within_error_bound(n):
+    sketch = HyperLogLog()
+    sketch.update(f"user{i}@example.com" for i in range(n))
+    assert abs(sketch.count() - n) <= max(1, 4 * HyperLogLog.relative_error() * n)
+
+
+def test_duplicates_do_not_change_the_estimate():
+    sketch = HyperLogLog()
+    for _ in range(5):
+        sketch.update(f"user{i}@example.com" for i in range(100))
+    assert abs(sketch.count() - 100) <= 2
+
+
+def test_merge_estimates_the_union():
+    monday, tuesday = HyperLogLog(), HyperLogLog()
+    monday.update(f"user{i}" for i in range(0, 6000))
+    tuesday.update(f"user{i}" for i in range(4000, 10000))
+    union = HyperLogLog().merge(monday).merge(tuesday)
+    assert abs(union.count() - 10000) <= 4 * HyperLogLog.relative_error() * 10000
+
+
+def test_serialization_round_trip():
+    sketch = HyperLogLog()
+    sketch.update(["a", "b", "c"])
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == sketch.precision
+    assert restored.count() == sketch.count() == 3
+
+
+def test_store_flushes_through_rpc_and_estimates_pending(monkeypatch):
+    sb = MagicMock()
+    sb.rpc.return_value.execute.return_value = MagicMock(data=[])
+    monkeypatch.setattr(sketches_module, "sb", sb)
+    store = ClickSketchStore()
+    store.add(1, "A@example.com", date(2025, 1, 1))
+    store.add(1, "a@example.com ", date(2025, 1, 1))
+    store.add(2, "b@example.com", date(2025, 1, 2))
+
+    assert store.estimate(date(2025, 1, 1), date(2025, 1, 31)) == 2
+
+    sb.rpc.reset_mock()
+    store.flush()
+    assert sb.rpc.call_count == 2
+    params = sb.rpc.call_args_list[0].args[1]
+    assert params["p_day"] == "2025-01-01" and params["p_provider_id"] == 1
+    assert HyperLogLog.from_bytes(base64.b64decode(params["p_registers"])).count() == 1
+    assert store.pending == {}
+
+
+def test_failed_flush_keeps_sketch_for_retry(monkeypatch):
+    sb = MagicMock()
+    sb.rpc.return_value.execute.side_effect = Exception("timeout")
+    monkeypatch.setattr(sketches_module, "sb", sb)
+    store = ClickSketchStore()
+    store.add(1, "a@example.com", date(2025, 1, 1))
+
+    store.flush()
+
+    assert list(store.pending) == [("2025-01-01", 1)]
+    assert store.stats()["flush_errors"] == 1
+
+
+def stored_sketch(provider_id, emails):
+    sketch = HyperLogLog()
+    sketch.update(emails)
+    return {"provider_id": provider_id, "registers": "\\x" + sketch.to_bytes().hex()}
+
+
+def test_stored_sketches_are_merged_by_the_database(monkeypatch):
+    sb = MagicMock()
+    monkeypatch.setattr(sketches_module, "sb", sb)
+    store = ClickSketchStore()
+    # a@ is already stored for provider 1; pending clicks add b@ and c@
+    store.add(1, "a@example.com", date(2025, 1, 2))
+    store.add(1, "b@example.com", date(2025, 1, 2))
+    store.add(2, "c@example.com", date(2025, 1, 3))
+    store.add(2, "d@example.com", date(2025, 3, 1))
+
+    sb.rpc.return_value.execute.return_value = MagicMock(
+        data=[stored_sketch(None, ["a@example.com", "e@example.com"])]
+    )
+    assert store.estimate(date(2025, 1, 1), date(2025, 1, 31)) == 4
+    assert sb.rpc.call_args.args == (
+        "union_click_user_sketches",
+        {
+            "p_start": "2025-01-01",
+            "p_end": "2025-01-31",
+            "p_provider_id": None,
+            "p_by_provider": False,
+        },
+    )
+
+    sb.rpc.return_value.execute.return_value = MagicMock(
+        data=[
+            stored_sketch(1, ["a@example.com"]),
+            stored_sketch(3, ["e@example.com"]),
+        ]
+    )
+    assert store.estimate_by_provider(date(2025, 1, 1), date(2025, 1, 31)) == {
+        1: 2,
+        2: 1,
+        3: 1,
+    }
+    assert sb.rpc.call_args.args[1]["p_by_provider"] is True
+
+
+ANALYTICS_ROW = {
+    "provider_id": 1,
+    "provider_name": "Pump Co",
+    "total_clicks": 9,
+    "top_referrer": None,
+    "unique_users": 0,
+    "avg_clicks_per_user": None,
+    "top_states": ["CA"],
+    "top_insurances": ["Aetna"],
+}
+
+
+@patch("app.api.routes.supabase")
+def test_click_analytics_counts_users_from_the_sketches(
+    mock_supabase, monkeypatch, client
+):
+    mock_supabase.rpc.return_value.execute.return_value.data = [dict(ANALYTICS_ROW)]
+    estimate = MagicMock(return_value={1: 3})
+    monkeypatch.setattr("app.api.routes.click_sketches.estimate_by_provider", estimate)
+
+    body = {"start_date": "2025-01-01", "end_date": "2025-01-31"}
+    row = client.post("/api/analytics/clicks", json=body).json()[0]
+
+    assert row["unique_users"] == 3
+    assert row["avg_clicks_per_user"] == 3.0
+    assert estimate.call_args.args == (date(2025, 1, 1), date(2025, 1, 31), None)
+
+    # Sketches are not split by state: the database's exact count is kept
+    estimate.reset_mock()
+    mock_supabase.rpc.return_value.execute.return_value.data = [
+        dict(ANALYTICS_ROW, unique_users=2, avg_clicks_per_user=4.5)
+    ]
+    row = client.post("/api/analytics/clicks", json=dict(body, state="ca")).json()[0]
+    assert row["unique_users"] == 2
+    assert not estimate.called
@@ -0,0 +1,177 @@
+import time
+from unittest.mock import MagicMock
+import pytest
+from postgrest.exceptions import APIError
+from app.core import insurance_catalog as catalog_module
+from app.core.insurance_catalog import InsuranceCatalog, merge_changes
+from app.core.reference_cache import RefreshingValue, reference_data
+from app.core.singleflight import SingleFlight
+
+
+def change_log(*replies):
+    """Patch fetch_changes to answer from ``replies`` and record each since."""
+    calls = []
+    replies = iter(replies)
+
+    def fetch(since):
+        calls.append(since)
+        return next(replies)
+
+    return fetch, calls
+
+
+def full(version, *names):
+    return {"version": version, "full": True, "added": list(names), "removed": []}
+
+
+def delta(version, added=(), removed=()):
+    return {
+        "version": version,
+        "full": False,
+        "added": list(added),
+        "removed": list(removed),
+    }
+
+
+def test_loads_deltas_after_the_first_full_list(monkeypatch):
+    fetch, calls = change_log(
+        full(3, "Cigna", "Aetna"),
+        delta(5, added=["Humana"], removed=["Cigna"]),
+        delta(5),
+    )
+    monkeypatch.setattr(catalog_module, "fetch_changes", fetch)
+    catalog = InsuranceCatalog()
+
+    assert catalog.load() == {"insurances": ["Aetna", "Cigna"], "version": 3}
+    second = catalog.load()
+    assert second == {"insurances": ["Aetna", "Humana"], "version": 5}
+    # Nothing changed: the same object, so the bootstrap payload is not rebuilt
+    assert catalog.load() is second
+    assert calls == [None, 3, 5]
+    assert catalog.stats()["full_loads"] == 1
+
+
+def test_changes_since_is_served_from_history(monkeypatch):
+    fetch, _ = change_log(
+        full(2, "Aetna"),
+        delta(4, added=["Cigna", "Humana"]),
+        delta(7, removed=["Humana"]),
+    )
+    monkeypatch.setattr(catalog_module, "fetch_changes", fetch)
+    catalog = InsuranceCatalog()
+    for _ in range(3):
+        catalog.load()
+
+    assert catalog.changes_since(7) == delta(7)
+    assert catalog.changes_since(4) == delta(7, removed=["Humana"])
+    assert catalog.changes_since(2) == delta(7, added=["Cigna"], removed=["Humana"])
+    # Between two loads: the whole later delta still applies cleanly
+    assert catalog.changes_since(5) == delta(7, removed=["Humana"])
+    # Older than the history or newer than this copy: ask the change log
+    assert catalog.changes_since(1) is None
+    assert catalog.changes_since(9) is None
+
+
+def test_full_reply_resets_history(monkeypatch):
+    fetch, _ = change_log(
+        full(2, "Aetna"), delta(3, added=["Cigna"]), full(9, "Kaiser")
+    )
+    monkeypatch.setattr(catalog_module, "fetch_changes", fetch)
+    catalog = InsuranceCatalog()
+    for _ in range(3):
+        catalog.load()
+
+    assert catalog.value == {"insurances": ["Kaiser"], "version": 9}
+    assert catalog.changes_since(3) is None
+
+
+def test_later_changes_win():
+    assert merge_changes([{"A": "added"}, {"A": "removed", "B": "added"}]) == (
+        ["B"],
+        ["A"],
+    )
+
+
+def test_insurance_providers_since(monkeypatch, client):
+    catalog = InsuranceCatalog()
+    catalog.apply(full(2, "Aetna"))
+    catalog.apply(delta(4, added=["Cigna"]))
+    value = RefreshingValue(
+        "insurance_providers", catalog.load, 60, 10, SingleFlight("test")
+    )
+    value.value, value.loaded, value.loaded_at = catalog.value, True, time.monotonic()
+    monkeypatch.setitem(reference_data, "insurance_providers", value)
+    monkeypatch.setattr("app.api.routes.insurance_catalog", catalog)
+    change_log = MagicMock(return_value=delta(4, added=["Cigna"]))
+    monkeypatch.setattr("app.api.routes.fetch_changes", change_log)
+
+    assert client.get("/api/insurance-providers").json() == {
+        "insurances": ["Aetna", "Cigna"],
+        "version": 4,
+    }
+    assert client.get("/api/insurance-providers?since=2").json() == delta(
+        4, added=["Cigna"]
+    )
+    change_log.assert_not_called()
+
+    # Not covered by this worker's history: answered by the change log
+    assert client.get("/api/insurance-providers?since=1").json() == delta(
+        4, added=["Cigna"]
+    )
+    change_log.assert_called_once_with(1)
+    assert client.get("/api/insurance-providers?since=-1").status_code == 422
+
+
+def rpc_replies(monkeypatch, error):
+    sb = MagicMock()
+
+    def rpc(name, params=None):
+        call = MagicMock()
+        if name == "get_insurance_changes":
+            call.execute.side_effect = error
+        else:
+            call.execute.return_value.data = {"insurances": ["Aetna", "Cigna"]}
+        return call
+
+    sb.rpc.side_effect = rpc
+    monkeypatch.setattr(catalog_module, "sb", sb)
+    return sb
+
+
+def test_falls_back_to_the_full_listing_before_the_migration(monkeypatch):
+    rpc_replies(
+        monkeypatch,
+        APIError({"code": "PGRST202", "message": "Could not find the function"}),
+    )
+    catalog = InsuranceCatalog()
+
+    assert catalog.load() == {"insurances": ["Aetna", "Cigna"], "version": None}
+    assert catalog.load()["version"] is None
+    assert catalog.changes_since(0) is None
+    assert catalog.stats()["full_loads"] == 2
+
+
+def test_other_change_log_errors_are_raised(monkeypatch):
+    sb = rpc_replies(monkeypatch, APIError({"code": "57014", "message": "timeout"}))
+
+    with pytest.raises(APIError):
+        InsuranceCatalog().load()
+    assert [c.args[0] for c in sb.rpc.call_args_list] == ["get_insurance_changes"]
+
+
+def test_unversioned_catalog_answers_since_with_the_full_list(monkeypatch, client):
+    catalog = InsuranceCatalog()
+    catalog.apply({"version": None, "full": True, "added": ["Aetna"], "removed": []})
+    value = RefreshingValue(
+        "insurance_providers", catalog.load, 60, 10, SingleFlight("test")
+    )
+    value.value, value.loaded, value.loaded_at = catalog.value, True, time.monotonic()
+    monkeypatch.setitem(reference_data, "insurance_providers", value)
+    change_log = MagicMock()
+    monkeypatch.setattr("app.api.routes.fetch_changes", change_log)
+
+    assert client.get("/api/insurance-providers?since=3").json() == {
+        "insurances": ["Aetna"],
+        "version": None,
+    }
+    change_log.assert_not_called()
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from app.core.job_scheduler import JobScheduler, QueueFull
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=10)
+        order = []
+        gate = asyncio.Event()
+
+        async def work(name):
+            if name == "first":
+                await gate.wait()
+            order.append(name)
+
+        scheduler.submit("first", work, "first")
+        await asyncio.sleep(0)
+        scheduler.submit("bulk-1", work, "bulk-1", priority=10)
+        scheduler.submit("bulk-2", work, "bulk-2", priority=10)
+        urgent = scheduler.submit("urgent", work, "urgent", priority=0)
+        gate.set()
+        await urgent.future
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "urgent", "bulk-1", "bulk-2"]
+
+
+def test_worker_pool_bounds_concurrency():
+    async def scenario():
+        scheduler = JobScheduler(workers=2, max_queue=10)
+        running = peak = 0
+
+        async def work():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        jobs = [scheduler.submit(f"job-{i}", work) for i in range(6)]
+        await asyncio.gather(*(job.future for job in jobs))
+        await scheduler.stop()
+        return peak, scheduler.stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["completed"] == 6
+
+
+def test_full_queue_is_refused():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=1)
+        scheduler.submit("a", asyncio.sleep, 0.01)
+        with pytest.raises(QueueFull):
+            scheduler.submit("b", asyncio.sleep, 0.01)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_queued_job_calls_hook_and_skips_it():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=10)
+        cancelled = []
+        ran = []
+
+        async def work(name):
+            ran.append(name)
+            await asyncio.sleep(0.01)
+
+        scheduler.submit("running", work, "running")
+        scheduler.submit(
+            "queued", work, "queued", on_cancel=lambda: cancelled.append("queued")
+        )
+        assert scheduler.cancel("queued")
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return cancelled, ran, scheduler.stats()
+
+    cancelled, ran, stats = asyncio.run(scenario())
+    assert cancelled == ["queued"]
+    assert ran == ["running"]
+    assert stats["cancelled"] == 1
+
+
+def test_run_propagates_job_errors():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=10)
+
+        async def fail():
+            raise ValueError("bad file")
+
+        try:
+            with pytest.raises(ValueError):
+                await scheduler.run("job", fail)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
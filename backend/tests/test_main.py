@@ -12,4 +12,5 @@ def test_root_endpoint(client):
 def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy"}
+    assert response.json()["status"] == "healthy"
+    assert response.json()["supabase"]["state"] == "closed"
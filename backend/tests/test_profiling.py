@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+from app.core.profiling import (
+    ProfileStore,
+    ProfilingMiddleware,
+    StackSampler,
+    folded,
+    profiling_settings,
+)
+
+TOKEN = "s3cret"
+
+
+def busy_wait(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_app(store, **options):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await run_in_threadpool(busy_wait, 0.05)
+        return {"ok": True}
+
+    app.add_middleware(
+        ProfilingMiddleware, token=TOKEN, interval=0.001, store=store, **options
+    )
+    return app
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles"), max_profiles=3)
+
+
+def test_profiles_only_requests_with_the_token(store):
+    client = TestClient(make_app(store))
+
+    assert "x-profile-id" not in client.get("/slow").headers
+    wrong = client.get("/slow", headers={"X-Profile-Token": "guess"})
+    assert "x-profile-id" not in wrong.headers
+    assert store.list() == []
+
+    response = client.get("/slow", headers={"X-Profile-Token": TOKEN})
+    profile = store.get(response.headers["x-profile-id"])
+
+    assert profile["path"] == "/slow"
+    assert profile["status"] == 200
+    assert profile["trigger"] == "header"
+    assert profile["samples"] > 0
+    # The threadpool worker's stack is captured, down to the blocking call
+    assert any("busy_wait" in stack for stack in profile["stacks"])
+
+
+def test_sample_rate_profiles_without_the_token(store):
+    client = TestClient(make_app(store, sample_rate=1.0))
+
+    response = client.get("/slow")
+
+    assert store.get(response.headers["x-profile-id"])["trigger"] == "sampled"
+
+
+def test_store_keeps_the_newest_profiles(store):
+    client = TestClient(make_app(store))
+    ids = [
+        client.get("/slow", headers={"X-Profile-Token": TOKEN}).headers["x-profile-id"]
+        for _ in range(5)
+    ]
+
+    assert [profile["id"] for profile in store.list()] == ids[:1:-1]
+    assert store.get(ids[0]) is None
+    assert store.get("../secrets") is None
+
+
+def test_blank_profiles_dir_uses_the_default(monkeypatch):
+    monkeypatch.setenv("PROFILES_DIR", "")
+
+    assert ProfileStore().directory == os.path.join(
+        tempfile.gettempdir(), "annabella_profiles"
+    )
+
+
+def test_folded_output():
+    sampler = StackSampler(0.001)
+    sampler.sample()
+
+    text = folded({"stacks": dict(sampler.stacks)})
+
+    assert "test_folded_output" in text
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in text.splitlines())
+
+
+def test_settings_are_off_by_default(monkeypatch):
+    monkeypatch.delenv("PROFILING_TOKEN", raising=False)
+    monkeypatch.delenv("PROFILING_SAMPLE_RATE", raising=False)
+    assert profiling_settings() is None
+
+    monkeypatch.setenv("PROFILING_TOKEN", TOKEN)
+    assert profiling_settings()["token"] == TOKEN
+
+
+def test_profile_endpoints(monkeypatch, client, store):
+    monkeypatch.setenv("PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr("app.api.routes.profile_store", store)
+    store.save({"id": "1-abc", "path": "/api/states", "stacks": {"MainThread;f": 2}})
+    headers = {"X-Profile-Token": TOKEN}
+
+    assert client.get("/api/profiles").status_code == 403
+    assert client.get("/api/profiles", headers=headers).json() == [
+        {"id": "1-abc", "path": "/api/states"}
+    ]
+    response = client.get("/api/profiles/1-abc?format=folded", headers=headers)
+    assert response.text == "MainThread;f 2\n"
+    assert "attachment" in response.headers["content-disposition"]
+    assert client.get("/api/profiles/2-def", headers=headers).status_code == 404
+
+
+def test_profile_endpoints_hidden_when_disabled(monkeypatch, client):
+    monkeypatch.delenv("PROFILING_TOKEN", raising=False)
+
+    assert client.get("/api/profiles").status_code == 404
@@ -0,0 +1,112 @@
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from app.core.cache import TTLCache, provider_cache, search_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    provider_cache.clear()
+    search_cache.clear()
+    yield
+    provider_cache.clear()
+    search_cache.clear()
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    now[0] = 11
+    assert cache.get("b") is None
+
+
+def test_stale_generation_is_not_stored():
+    cache = TTLCache(ttl=10)
+    generation = cache.generation
+    cache.clear()
+    cache.set("k", "stale", generation)
+    assert cache.get("k") is None
+
+
+def test_clear_from_another_thread_does_not_break_eviction():
+    cache = TTLCache(ttl=10, max_size=8)
+    done = threading.Event()
+
+    def clear_repeatedly():
+        while not done.is_set():
+            cache.clear()
+
+    clearer = threading.Thread(target=clear_repeatedly)
+    clearer.start()
+    try:
+        for i in range(20000):
+            cache.set(i, i)
+    finally:
+        done.set()
+        clearer.join()
+    assert len(cache._entries) <= cache.max_size
+
+
+@patch("app.api.routes.supabase")
+def test_patch_is_single_round_trip_and_writes_through(mock_supabase, client):
+    row = {
+        "id": 7,
+        "name": "New Name",
+        "phone": "1",
+        "email": "a@b.com",
+        "dedicated_link": "x",
+    }
+    table = mock_supabase.table.return_value
+    table.update.return_value.eq.return_value.execute.return_value = MagicMock(
+        data=[row]
+    )
+
+    response = client.patch("/api/provider/7", json={"name": "New Name"})
+
+    assert response.status_code == 200
+    table.select.assert_not_called()
+    assert client.get("/api/provider/7").json() == row
+    table.select.assert_not_called()
+
+
+@patch("app.api.routes.supabase")
+def test_patch_missing_provider_returns_404(mock_supabase, client):
+    table = mock_supabase.table.return_value
+    table.update.return_value.eq.return_value.execute.return_value = MagicMock(data=[])
+
+    response = client.patch("/api/provider/404", json={"name": "Nobody"})
+
+    assert response.status_code == 404
+    assert provider_cache.get("404") is None
+
+
+@patch("app.api.routes.supabase")
+def test_delete_evicts_provider_and_search_results(mock_supabase, client):
+    provider_cache.set("7", {"id": 7})
+    search_cache.set(("CA", "Aetna"), [{"id": 7}])
+
+    response = client.delete("/api/provider/7")
+
+    assert response.status_code == 200
+    assert provider_cache.get("7") is None
+    assert search_cache.get(("CA", "Aetna")) is None
+
+
+@patch("app.api.routes.supabase")
+def test_cache_hits_do_not_extend_the_ttl(mock_supabase, monkeypatch, client):
+    now = [0.0]
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: now[0])
+    provider_cache.set("7", {"id": 7})
+
+    now[0] = provider_cache.ttl - 1
+    assert client.get("/api/provider/7").json() == {"id": 7}
+    mock_supabase.table.assert_not_called()
+
+    now[0] = provider_cache.ttl + 1
+    assert provider_cache.get("7") is None
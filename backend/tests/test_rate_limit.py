@@ -0,0 +1,87 @@
+import pytest
+from starlette.requests import Request
+from app.core.rate_limit import RateLimiter, SharedBucketStore, client_key
+from app.core import rate_limit
+
+
+def test_bucket_allows_burst_then_rejects():
+    limiter = RateLimiter("test", rate=1, burst=3, max_concurrency=10)
+    assert [limiter.take("a", now=0) for _ in range(3)] == [0, 0, 0]
+    retry_after = limiter.take("a", now=0)
+    assert retry_after == pytest.approx(1.0)
+    # Another client has its own bucket
+    assert limiter.take("b", now=0) == 0
+
+
+def test_bucket_refills_over_time():
+    limiter = RateLimiter("test", rate=2, burst=1, max_concurrency=10)
+    assert limiter.take("a", now=0) == 0
+    assert limiter.take("a", now=0.1) > 0
+    assert limiter.take("a", now=0.6) == 0
+
+
+def test_idle_buckets_are_evicted():
+    limiter = RateLimiter("test", rate=1, burst=1, max_concurrency=10, idle_ttl=10)
+    limiter.take("a", now=0)
+    limiter.take("b", now=5)
+    limiter.take("c", now=12)
+    assert limiter.stats()["buckets"] == 2
+
+
+def test_max_buckets_caps_memory():
+    limiter = RateLimiter("test", rate=1, burst=1, max_concurrency=10, max_buckets=2)
+    for i, key in enumerate(["a", "b", "c", "d"]):
+        limiter.take(key, now=i * 0.01)
+    assert limiter.stats()["buckets"] == 2
+
+
+def test_concurrency_cap():
+    limiter = RateLimiter("test", rate=1, burst=1, max_concurrency=1)
+    assert limiter.enter()
+    assert not limiter.enter()
+    limiter.leave()
+    assert limiter.enter()
+
+
+def test_shared_store_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first = RateLimiter("search", 1, 2, 10, store=SharedBucketStore(path))
+    second = RateLimiter("search", 1, 2, 10, store=SharedBucketStore(path))
+    assert first.take("a") == 0
+    assert second.take("a") == 0
+    assert first.take("a") > 0
+
+
+def test_search_returns_429_with_retry_after(client, monkeypatch, test_search_request):
+    limiter = RateLimiter("search", rate=0.5, burst=1, max_concurrency=10)
+    monkeypatch.setattr(rate_limit.search_limiter, "take", limiter.take)
+    client.post("/api/search-dme", json=test_search_request)
+    # A different session header does not buy a fresh bucket
+    response = client.post(
+        "/api/search-dme",
+        json=test_search_request,
+        headers={"X-Session-Id": "new", "X-Forwarded-For": "203.0.113.9"},
+    )
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+
+
+def make_request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request(
+        {"type": "http", "headers": headers, "client": (peer, 1234), "path": "/"}
+    )
+
+
+def test_forwarded_for_is_ignored_unless_the_proxy_is_trusted(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_TRUST_FORWARDED", raising=False)
+    assert client_key(make_request("10.0.0.5", "1.2.3.4")) == "ip:10.0.0.5"
+
+    monkeypatch.setenv("RATE_LIMIT_TRUST_FORWARDED", "true")
+    monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", "10.0.0.0/8")
+    # Spoofed left-most entry: the right-most untrusted hop is the client
+    request = make_request("10.0.0.5", "6.6.6.6, 198.51.100.7, 10.0.0.2")
+    assert client_key(request) == "ip:198.51.100.7"
+    # A peer outside the trusted list cannot forward anything
+    assert client_key(make_request("198.51.100.8", "1.2.3.4")) == "ip:198.51.100.8"
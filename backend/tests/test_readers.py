@@ -0,0 +1,97 @@
+import gzip
+import io
+import zipfile
+import pandas as pd
+import pytest
+from app.core.file_process import normalize_frame
+from app.core.readers import read_upload_frame, upload_format, COVERAGE_COLUMNS
+
+FRAME = pd.DataFrame(
+    {
+        "DME Name": ["Pump Co", None],
+        "Phone Number": ["555-0100", None],
+        "Email": ["pump@example.com", None],
+        "Dedicated Link": ["https://pump.example", None],
+        "Insurance": ["Aetna", "Cigna"],
+        "State": ["CA", "NY"],
+        "Medicaid": ["yes", "no"],
+        "Internal Notes": ["ignore me", "and me"],
+    }
+)
+CSV = FRAME.to_csv(index=False).encode()
+
+
+def zipped(name: str, content: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def parquet() -> bytes:
+    buffer = io.BytesIO()
+    FRAME.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def xlsx() -> bytes:
+    buffer = io.BytesIO()
+    FRAME.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "filename, content",
+    [
+        ("coverage.csv", CSV),
+        ("coverage.csv.gz", gzip.compress(CSV)),
+        ("coverage.zip", zipped("coverage.csv", CSV)),
+        ("coverage.parquet", parquet()),
+        ("coverage.XLSX", xlsx()),
+    ],
+)
+def test_every_format_feeds_the_same_normalization(filename, content):
+    df = normalize_frame(read_upload_frame(content, filename, COVERAGE_COLUMNS))
+    assert df["dme_name"].tolist() == ["Pump Co", "Pump Co"]
+    assert df["state"].tolist() == ["CA", "NY"]
+    assert df["medicaid"].tolist() == [True, False]
+
+
+def test_parquet_reads_only_requested_columns():
+    df = read_upload_frame(parquet(), "coverage.parquet", COVERAGE_COLUMNS)
+    assert "Internal Notes" not in df.columns
+    assert "DME Name" in df.columns
+
+
+def test_zip_must_hold_exactly_one_csv():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("a.csv", CSV)
+        z.writestr("b.csv", CSV)
+    with pytest.raises(ValueError):
+        read_upload_frame(archive.getvalue(), "coverage.zip")
+
+
+def test_unsupported_extension_is_rejected(client):
+    with pytest.raises(ValueError):
+        upload_format("coverage.json")
+    response = client.post(
+        "/api/upload_providers", files={"file": ("coverage.json", b"{}")}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "filename, content",
+    [("coverage.csv.gz", gzip.compress(CSV)), ("coverage.parquet", parquet())],
+)
+def test_uploads_are_read_from_a_path_or_file(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_bytes(content)
+
+    from_path = read_upload_frame(str(path), filename, COVERAGE_COLUMNS)
+    with open(path, "rb") as f:
+        from_file = read_upload_frame(f, filename, COVERAGE_COLUMNS)
+
+    assert from_path.equals(from_file)
+    assert from_path["Insurance"].tolist() == ["Aetna", "Cigna"]
@@ -0,0 +1,165 @@
+import asyncio
+import gzip
+import json
+import time
+import pytest
+from app.core.reference_cache import (
+    BootstrapPayload,
+    RefreshingValue,
+    ReferenceDataRefresher,
+)
+from app.core.singleflight import SingleFlight
+
+
+def make_value(loader, ttl=60, refresh_ahead=10):
+    return RefreshingValue(
+        "test", loader, ttl=ttl, refresh_ahead=refresh_ahead, flight=SingleFlight("t")
+    )
+
+
+def test_first_get_loads_and_raises_on_error():
+    value = make_value(lambda: ["CA"])
+    assert asyncio.run(value.get()) == ["CA"]
+
+    def failing():
+        raise RuntimeError("supabase down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(make_value(failing).get())
+
+
+def test_stale_value_is_served_while_refreshing():
+    versions = iter([["v1"], ["v2"]])
+    value = make_value(lambda: next(versions))
+
+    async def run():
+        first = await value.get()
+        value.invalidate()
+        stale = await value.get()
+        await value._task
+        fresh = await value.get()
+        return first, stale, fresh
+
+    assert asyncio.run(run()) == (["v1"], ["v1"], ["v2"])
+
+
+def test_failed_refresh_keeps_last_good_value_and_backs_off():
+    responses = iter([["good"]])
+
+    def loader():
+        try:
+            return next(responses)
+        except StopIteration:
+            raise RuntimeError("timeout")
+
+    value = make_value(loader)
+
+    async def run():
+        await value.get()
+        value.invalidate()
+        await value.refresh()
+        return await value.get()
+
+    assert asyncio.run(run()) == ["good"]
+    assert value.failures == 1
+    assert value.last_error == "timeout"
+    assert not value.is_due(time.monotonic())
+
+
+def test_value_is_due_ahead_of_expiry():
+    value = make_value(lambda: 1, ttl=60, refresh_ahead=10)
+    asyncio.run(value.refresh())
+    assert not value.is_due(value.loaded_at + 49)
+    assert value.is_due(value.loaded_at + 51)
+    assert not value.is_stale(value.loaded_at + 51)
+
+
+def test_refresher_loads_values_in_background():
+    value = make_value(lambda: "loaded")
+    refresher = ReferenceDataRefresher({"test": value}, interval=0.01)
+
+    async def run():
+        refresher.start()
+        await asyncio.sleep(0.1)
+        await refresher.stop()
+
+    asyncio.run(run())
+    assert value.loaded and value.value == "loaded"
+
+
+def make_bootstrap(states, insurances):
+    return BootstrapPayload(make_value(lambda: states), make_value(lambda: insurances))
+
+
+def test_bootstrap_is_encoded_when_reference_data_reloads():
+    rows = [{"id": 1, "name": "California", "abbreviation": "CA", "extra": "x"}]
+    payload = make_bootstrap(rows, {"insurances": ["Aetna"], "version": 3})
+
+    async def run():
+        await payload.states.refresh()
+        assert payload.current is None
+        await payload.insurances.refresh()
+        # Built by the reload itself, before anyone asks for it
+        built = payload.current
+        assert await payload.get() is built
+        return built
+
+    built = asyncio.run(run())
+    body = json.loads(built.body)
+    assert body == {
+        "states": [{"id": 1, "name": "California", "abbreviation": "CA"}],
+        "insurances": ["Aetna"],
+        "insurance_version": 3,
+        "version": built.version,
+    }
+    assert gzip.decompress(built.encoded["gzip"]) == built.body
+    assert payload.builds == 1
+
+
+def test_bootstrap_version_follows_content():
+    versions = iter(
+        [
+            {"insurances": ["Aetna"]},
+            {"insurances": ["Aetna"]},
+            {"insurances": ["Cigna"]},
+        ]
+    )
+    payload = BootstrapPayload(
+        make_value(lambda: []), make_value(lambda: next(versions))
+    )
+
+    async def run():
+        await payload.get()
+        first = payload.current
+        await payload.insurances.refresh()
+        same = payload.current
+        await payload.insurances.refresh()
+        return first, same, payload.current
+
+    first, same, changed = asyncio.run(run())
+    assert same.etag == first.etag
+    assert changed.etag != first.etag
+    assert changed.matches(f'"x", {changed.etag}')
+    assert changed.matches(changed.etag.removeprefix("W/"))
+    assert not changed.matches(first.etag)
+    assert changed.matches("*")
+
+
+def test_bootstrap_endpoint_revalidates_with_etag(monkeypatch, client):
+    payload = make_bootstrap(
+        [{"id": 1, "name": "New York", "abbreviation": "NY"}],
+        {"insurances": ["Humana"]},
+    )
+    monkeypatch.setattr("app.api.routes.bootstrap", payload)
+
+    response = client.get("/api/bootstrap", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["insurances"] == ["Humana"]
+    assert "max-age" in response.headers["cache-control"]
+
+    etag = response.headers["etag"]
+    cached = client.get("/api/bootstrap", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    def slow_lookup(state, insurance):
+        calls.append((state, insurance))
+        time.sleep(0.05)
+        return [{"state": state, "insurance": insurance}]
+
+    async def run():
+        return await asyncio.gather(
+            *[flight.do(("CA", "Aetna"), slow_lookup, "CA", "Aetna") for _ in range(10)]
+        )
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(result == [{"state": "CA", "insurance": "Aetna"}] for result in results)
+    assert flight.stats() == {"calls": 1, "collapsed": 9, "in_flight": 0}
+
+
+def test_different_keys_are_not_collapsed():
+    flight = SingleFlight("test")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", lambda: "a"), flight.do("b", lambda: "b")
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flight.stats()["collapsed"] == 0
+
+
+def test_error_is_delivered_to_all_waiters():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing():
+        release.wait(1)
+        raise RuntimeError("supabase down")
+
+    async def run():
+        tasks = [asyncio.ensure_future(flight.do("k", failing)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_completed_calls_are_not_cached():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+
+    async def run():
+        first = await flight.do("k", lambda: next(counter))
+        second = await flight.do("k", lambda: next(counter))
+        return first, second
+
+    assert asyncio.run(run()) == (0, 1)
+
+
+def test_first_caller_leaving_does_not_cancel_the_shared_call():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        release.wait(1)
+        return "done"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("k", lookup))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("k", lookup))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(run()) == ("done", True)
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "collapsed": 1, "in_flight": 0}
@@ -0,0 +1,102 @@
+import httpx
+import pytest
+from app.core import transport
+from app.core.transport import CircuitBreaker, CircuitOpenError, ResilientTransport
+
+
+def make_client(handler, breaker=None, retries=2):
+    breaker = breaker or CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    resilient = ResilientTransport(
+        httpx.MockTransport(handler), breaker, retries=retries, sleep=lambda s: None
+    )
+    return httpx.Client(base_url="https://db.example", transport=resilient), breaker
+
+
+def flaky(statuses):
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    return handler, calls
+
+
+def test_reads_are_retried_until_success():
+    handler, calls = flaky([503, 502, 200])
+    client, breaker = make_client(handler)
+
+    assert client.get("/providers").status_code == 200
+    assert len(calls) == 3
+    assert breaker.state == "closed"
+
+
+def test_writes_are_not_retried():
+    handler, calls = flaky([503, 200])
+    client, _ = make_client(handler)
+
+    assert client.post("/rpc/search_providers").status_code == 503
+    assert calls == ["POST"]
+
+
+def test_network_errors_are_retried_then_raised():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client, breaker = make_client(handler, retries=1)
+
+    with pytest.raises(httpx.ConnectError):
+        client.get("/providers")
+    assert breaker.failures == 2
+
+
+def test_breaker_opens_fails_fast_and_recovers(monkeypatch):
+    handler, calls = flaky([503, 503, 503, 200])
+    clock = [1000.0]
+    monkeypatch.setattr(transport.time, "monotonic", lambda: clock[0])
+    client, breaker = make_client(handler, retries=0)
+
+    for _ in range(3):
+        client.get("/providers")
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        client.get("/providers")
+    assert len(calls) == 3
+    assert breaker.stats()["rejected"] == 1
+
+    clock[0] += 31
+    assert breaker.state == "half_open"
+    assert client.get("/providers").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(transport.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 11
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_health_reports_breaker_state(client, monkeypatch):
+    assert client.get("/health").json()["supabase"]["state"] == "closed"
+
+    monkeypatch.setattr(transport.breaker, "opened_at", transport.time.monotonic())
+    body = client.get("/health").json()
+    assert body["status"] == "degraded"
+    assert body["supabase"]["state"] == "open"
+
+
+def test_pooled_postgrest_client_uses_resilient_transport():
+    postgrest = transport.PooledPostgrestClient(
+        "https://db.example/rest/v1", headers={}, schema="public"
+    )
+    assert isinstance(postgrest.session._transport, ResilientTransport)
@@ -0,0 +1,386 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.api.routes import processing_status
+from app.core import file_process, upload_jobs
+from app.core.reference_cache import reference_data
+
+STATES = ["CA", "NY", "TX"]
+
+CSV = (
+    "DME Name,Phone Number,Email,Dedicated Link,Insurance,State,Medicaid,"
+    "Resupply Available,Accessories Available,Lactation Services Available\n"
+    "Pump Co,555-0100,pump@example.com,https://pump.example,Aetna,CA,yes,yes,no,no\n"
+    ",,,,Cigna,CA,no,yes,no,no\n"
+    ",,,,Aetna,NY,no,no,no,no\n"
+    "Milk Inc,555-0101,milk@example.com,https://milk.example,Aetna,TX,no,no,yes,no\n"
+    ",,,,Humana,TX,no,no,no,yes\n"
+).encode()
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.names = None
+        self.rows = None
+
+    def select(self, *args):
+        return self
+
+    def in_(self, field, values):
+        self.names = values
+        return self
+
+    def insert(self, rows):
+        self.rows = [
+            {"id": len(self.db.rows[self.table]) + i + 1, **row}
+            for i, row in enumerate(rows)
+        ]
+        self.db.rows[self.table].extend(self.rows)
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.db.upserts += 1
+        if self.db.upserts == self.db.fail_on_upsert:
+            raise RuntimeError("connection reset")
+        for row in rows:
+            key = (row["provider_id"], row["insurance_id"], row["state_code"])
+            self.db.coverage[key] = row
+        self.rows = rows
+        return self
+
+    def execute(self):
+        if self.rows is not None:
+            return MagicMock(data=self.rows)
+        existing = [r for r in self.db.rows[self.table] if r["name"] in self.names]
+        return MagicMock(data=existing)
+
+
+class FakeSupabase:
+    def __init__(self, fail_on_upsert=None):
+        self.rows = {"providers": [], "insurances": []}
+        self.coverage = {}
+        self.upserts = 0
+        self.fail_on_upsert = fail_on_upsert
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def wait_for_job(client, job_id, timeout=5):
+    """Poll an upload's status until the scheduler has finished with it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/api/upload_status/{job_id}").json()
+        if status["status"] not in ("queued", "processing"):
+            return status
+        assert time.monotonic() < deadline, status
+        time.sleep(0.01)
+
+
+def use_states(monkeypatch, codes):
+    # Patch the loader too, so a background refresh cannot swap the states out
+    states = reference_data["states"]
+    rows = [{"abbreviation": code} for code in codes]
+    monkeypatch.setattr(states, "loader", lambda: rows)
+    monkeypatch.setattr(states, "value", rows)
+    monkeypatch.setattr(states, "loaded", True)
+    monkeypatch.setattr(states, "loaded_at", time.monotonic())
+
+
+def simulate_restart(job_id):
+    """Forget the job in memory and leave its lock to a process that exited."""
+    processing_status.pop(job_id)
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    with open(upload_jobs.job_path(job_id, upload_jobs.LOCK_FILE), "w") as f:
+        f.write(str(exited.pid))
+
+
+@pytest.fixture
+def job(monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOAD_JOBS_DIR", str(tmp_path))
+    monkeypatch.setenv("INSURANCES_TABLE", "insurances")
+    monkeypatch.setenv("PROVIDER_COVERAGE_TABLE", "provider_coverage")
+    monkeypatch.setattr(file_process, "COVERAGE_BATCH_SIZE", 2)
+    use_states(monkeypatch, STATES)
+    job_id = "job-1"
+    processing_status[job_id] = {"status": "processing"}
+    upload_jobs.create_job(job_id, CSV, "coverage.csv", processing_status[job_id])
+    yield job_id
+    processing_status.pop(job_id, None)
+
+
+def test_blank_jobs_dir_uses_the_default(monkeypatch):
+    monkeypatch.setenv("UPLOAD_JOBS_DIR", "")
+
+    assert upload_jobs.jobs_dir() == os.path.join(
+        upload_jobs.tempfile.gettempdir(), "annabella_upload_jobs"
+    )
+
+
+def test_failed_job_resumes_from_checkpoint(monkeypatch, job):
+    db = FakeSupabase(fail_on_upsert=2)
+    monkeypatch.setattr(file_process, "sb", db)
+
+    asyncio.run(file_process.process_csv_async(job))
+
+    assert processing_status[job]["status"] == "error"
+    assert processing_status[job]["resumable"]
+    checkpoint = upload_jobs.load_checkpoint(job)
+    assert checkpoint["coverage_batches_committed"] == 1
+    assert set(checkpoint["provider_name_to_id"]) == {"Pump Co", "Milk Inc"}
+    providers_before = len(db.rows["providers"])
+
+    asyncio.run(file_process.process_csv_async(job))
+
+    assert processing_status[job]["status"] == "completed"
+    assert len(db.coverage) == 5
+    # Providers and insurances were resolved once, and batch 0 was not replayed
+    assert len(db.rows["providers"]) == providers_before
+    assert len(db.rows["insurances"]) == 3
+    assert db.upserts == 4
+    assert upload_jobs.load_checkpoint(job) is None
+
+
+def test_batch_progress_is_saved_for_other_workers(monkeypatch, job):
+    monkeypatch.setattr(file_process, "sb", FakeSupabase())
+    monkeypatch.setenv("UPLOAD_STATUS_SAVE_INTERVAL", "0")
+    saved = []
+    save_status = upload_jobs.save_status
+
+    def record(job_id, status):
+        saved.append(status.get("progress"))
+        save_status(job_id, status)
+
+    monkeypatch.setattr(upload_jobs, "save_status", record)
+
+    asyncio.run(file_process.process_csv_async(job))
+
+    # Every batch is saved, then the completed status
+    assert saved[-4:] == [2, 4, 5, 5]
+
+
+def test_resume_endpoint_restarts_interrupted_job(monkeypatch, job, client):
+    monkeypatch.setattr(file_process, "sb", FakeSupabase())
+    # Simulate a worker restart: the status only survives on disk
+    simulate_restart(job)
+
+    response = client.post(f"/api/upload_resume/{job}")
+
+    assert response.status_code == 200
+    status = wait_for_job(client, job)
+    assert status["status"] == "completed"
+    assert set(status["timings"]) == {
+        "parse",
+        "validate",
+        "providers",
+        "insurances",
+        "coverage",
+        "snapshot",
+    }
+    assert client.post(f"/api/upload_resume/{job}").status_code == 409
+    assert not os.path.exists(upload_jobs.job_path(job, upload_jobs.LOCK_FILE))
+
+
+def test_resume_is_refused_while_another_worker_holds_the_job(job, client):
+    # The job fixture's lock belongs to this live process, as if another
+    # worker were still running the job
+    processing_status.pop(job)
+
+    response = client.post(f"/api/upload_resume/{job}")
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Job is already running"
+    assert upload_jobs.load_status(job)["status"] == "processing"
+
+
+def test_reject_mode_fails_before_any_write(monkeypatch, job):
+    db = FakeSupabase()
+    monkeypatch.setattr(file_process, "sb", db)
+    use_states(monkeypatch, ["CA"])
+    checkpoint = upload_jobs.load_checkpoint(job)
+    checkpoint["options"] = {"on_invalid": "reject"}
+    upload_jobs.save_checkpoint(job, checkpoint)
+
+    asyncio.run(file_process.process_csv_async(job))
+
+    status = processing_status[job]
+    assert status["status"] == "error"
+    assert status["validation"]["counts"]["unknown_state"] == 3
+    assert db.rows["providers"] == [] and db.coverage == {}
+    # A rejected upload cannot be resumed, so nothing is kept for it
+    assert upload_jobs.load_checkpoint(job) is None
+    assert not os.path.exists(upload_jobs.raw_path(job))
+
+
+def test_quarantined_rows_are_skipped_and_downloadable(monkeypatch, job, client):
+    db = FakeSupabase()
+    monkeypatch.setattr(file_process, "sb", db)
+    use_states(monkeypatch, ["CA"])
+
+    asyncio.run(file_process.process_csv_async(job))
+
+    assert processing_status[job]["status"] == "completed"
+    assert len(db.coverage) == 2
+    response = client.get(f"/api/upload_quarantine/{job}")
+    assert response.status_code == 200
+    assert response.text.count("\n") == 4
+
+
+def test_resume_unknown_job_returns_404(client, monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOAD_JOBS_DIR", str(tmp_path))
+    assert client.post("/api/upload_resume/missing").status_code == 404
+
+
+def test_identical_upload_short_circuits_unless_forced(monkeypatch, job, client):
+    db = FakeSupabase()
+    monkeypatch.setattr(file_process, "sb", db)
+    files = {"file": ("coverage.csv", CSV)}
+
+    first = client.post("/api/upload_providers", files=files).json()["job_id"]
+    wait_for_job(client, first)
+    upserts = db.upserts
+    second = client.post("/api/upload_providers", files=files).json()["job_id"]
+
+    status = client.get(f"/api/upload_status/{second}").json()
+    assert status["status"] == "completed"
+    assert status["deduplicated_from"] == first
+    assert status["coverage_entries_loaded"] == 5
+    assert db.upserts == upserts
+
+    forced = client.post("/api/upload_providers?force=true", files=files)
+    wait_for_job(client, forced.json()["job_id"])
+    assert db.upserts > upserts
+
+
+def test_reordered_upload_matches_normalized_hash(monkeypatch, job, client):
+    db = FakeSupabase()
+    monkeypatch.setattr(file_process, "sb", db)
+    first = client.post("/api/upload_providers", files={"file": ("coverage.csv", CSV)})
+    wait_for_job(client, first.json()["job_id"])
+    upserts = db.upserts
+
+    header, *rows = CSV.decode().splitlines()
+    # Same rows, reordered within provider blocks and padded with whitespace
+    reordered = "\n".join([header, rows[0], rows[2], rows[1] + "  ", rows[3], rows[4]])
+    response = client.post(
+        "/api/upload_providers", files={"file": ("coverage.csv", reordered.encode())}
+    )
+
+    status = wait_for_job(client, response.json()["job_id"])
+    assert status["deduplicated_from"]
+    assert db.upserts == upserts
+
+
+def test_cancelled_upload_keeps_checkpoint_and_resumes(monkeypatch, job, client):
+    db = FakeSupabase()
+    monkeypatch.setattr(file_process, "sb", db)
+    started = threading.Event()
+    release = threading.Event()
+    upsert = file_process.upsert_coverage_batch
+
+    def slow_upsert(batch):
+        started.set()
+        release.wait(5)
+        upsert(batch)
+
+    monkeypatch.setattr(file_process, "upsert_coverage_batch", slow_upsert)
+    simulate_restart(job)
+
+    client.post(f"/api/upload_resume/{job}")
+    assert started.wait(5)
+    response = client.delete(f"/api/upload_status/{job}")
+    release.set()
+
+    assert response.status_code == 200
+    status = wait_for_job(client, job)
+    assert status["status"] == "cancelled" and status["resumable"]
+    assert client.delete(f"/api/upload_status/{job}").status_code == 409
+
+    monkeypatch.setattr(file_process, "upsert_coverage_batch", upsert)
+    client.post(f"/api/upload_resume/{job}")
+    assert wait_for_job(client, job)["status"] == "completed"
+    assert len(db.coverage) == 5
+
+
+def test_old_terminal_jobs_lose_their_raw_files(monkeypatch, job):
+    monkeypatch.setattr(file_process, "sb", FakeSupabase(fail_on_upsert=1))
+    asyncio.run(file_process.process_csv_async(job))
+    assert processing_status[job]["resumable"]
+
+    upload_jobs.prune_jobs(3600)
+    assert os.path.exists(upload_jobs.raw_path(job))
+
+    upload_jobs.prune_jobs(3600, now=time.time() + 3601)
+    assert not os.path.exists(upload_jobs.raw_path(job))
+    assert upload_jobs.load_checkpoint(job) is None
+    status = upload_jobs.load_status(job)
+    assert status["status"] == "error" and not status["resumable"]
+
+
+def read_events(response):
+    events = []
+    for block in response.text.split("\n\n"):
+        lines = block.splitlines()
+        if lines and lines[0] == "event: status":
+            events.append(json.loads(lines[1][len("data: ") :]))
+    return events
+
+
+def test_status_stream_pushes_changes_until_finished(monkeypatch, job, client):
+    monkeypatch.setenv("UPLOAD_STREAM_INTERVAL", "0.01")
+    monkeypatch.setenv("UPLOAD_STREAM_HEARTBEAT", "0.02")
+    status = processing_status[job]
+    status.update({"progress": 0})
+
+    def advance():
+        time.sleep(0.1)
+        status["progress"] = 3
+        time.sleep(0.1)
+        status.update({"status": "completed", "progress": 5})
+
+    worker = threading.Thread(target=advance)
+    worker.start()
+    response = client.get(f"/api/upload_status/{job}/stream")
+    worker.join()
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert ": heartbeat" in response.text
+    events = read_events(response)
+    assert [event["progress"] for event in events] == [0, 3, 5]
+    assert events[-1]["status"] == "completed"
+
+
+def test_status_stream_falls_back_to_job_store(job, client):
+    upload_jobs.save_status(job, {"status": "error", "message": "boom"})
+    processing_status.pop(job)
+
+    response = client.get(f"/api/upload_status/{job}/stream")
+
+    assert read_events(response) == [{"status": "error", "message": "boom"}]
+
+
+def test_status_stream_unknown_job_returns_404(job, client):
+    assert client.get("/api/upload_status/missing/stream").status_code == 404
+
+
+def test_cancelled_provider_upload_propagates_cancellation(monkeypatch):
+    from app.api import routes
+
+    async def cancelled(*args, **kwargs):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(routes, "supabase", MagicMock())
+    monkeypatch.setattr(routes.job_scheduler, "run", cancelled)
+    upload = MagicMock(filename="states.csv")
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(routes.upload_provider_insurance_states("7", upload))
@@ -0,0 +1,63 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from app.core.upload_limit import UploadLimitMiddleware
+
+
+def make_client(max_bytes: int) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/api/upload_providers")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/api/echo")
+    async def echo(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(
+        UploadLimitMiddleware,
+        max_bytes=max_bytes,
+        path_suffixes=("/upload_providers",),
+    )
+    return TestClient(app)
+
+
+def test_uploads_under_the_limit_pass():
+    client = make_client(4096)
+    files = {"file": ("coverage.csv", b"x" * 1000)}
+
+    assert client.post("/api/upload_providers", files=files).json() == {"size": 1000}
+
+
+def test_declared_length_over_the_limit_is_rejected_up_front():
+    client = make_client(4096)
+    files = {"file": ("coverage.csv", b"x" * 5000)}
+
+    response = client.post("/api/upload_providers", files=files)
+
+    assert response.status_code == 413
+    # Other routes are not limited
+    assert client.post("/api/echo", files=files).status_code == 200
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    client = make_client(4096)
+    boundary = "limit"
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+        'filename="coverage.csv"\r\n\r\n'
+    ).encode()
+
+    def body():
+        yield head
+        for _ in range(10):
+            yield b"x" * 1000
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/api/upload_providers",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert response.status_code == 413
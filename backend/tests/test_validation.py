@@ -0,0 +1,54 @@
+import io
+import pandas as pd
+from app.core.file_process import normalize_frame
+from app.core.validation import validate_coverage_frame
+
+VALID_STATES = {"CA", "NY", "ALL"}
+
+
+def frame(csv: str) -> pd.DataFrame:
+    header = "DME Name,Phone Number,Email,Dedicated Link,Insurance,State,Medicaid\n"
+    return normalize_frame(pd.read_csv(io.StringIO(header + csv)))
+
+
+def test_clean_frame_has_no_errors():
+    df = frame(
+        "Pump Co,555,pump@example.com,https://p,Aetna,CA,yes\n" ",,,,Cigna,ALL,no\n"
+    )
+    invalid, report = validate_coverage_frame(df, VALID_STATES)
+    assert not invalid.any()
+    assert report["invalid_rows"] == 0
+    assert report["errors"] == []
+
+
+def test_each_rule_is_reported_with_file_row_numbers():
+    df = frame(
+        ",555,nobody@example.com,https://x,Aetna,CA,no\n"
+        "Pump Co,555,not-an-email,https://p,Aetna,CA,yes\n"
+        ",,,,Cigna,ZZ,no\n"
+        ",,,,Aetna,CA,no\n"
+        ",,,,,NY,no\n"
+    )
+    invalid, report = validate_coverage_frame(df, VALID_STATES)
+
+    assert invalid.tolist() == [True, True, True, True, True]
+    assert report["counts"] == {
+        "missing_dme_name": 1,
+        "missing_insurance": 1,
+        "unknown_state": 1,
+        "invalid_email": 4,
+        "duplicate_coverage": 1,
+    }
+    errors = {entry["row"]: entry["errors"] for entry in report["errors"]}
+    assert errors[2] == ["Missing DME name"]
+    assert errors[4] == ["Unknown state 'ZZ'", "Invalid email 'not-an-email'"]
+    assert "Duplicate provider/insurance/state row" in errors[5]
+
+
+def test_report_is_truncated_but_counts_are_complete(monkeypatch):
+    monkeypatch.setattr("app.core.validation.MAX_REPORTED_ROWS", 2)
+    df = frame("".join(f"Pump {i},555,bad,https://p,Aetna,CA,no\n" for i in range(5)))
+    invalid, report = validate_coverage_frame(df, VALID_STATES)
+    assert report["counts"]["invalid_email"] == 5
+    assert len(report["errors"]) == 2
+    assert report["errors_truncated"]
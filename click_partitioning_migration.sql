@@ -0,0 +1,342 @@
+-- Month-partitioned click storage
+-- Run this in your Supabase SQL editor after click_tracking_migration.sql.
+-- It moves provider_clicks to a table partitioned by month of clicked_at
+-- (UTC), copies the existing rows and keeps the old table as
+-- provider_clicks_unpartitioned until you have checked the copy.
+--
+-- Inserts and date-ranged reads only touch the months they need, and old
+-- months are archived and dropped whole by
+--   cd backend && python -m app.core.click_archive --keep-months 13
+-- instead of being deleted row by row.
+
+BEGIN;
+
+-- Partition bounds and month names are always UTC
+SET LOCAL TIME ZONE 'UTC';
+
+-- Keep the old table (and its ids) out of the way
+DO $$
+BEGIN
+    IF to_regclass('provider_clicks') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table
+        WHERE partrelid = 'provider_clicks'::regclass
+    ) THEN
+        ALTER TABLE provider_clicks RENAME TO provider_clicks_unpartitioned;
+        ALTER INDEX IF EXISTS provider_clicks_pkey
+            RENAME TO provider_clicks_unpartitioned_pkey;
+    END IF;
+END;
+$$;
+
+-- Ids continue from the old table's sequence
+CREATE SEQUENCE IF NOT EXISTS provider_clicks_id_seq;
+ALTER SEQUENCE provider_clicks_id_seq AS BIGINT OWNED BY NONE;
+
+-- The primary key leads with clicked_at: every partition is a clustered
+-- (clicked_at, id) range, which is also the export's keyset order. Of the
+-- six old secondary indexes only the per-provider one is kept; analytics
+-- narrow by date first and aggregate the rest.
+CREATE TABLE IF NOT EXISTS provider_clicks (
+    id BIGINT NOT NULL DEFAULT nextval('provider_clicks_id_seq'),
+    provider_id INTEGER NOT NULL,
+    user_email VARCHAR(255) NOT NULL,
+    search_state VARCHAR(2) NOT NULL,
+    search_insurance VARCHAR(255) NOT NULL,
+    click_type VARCHAR(20) NOT NULL DEFAULT 'manual', -- 'manual', 'auto_redirect'
+    clicked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    session_id VARCHAR(255),
+    user_agent TEXT,
+    referrer TEXT,
+
+    PRIMARY KEY (clicked_at, id),
+
+    CONSTRAINT fk_provider_clicks_provider_id
+        FOREIGN KEY (provider_id)
+        REFERENCES providers(id)
+        ON DELETE CASCADE
+) PARTITION BY RANGE (clicked_at);
+
+ALTER SEQUENCE provider_clicks_id_seq OWNED BY provider_clicks.id;
+
+CREATE INDEX IF NOT EXISTS idx_provider_clicks_provider_time
+    ON provider_clicks (provider_id, clicked_at);
+
+-- provider_clicks_YYYY_MM for the month containing p_month
+CREATE OR REPLACE FUNCTION click_partition_name(p_month DATE)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT 'provider_clicks_' || to_char(p_month, 'YYYY_MM');
+$$;
+
+-- Partition DDL runs with the migration owner's rights (it owns
+-- provider_clicks); EXECUTE is limited to service_role below.
+CREATE OR REPLACE FUNCTION create_click_partition(p_month DATE)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::DATE;
+    partition_name TEXT := click_partition_name(month_start);
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF provider_clicks '
+        'FOR VALUES FROM (%L) TO (%L)',
+        partition_name,
+        month_start::TIMESTAMP AT TIME ZONE 'UTC',
+        (month_start + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC'
+    );
+    RETURN partition_name;
+END;
+$$;
+
+-- Create this month's partition and the next p_months_ahead. A click whose
+-- month has no partition fails to insert, so run this at least monthly; the
+-- archive job calls it on every run. With pg_cron:
+--   SELECT cron.schedule('click-partitions', '0 3 * * *',
+--                        'SELECT ensure_click_partitions(3)');
+CREATE OR REPLACE FUNCTION ensure_click_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS SETOF TEXT
+LANGUAGE sql
+AS $$
+    SELECT create_click_partition(months.month_start::DATE)
+    FROM generate_series(
+        date_trunc('month', NOW() AT TIME ZONE 'UTC'),
+        date_trunc('month', NOW() AT TIME ZONE 'UTC')
+            + make_interval(months => p_months_ahead),
+        INTERVAL '1 month'
+    ) AS months(month_start);
+$$;
+
+-- Every partition with its month and the planner's row estimate
+CREATE OR REPLACE FUNCTION list_click_partitions()
+RETURNS TABLE (partition_name TEXT, month DATE, estimated_rows BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        child.relname::TEXT,
+        to_date(right(child.relname, 7), 'YYYY_MM'),
+        GREATEST(child.reltuples, 0)::BIGINT
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = 'provider_clicks'::regclass
+    ORDER BY 2;
+$$;
+
+CREATE OR REPLACE FUNCTION count_click_partition(p_month DATE)
+RETURNS BIGINT
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    total BIGINT;
+BEGIN
+    EXECUTE format('SELECT COUNT(*) FROM %I', click_partition_name(p_month))
+    INTO total;
+    RETURN total;
+END;
+$$;
+
+-- Detach and drop a month once it has been archived. p_expected_rows is the
+-- number of rows the archive holds; if the partition no longer matches (a
+-- late insert), nothing is dropped. The current month is never dropped.
+CREATE OR REPLACE FUNCTION drop_click_partition(p_month DATE, p_expected_rows BIGINT)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::DATE;
+    partition_name TEXT := click_partition_name(month_start);
+    total BIGINT;
+BEGIN
+    IF month_start >= date_trunc('month', NOW() AT TIME ZONE 'UTC')::DATE THEN
+        RAISE EXCEPTION 'Refusing to drop % (current or future month)', partition_name;
+    END IF;
+    IF to_regclass(partition_name) IS NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Block writers while counting so the check still holds at the drop
+    EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', partition_name);
+    EXECUTE format('SELECT COUNT(*) FROM %I', partition_name) INTO total;
+    IF total <> p_expected_rows THEN
+        RAISE EXCEPTION '% holds % rows, archive has %',
+            partition_name, total, p_expected_rows;
+    END IF;
+
+    EXECUTE format('ALTER TABLE provider_clicks DETACH PARTITION %I', partition_name);
+    EXECUTE format('DROP TABLE %I', partition_name);
+    RETURN TRUE;
+END;
+$$;
+
+SELECT ensure_click_partitions(3);
+
+-- Copy the old rows into their months
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    IF to_regclass('provider_clicks_unpartitioned') IS NULL THEN
+        RETURN;
+    END IF;
+
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', MIN(clicked_at)),
+            date_trunc('month', MAX(clicked_at)),
+            INTERVAL '1 month'
+        )::DATE
+        FROM provider_clicks_unpartitioned
+    LOOP
+        PERFORM create_click_partition(month_start);
+    END LOOP;
+
+    INSERT INTO provider_clicks (
+        id, provider_id, user_email, search_state, search_insurance,
+        click_type, clicked_at, session_id, user_agent, referrer
+    )
+    SELECT
+        id, provider_id, user_email, search_state, search_insurance,
+        click_type, COALESCE(clicked_at, NOW()), session_id, user_agent, referrer
+    FROM provider_clicks_unpartitioned
+    ON CONFLICT DO NOTHING;
+
+    PERFORM setval(
+        'provider_clicks_id_seq',
+        GREATEST(
+            (SELECT MAX(id) FROM provider_clicks),
+            (SELECT last_value FROM provider_clicks_id_seq),
+            1
+        )
+    );
+END;
+$$;
+
+-- Click analytics over [start_date, end_date] in UTC days. The range is a
+-- plain clicked_at comparison against timestamptz bounds, so only the
+-- months it covers are scanned, and each is read once: the top states and
+-- insurances come from the same filtered rows as the totals.
+CREATE OR REPLACE FUNCTION get_click_analytics(
+    start_date DATE DEFAULT CURRENT_DATE - INTERVAL '30 days',
+    end_date DATE DEFAULT CURRENT_DATE,
+    provider_id_filter INTEGER DEFAULT NULL,
+    state_filter VARCHAR(2) DEFAULT NULL
+)
+RETURNS TABLE (
+    provider_id INTEGER,
+    provider_name VARCHAR,
+    total_clicks BIGINT,
+    manual_clicks BIGINT,
+    auto_redirects BIGINT,
+    unique_users BIGINT,
+    avg_clicks_per_user NUMERIC,
+    top_states TEXT[],
+    top_insurances TEXT[]
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH clicks AS MATERIALIZED (
+        SELECT pc.provider_id, pc.user_email, pc.click_type,
+               pc.search_state, pc.search_insurance
+        FROM provider_clicks pc
+        WHERE pc.clicked_at >= start_date::TIMESTAMP AT TIME ZONE 'UTC'
+            AND pc.clicked_at < (end_date + 1)::TIMESTAMP AT TIME ZONE 'UTC'
+            AND (provider_id_filter IS NULL OR pc.provider_id = provider_id_filter)
+            AND (state_filter IS NULL OR pc.search_state = state_filter)
+    ),
+    totals AS (
+        SELECT
+            c.provider_id,
+            COUNT(*) AS total_clicks,
+            COUNT(*) FILTER (WHERE c.click_type = 'manual') AS manual_clicks,
+            COUNT(*) FILTER (WHERE c.click_type = 'auto_redirect') AS auto_redirects,
+            -- Unfiltered distinct users come from click_user_sketches; the
+            -- exact count is only taken for state filters, which the daily
+            -- sketches cannot answer
+            COUNT(DISTINCT c.user_email) FILTER (
+                WHERE state_filter IS NOT NULL
+            ) AS unique_users
+        FROM clicks c
+        GROUP BY c.provider_id
+    ),
+    state_ranks AS (
+        SELECT ranked.provider_id,
+               ARRAY_AGG(ranked.search_state::TEXT ORDER BY ranked.n DESC) AS top_states
+        FROM (
+            SELECT c.provider_id, c.search_state, COUNT(*) AS n,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY c.provider_id ORDER BY COUNT(*) DESC
+                   ) AS rank
+            FROM clicks c
+            GROUP BY c.provider_id, c.search_state
+        ) ranked
+        WHERE ranked.rank <= 5
+        GROUP BY ranked.provider_id
+    ),
+    insurance_ranks AS (
+        SELECT ranked.provider_id,
+               ARRAY_AGG(ranked.search_insurance::TEXT ORDER BY ranked.n DESC) AS top_insurances
+        FROM (
+            SELECT c.provider_id, c.search_insurance, COUNT(*) AS n,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY c.provider_id ORDER BY COUNT(*) DESC
+                   ) AS rank
+            FROM clicks c
+            GROUP BY c.provider_id, c.search_insurance
+        ) ranked
+        WHERE ranked.rank <= 5
+        GROUP BY ranked.provider_id
+    )
+    SELECT
+        p.id AS provider_id,
+        p.name AS provider_name,
+        COALESCE(t.total_clicks, 0) AS total_clicks,
+        COALESCE(t.manual_clicks, 0) AS manual_clicks,
+        COALESCE(t.auto_redirects, 0) AS auto_redirects,
+        COALESCE(t.unique_users, 0) AS unique_users,
+        ROUND(t.total_clicks::NUMERIC / NULLIF(t.unique_users, 0), 2) AS avg_clicks_per_user,
+        COALESCE(s.top_states, ARRAY[]::TEXT[]) AS top_states,
+        COALESCE(i.top_insurances, ARRAY[]::TEXT[]) AS top_insurances
+    FROM providers p
+    LEFT JOIN totals t ON t.provider_id = p.id
+    LEFT JOIN state_ranks s ON s.provider_id = p.id
+    LEFT JOIN insurance_ranks i ON i.provider_id = p.id
+    WHERE (provider_id_filter IS NULL OR p.id = provider_id_filter)
+        AND (t.provider_id IS NOT NULL OR provider_id_filter IS NOT NULL)
+    ORDER BY total_clicks DESC;
+$$;
+
+-- Grant permissions
+GRANT SELECT, INSERT ON provider_clicks TO authenticated;
+GRANT USAGE ON SEQUENCE provider_clicks_id_seq TO authenticated;
+GRANT EXECUTE ON FUNCTION get_click_analytics TO authenticated;
+GRANT EXECUTE ON FUNCTION list_click_partitions TO authenticated;
+
+-- Partition maintenance is for the archive job only, which must run with the
+-- Supabase service key (SUPABASE_KEY=<service_role key>). Functions are
+-- executable by PUBLIC by default, so revoke that first.
+REVOKE EXECUTE ON FUNCTION create_click_partition FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ensure_click_partitions FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION count_click_partition FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_click_partition FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_click_partition TO service_role;
+GRANT EXECUTE ON FUNCTION ensure_click_partitions TO service_role;
+GRANT EXECUTE ON FUNCTION count_click_partition TO service_role;
+GRANT EXECUTE ON FUNCTION drop_click_partition TO service_role;
+
+COMMIT;
+
+-- After checking the copy (row counts per month match):
+--   DROP TABLE provider_clicks_unpartitioned;
+
+-- Add environment variables (add to your .env file)
+-- CLICK_ARCHIVE_DIR=click_archive
+-- CLICK_RETENTION_MONTHS=13
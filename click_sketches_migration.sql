@@ -0,0 +1,147 @@
+-- Distinct-user sketches for click analytics
+-- Run this in your Supabase SQL editor after click_tracking_migration.sql
+
+-- One HyperLogLog sketch (4096 one-byte registers) per day and provider.
+-- The backend adds every click's user to an in-memory sketch and merges it
+-- here periodically; unique-user counts for any window merge the rows in range.
+CREATE TABLE IF NOT EXISTS click_user_sketches (
+    day DATE NOT NULL,
+    provider_id INTEGER NOT NULL,
+    registers BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (day, provider_id),
+
+    CONSTRAINT fk_click_user_sketches_provider_id
+        FOREIGN KEY (provider_id)
+        REFERENCES providers(id)
+        ON DELETE CASCADE
+);
+
+-- Whole-month rollups of the daily sketches. A range query reads one row per
+-- month it fully covers and the daily rows only for the partial months at
+-- either end, so a year-long window merges a dozen or so rows rather than 365.
+CREATE TABLE IF NOT EXISTS click_user_sketch_months (
+    month DATE NOT NULL, -- first day of the month
+    provider_id INTEGER NOT NULL,
+    registers BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (month, provider_id),
+
+    CONSTRAINT fk_click_user_sketch_months_provider_id
+        FOREIGN KEY (provider_id)
+        REFERENCES providers(id)
+        ON DELETE CASCADE
+);
+
+-- Register-wise maximum of two sketches, computed in one set-based
+-- expression rather than a get_byte/set_byte loop that copies the bytea
+-- on every write.
+CREATE OR REPLACE FUNCTION merge_click_sketch_registers(a BYTEA, b BYTEA)
+RETURNS BYTEA
+LANGUAGE sql
+IMMUTABLE
+STRICT
+PARALLEL SAFE
+AS $$
+    SELECT decode(
+        string_agg(lpad(to_hex(GREATEST(get_byte(a, i), get_byte(b, i))), 2, '0'), '' ORDER BY i),
+        'hex'
+    )
+    FROM generate_series(0, length(a) - 1) AS i;
+$$;
+
+-- Union aggregate over sketches. The state function is strict with no
+-- initial value, so the first sketch in a group becomes the state as is.
+CREATE OR REPLACE AGGREGATE click_sketch_union(BYTEA) (
+    SFUNC = merge_click_sketch_registers,
+    STYPE = BYTEA,
+    PARALLEL = SAFE
+);
+
+-- Merge a sketch into the stored daily and monthly ones. Each upsert is a
+-- single statement, so concurrent merges from several workers serialise on
+-- the row and none is lost.
+CREATE OR REPLACE FUNCTION merge_click_user_sketch(
+    p_day DATE,
+    p_provider_id INTEGER,
+    p_registers TEXT -- base64-encoded registers
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO click_user_sketches AS s (day, provider_id, registers)
+    VALUES (p_day, p_provider_id, decode(p_registers, 'base64'))
+    ON CONFLICT (day, provider_id) DO UPDATE
+    SET registers = merge_click_sketch_registers(s.registers, EXCLUDED.registers),
+        updated_at = NOW();
+
+    INSERT INTO click_user_sketch_months AS m (month, provider_id, registers)
+    VALUES (date_trunc('month', p_day)::DATE, p_provider_id, decode(p_registers, 'base64'))
+    ON CONFLICT (month, provider_id) DO UPDATE
+    SET registers = merge_click_sketch_registers(m.registers, EXCLUDED.registers),
+        updated_at = NOW();
+$$;
+
+-- Union of the stored sketches for the days in [p_start, p_end]: the
+-- register-wise maximum, taken here so a single 4 KiB sketch per group
+-- leaves the database however many days the range covers. Months wholly
+-- inside the range come from click_user_sketch_months and only the edge
+-- days from click_user_sketches. With p_by_provider there is one row per
+-- provider; otherwise one row whose provider_id is NULL. No rows means no
+-- sketches in range.
+CREATE OR REPLACE FUNCTION union_click_user_sketches(
+    p_start DATE,
+    p_end DATE,
+    p_provider_id INTEGER DEFAULT NULL,
+    p_by_provider BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (provider_id INTEGER, registers BYTEA)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH sketches AS (
+        SELECT m.provider_id, m.registers
+        FROM click_user_sketch_months m
+        WHERE m.month >= p_start
+            AND (m.month + INTERVAL '1 month')::DATE <= p_end + 1
+            AND (p_provider_id IS NULL OR m.provider_id = p_provider_id)
+        UNION ALL
+        SELECT s.provider_id, s.registers
+        FROM click_user_sketches s
+        WHERE s.day BETWEEN p_start AND p_end
+            AND NOT (
+                date_trunc('month', s.day)::DATE >= p_start
+                AND (date_trunc('month', s.day) + INTERVAL '1 month')::DATE <= p_end + 1
+            )
+            AND (p_provider_id IS NULL OR s.provider_id = p_provider_id)
+    )
+    SELECT
+        CASE WHEN p_by_provider THEN k.provider_id END,
+        click_sketch_union(k.registers)
+    FROM sketches k
+    GROUP BY 1;
+$$;
+
+-- Roll up daily sketches stored before the monthly table existed
+INSERT INTO click_user_sketch_months (month, provider_id, registers)
+SELECT date_trunc('month', day)::DATE, provider_id, click_sketch_union(registers)
+FROM click_user_sketches
+GROUP BY 1, 2
+ON CONFLICT (month, provider_id) DO UPDATE
+SET registers = merge_click_sketch_registers(click_user_sketch_months.registers, EXCLUDED.registers),
+    updated_at = NOW();
+
+-- Grant permissions
+GRANT SELECT ON click_user_sketches TO authenticated;
+GRANT SELECT ON click_user_sketch_months TO authenticated;
+GRANT EXECUTE ON FUNCTION merge_click_user_sketch TO authenticated;
+GRANT EXECUTE ON FUNCTION union_click_user_sketches TO authenticated;
+
+-- Backfill sketches for clicks recorded before this migration:
+--   cd backend && python -m app.core.click_sketches 2024-01-01 2025-12-31
+
+-- Add environment variables (add to your .env file)
+-- MERGE_CLICK_USER_SKETCH=merge_click_user_sketch
+-- UNION_CLICK_USER_SKETCHES=union_click_user_sketches
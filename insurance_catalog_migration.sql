@@ -0,0 +1,108 @@
+-- Versioned insurance catalog
+-- Run this in your Supabase SQL editor. It assumes the insurance table is
+-- named "insurances" (INSURANCES_TABLE); adjust the trigger if yours differs.
+-- Keep get_insurance_names: until this has run, the backend lists every name
+-- through it, unversioned, and ?since= requests get the full list.
+
+-- Every insert, rename and delete on insurances appends to this log. The
+-- version is the catalog's change sequence: clients hold the version they
+-- last synced to and ask for the changes after it.
+CREATE TABLE IF NOT EXISTS insurance_catalog_changes (
+    version BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('added', 'removed')),
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION log_insurance_catalog_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Held until commit, so versions are handed out in commit order and a
+    -- reader never skips a change that commits after a later version
+    PERFORM pg_advisory_xact_lock(hashtext('insurance_catalog_changes'));
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO insurance_catalog_changes (name, op) VALUES (OLD.name, 'removed');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO insurance_catalog_changes (name, op) VALUES (NEW.name, 'added');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS insurance_catalog_changes_trigger ON insurances;
+CREATE TRIGGER insurance_catalog_changes_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF name ON insurances
+    FOR EACH ROW
+    EXECUTE FUNCTION log_insurance_catalog_change();
+
+-- Changes after p_since as {"version", "full", "added", "removed"}. Each name
+-- appears once, in its latest state. Without p_since, or for a version older
+-- than the log still holds (or newer than it has), the whole catalog comes
+-- back with full = true. STABLE, so both reads share one snapshot.
+CREATE OR REPLACE FUNCTION get_insurance_changes(p_since BIGINT DEFAULT NULL)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    current_version BIGINT;
+    oldest_version BIGINT;
+BEGIN
+    SELECT COALESCE(MAX(version), 0), COALESCE(MIN(version), 1)
+    INTO current_version, oldest_version
+    FROM insurance_catalog_changes;
+
+    IF p_since IS NULL
+        OR p_since < oldest_version - 1
+        OR p_since > current_version THEN
+        RETURN jsonb_build_object(
+            'version', current_version,
+            'full', TRUE,
+            'added', COALESCE(
+                (SELECT jsonb_agg(name ORDER BY name) FROM insurances),
+                '[]'::jsonb
+            ),
+            'removed', '[]'::jsonb
+        );
+    END IF;
+
+    RETURN (
+        WITH latest AS (
+            SELECT DISTINCT ON (name) name, op
+            FROM insurance_catalog_changes
+            WHERE version > p_since AND version <= current_version
+            ORDER BY name, version DESC
+        )
+        SELECT jsonb_build_object(
+            'version', current_version,
+            'full', FALSE,
+            'added', COALESCE(
+                jsonb_agg(name ORDER BY name) FILTER (WHERE op = 'added'),
+                '[]'::jsonb
+            ),
+            'removed', COALESCE(
+                jsonb_agg(name ORDER BY name) FILTER (WHERE op = 'removed'),
+                '[]'::jsonb
+            )
+        )
+        FROM latest
+    );
+END;
+$$;
+
+-- The log can be trimmed; clients older than what remains get a full list.
+-- Keep the newest row so the current version never goes backwards:
+--   DELETE FROM insurance_catalog_changes
+--   WHERE changed_at < NOW() - INTERVAL '90 days'
+--     AND version < (SELECT MAX(version) FROM insurance_catalog_changes);
+
+-- Grant permissions
+GRANT SELECT ON insurance_catalog_changes TO authenticated;
+GRANT EXECUTE ON FUNCTION get_insurance_changes TO authenticated;
+
+-- Add environment variables (add to your .env file)
+-- INSURANCE_CATALOG_HISTORY=256
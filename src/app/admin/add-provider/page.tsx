@@ -5,6 +5,7 @@ import { useRouter } from 'next/navigation';
 import { ResultsList } from '../../components/ResultsList';
 import { DMEProvider } from '../../types';
 import { config } from '../../config';
+import { UPLOAD_ACCEPT, UPLOAD_FORMATS_MESSAGE, isPlainCsv, isSupportedUpload } from '../../utils/uploadFormats';
 import dynamic from 'next/dynamic';
 import loadingAnimation from '../../assets/loading-animation.json';
 
@@ -24,7 +25,22 @@ export default function AddProviderPage() {
     const file = e.target.files?.[0];
     if (!file) return;
 
+    if (!isSupportedUpload(file)) {
+      setCsvFile(null);
+      setError(UPLOAD_FORMATS_MESSAGE);
+      return;
+    }
+    setError('');
     setCsvFile(file);
+
+    // Compressed, Parquet and XLSX files are checked by the backend on upload
+    if (!isPlainCsv(file)) {
+      setCsvPreview(null);
+      setIsCsvMode(true);
+      setIsPreviewMode(true);
+      return;
+    }
+
     const reader = new FileReader();
     reader.onload = (event) => {
       const csvText = event.target?.result as string;
@@ -89,8 +105,8 @@ export default function AddProviderPage() {
 
       const { job_id } = await response.json();
       
-      // Poll for status
-      pollForStatus(job_id);
+      // Follow progress, streaming when the browser supports it
+      watchStatus(job_id);
       
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An error occurred');
@@ -98,19 +114,47 @@ export default function AddProviderPage() {
     }
   };
 
+  // Returns true once the job has finished
+  const handleStatus = (status: { status: string; message: string; companies_loaded: number; coverage_entries_loaded: number }) => {
+    if (status.status === 'completed') {
+      setSuccess(`Processing completed! ${status.companies_loaded} companies and ${status.coverage_entries_loaded} coverage entries loaded.`);
+      setIsLoading(false);
+      return true;
+    }
+    if (status.status === 'error' || status.status === 'cancelled') {
+      setError(status.message);
+      setIsLoading(false);
+      return true;
+    }
+    return false;
+  };
+
+  const watchStatus = (jobId: string) => {
+    if (typeof EventSource === 'undefined') {
+      pollForStatus(jobId);
+      return;
+    }
+
+    const events = new EventSource(`${config.apiUrl}/api/upload_status/${jobId}/stream`);
+    events.addEventListener('status', (event) => {
+      if (handleStatus(JSON.parse((event as MessageEvent).data))) {
+        events.close();
+      }
+    });
+    events.onerror = () => {
+      // Fall back to polling if the stream is blocked or drops
+      events.close();
+      pollForStatus(jobId);
+    };
+  };
+
   const pollForStatus = async (jobId: string) => {
     const poll = async () => {
       try {
         const response = await fetch(`${config.apiUrl}/api/upload_status/${jobId}`);
         const status = await response.json();
         
-        if (status.status === 'completed') {
-          setSuccess(`Processing completed! ${status.companies_loaded} companies and ${status.coverage_entries_loaded} coverage entries loaded.`);
-          setIsLoading(false);
-        } else if (status.status === 'error') {
-          setError(status.message);
-          setIsLoading(false);
-        } else {
+        if (!handleStatus(status)) {
           // Update progress and continue polling
           setTimeout(poll, 1000);
         }
@@ -191,12 +235,12 @@ export default function AddProviderPage() {
                 </label>
                 <input
                   type="file"
-                  accept=".csv"
+                  accept={UPLOAD_ACCEPT}
                   onChange={handleFileUpload}
                   className="w-full px-4 py-3 border border-[#ACACAD] rounded-[14.7px] font-gibson text-[14px] bg-[#FCFCFC] focus:border-[#E87F6B] focus:ring-[#E87F6B]"
                 />
                 <p className="mt-2 text-sm text-gray-500">
-                  CSV should include: DME Name, State, Insurance, Phone Number, Email, Dedicated Link, Resupply Available, Accessories Available, Location Services Available
+                  CSV, compressed CSV (.gz, .zip), Parquet or XLSX. It should include: DME Name, State, Insurance, Phone Number, Email, Dedicated Link, Resupply Available, Accessories Available, Location Services Available
                 </p>
               </div>
             </div>
@@ -206,7 +250,13 @@ export default function AddProviderPage() {
             <div className="w-full lg:w-1/2">
               <div className="bg-white rounded-lg p-8 shadow-sm">
                 <h2 className="font-meno-banner text-2xl font-bold mb-6">Preview</h2>
-                <ResultsList results={[previewData]} />
+                {csvPreview || !csvFile ? (
+                  <ResultsList results={[previewData]} />
+                ) : (
+                  <p className="font-gibson text-sm text-[#606060]">
+                    No preview for {csvFile.name}; its rows are validated when it is uploaded.
+                  </p>
+                )}
                 <div className="mt-6">
                   <button
                     onClick={handleSubmit}
@@ -4,6 +4,7 @@ import { useState } from 'react';
 import { useRouter } from 'next/navigation';
 import { DMEProvider } from '../../types';
 import { config } from '../../config';
+import { UPLOAD_ACCEPT, UPLOAD_FORMATS_MESSAGE, isSupportedUpload } from '../../utils/uploadFormats';
 import React from 'react';
 
 export default function UpdateProviderPage() {
@@ -139,12 +140,12 @@ export default function UpdateProviderPage() {
 
   const handleCsvFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
-    if (file && file.type === 'text/csv') {
+    if (file && isSupportedUpload(file)) {
       setCsvFile(file);
       setCsvUploadStatus('');
     } else {
       setCsvFile(null);
-      setCsvUploadStatus('Please select a valid CSV file');
+      setCsvUploadStatus(UPLOAD_FORMATS_MESSAGE);
     }
   };
 
@@ -366,7 +367,7 @@ export default function UpdateProviderPage() {
                         <input
                           id="csvFile"
                           type="file"
-                          accept=".csv"
+                          accept={UPLOAD_ACCEPT}
                           onChange={handleCsvFileChange}
                           className="w-full px-4 py-3 border border-[#ACACAD] rounded-[14.7px] font-gibson text-[14px] bg-[#FCFCFC] focus:border-[#E87F6B] focus:ring-[#E87F6B]"
                         />
@@ -9,8 +9,10 @@ interface State {
   abbreviation: string;
 }
 
-interface InsuranceProviders {
+interface Bootstrap {
+  states: State[];
   insurances: string[];
+  version: string;
 }
 
 interface SearchFormProps {
@@ -38,22 +40,17 @@ export function SearchForm({ onSubmit, isReturningUser = false, userEmail = '' }
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [statesRes, insuranceRes] = await Promise.all([
-          fetch(`${config.apiUrl}/api/states`),
-          fetch(`${config.apiUrl}/api/insurance-providers`),
-        ]);
+        // One round trip; the browser revalidates it with the ETag
+        const response = await fetch(`${config.apiUrl}/api/bootstrap`);
 
-        if (!statesRes.ok || !insuranceRes.ok) {
+        if (!response.ok) {
           throw new Error('Failed to fetch form data');
         }
 
-        const [statesData, insuranceData] = await Promise.all([
-          statesRes.json(),
-          insuranceRes.json(),
-        ]);
+        const data: Bootstrap = await response.json();
 
-        setStates(statesData);
-        setInsuranceProviders(insuranceData.insurances || []);
+        setStates(data.states);
+        setInsuranceProviders(data.insurances || []);
       } catch (error) {
         console.error('Error fetching form data:', error);
       } finally {
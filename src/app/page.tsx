@@ -30,10 +30,11 @@ export default function Home() {
     // Fetch states data
     const fetchStates = async () => {
       try {
-        const response = await fetch(`${config.apiUrl}/api/states`);
+        // Shares the search form's cached bootstrap response
+        const response = await fetch(`${config.apiUrl}/api/bootstrap`);
         if (response.ok) {
-          const statesData = await response.json();
-          setStates(statesData);
+          const bootstrapData = await response.json();
+          setStates(bootstrapData.states);
         }
       } catch (error) {
         console.error('Error fetching states:', error);
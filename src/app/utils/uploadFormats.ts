@@ -0,0 +1,18 @@
+// File extensions the backend readers accept; keep in step with
+// UPLOAD_FORMATS in backend/app/core/readers.py
+export const UPLOAD_EXTENSIONS = ['.csv.gz', '.csv.zip', '.csv', '.gz', '.zip', '.parquet', '.xlsx'];
+
+// Value for a file input's accept attribute
+export const UPLOAD_ACCEPT = UPLOAD_EXTENSIONS.join(',');
+
+export const UPLOAD_FORMATS_MESSAGE =
+  'Please select a CSV (optionally .gz or .zip compressed), Parquet or XLSX file';
+
+// Browsers report inconsistent MIME types for these formats, so check the name
+export const isSupportedUpload = (file: File): boolean => {
+  const name = file.name.toLowerCase();
+  return UPLOAD_EXTENSIONS.some((extension) => name.endsWith(extension));
+};
+
+// Only uncompressed CSV can be read as text in the browser for a preview
+export const isPlainCsv = (file: File): boolean => file.name.toLowerCase().endsWith('.csv');